@@ -1,10 +1,36 @@
-from .core_identity_architect import CoreIdentityArchitect
-from .purpose_motivation_navigator import PurposeMotivationNavigator
-from .grand_strategy_director import GrandStrategyDirector
-from .capability_growth_engineer import CapabilityGrowthEngineer
-from .workplace_dynamics_coach import WorkplaceDynamicsCultureCoach
-from .chief_marketing_officer import ChiefMarketingOfficer
-from .query_parser import QueryParser
-from .response_synthesizer import ResponseSynthesizer
-from .web_searcher import WebSearcher
-from .profile_updater import ProfileUpdater
+"""Remiro AI agents.
+
+Agent classes are imported lazily on first attribute access so that
+`import agents` (and `import graph`) stays cheap; modules such as
+web_searcher pull in heavy integrations only when actually used.
+"""
+
+from importlib import import_module
+
+_AGENT_MODULES = {
+    "CoreIdentityArchitect": ".core_identity_architect",
+    "PurposeMotivationNavigator": ".purpose_motivation_navigator",
+    "GrandStrategyDirector": ".grand_strategy_director",
+    "CapabilityGrowthEngineer": ".capability_growth_engineer",
+    "WorkplaceDynamicsCultureCoach": ".workplace_dynamics_coach",
+    "ChiefMarketingOfficer": ".chief_marketing_officer",
+    "QueryParser": ".query_parser",
+    "ResponseSynthesizer": ".response_synthesizer",
+    "WebSearcher": ".web_searcher",
+    "ProfileUpdater": ".profile_updater",
+}
+
+__all__ = list(_AGENT_MODULES)
+
+
+def __getattr__(name):
+    module_name = _AGENT_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -36,9 +36,14 @@ To control cost and avoid overwhelm, keep your answer focused and concise:
 Always end with an encouraging closing or a follow-up question to keep the momentum going.
 """
 
-    def get_chain(self):
+    def get_chain(self, style_instructions: str | None = None):
+        human_template = "User Query: {user_query}\n\nAgent Outputs:\n{agent_outputs}"
+        if style_instructions:
+            # Passed as the {style_instructions} input variable, not inlined,
+            # so user-provided style text can contain braces safely.
+            human_template += "\n\nStyle preferences for this answer:\n{style_instructions}"
         prompt = ChatPromptTemplate.from_messages([
             ("system", self.system_prompt),
-            ("human", "User Query: {user_query}\n\nAgent Outputs:\n{agent_outputs}")
+            ("human", human_template)
         ])
         return prompt | self.llm
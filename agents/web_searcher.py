@@ -1,5 +1,4 @@
 import os
-from langchain_community.utilities import GoogleSerperAPIWrapper
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 class WebSearcher:
@@ -15,6 +14,10 @@ class WebSearcher:
                 "with a valid key from https://serper.dev/."
             )
         else:
+            # langchain_community is a heavy import; only pay for it when a
+            # web searcher is actually constructed.
+            from langchain_community.utilities import GoogleSerperAPIWrapper
+
             self.search = GoogleSerperAPIWrapper(serper_api_key=api_key)
             self._config_error = None
         self.system_prompt = """You are the Web Searcher for the Remiro AI system.
@@ -49,8 +52,19 @@ class WebSearcher:
         if self.search is None:
             return self._config_error
 
+        # Imported here (not at module level) like the Serper wrapper, so
+        # importing the agents package stays cheap.
+        from circuit_breaker import CircuitOpenError, get_breaker
+
         try:
-            raw_results = self.search.run(query)
+            # Fails fast while the "serper" breaker is open (quota exhausted,
+            # outage) instead of waiting for the external call to fail.
+            raw_results = get_breaker("serper").call(self.search.run, query)
+        except CircuitOpenError as e:
+            return (
+                "[Web search unavailable] Web search is temporarily disabled after "
+                f"repeated failures of the external search service. {e}"
+            )
         except Exception as e:
             # Fallback: if Serper fails (invalid key, 403, quota, etc.),
             # return a clear message instead of crashing the whole graph.
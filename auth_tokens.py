@@ -0,0 +1,373 @@
+"""Local validation and proactive refresh of Supabase access tokens.
+
+Sign-in returns a short-lived access token (a JWT) and a refresh token.
+Checking the access token with GoTrue on every request would add a
+network round trip to each turn, so tokens are verified locally instead:
+
+- `verify_user(token)` checks the signature, expiry, audience and issuer
+  with PyJWT against cached signing keys and returns the caller's claims.
+  Tokens already verified are remembered until they expire, so repeated
+  calls with the same token are a dictionary lookup.
+- Signing keys come from the project's JWKS endpoint
+  (`/auth/v1/.well-known/jwks.json`). They are fetched once, refreshed in
+  a background thread before they go stale, and refetched immediately
+  (rate-limited) when a token names an unknown key id, i.e. after a key
+  rotation. Projects still on the legacy shared secret set
+  SUPABASE_JWT_SECRET and verify HS256 tokens without any fetch (keys
+  are then only fetched if an asymmetric token shows up).
+- `AuthSession` holds one signed-in user's tokens. `access_token()`
+  starts a background refresh shortly before the token expires and only
+  blocks when it has already expired (e.g. after a long idle period).
+
+An authenticated request therefore costs no network call in the common
+case; key fetches and refreshes reuse the pooled "supabase" connections
+(connections.http_client). `auth_stats()` reports verifications, cache hits, key fetches and
+refreshes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from circuit_breaker import get_breaker
+from connections import http_client
+
+AUDIENCE = "authenticated"
+# Clock skew tolerated when checking exp/iat.
+LEEWAY_SECONDS = 30
+VERIFIED_CACHE_MAX = 4096
+
+# Signing keys are refreshed in the background this often...
+JWKS_REFRESH_SECONDS = 600
+# ...retried this soon after a failed fetch...
+JWKS_RETRY_SECONDS = 30
+# ...and refetched on an unknown key id at most this often.
+JWKS_MIN_REFETCH_SECONDS = 30
+HTTP_TIMEOUT_SECONDS = 5.0
+
+# Access tokens are refreshed in the background this long before expiry.
+REFRESH_MARGIN_SECONDS = 120
+
+
+class AuthError(RuntimeError):
+    """Raised when a token is missing, invalid or expired, or cannot be refreshed."""
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "verifications": 0,
+    "cache_hits": 0,
+    "rejected": 0,
+    "key_fetches": 0,
+    "key_fetch_failures": 0,
+    "refreshes": 0,
+    "refresh_failures": 0,
+    "last_error": None,
+}
+
+
+def _count(key: str, error: Exception | None = None) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+        if error is not None:
+            _stats["last_error"] = repr(error)
+
+
+def auth_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _auth_url(path: str) -> str:
+    url = os.getenv("SUPABASE_URL")
+    if not url:
+        raise AuthError("SUPABASE_URL must be set to validate access tokens.")
+    return url.rstrip("/") + "/auth/v1" + path
+
+
+def _auth_headers() -> Dict[str, str]:
+    return {"apikey": os.getenv("SUPABASE_ANON_KEY", "")}
+
+
+class SigningKeys:
+    """The project's JWKS, cached and refreshed in the background."""
+
+    def __init__(self, jwks_url: str) -> None:
+        self.jwks_url = jwks_url
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Fetch the keys now and keep them fresh from a daemon thread."""
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="remiro-jwks", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            try:
+                self.refresh()
+                delay = JWKS_REFRESH_SECONDS
+            except Exception:  # noqa: BLE001 - keep serving the keys we have
+                delay = JWKS_RETRY_SECONDS
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def refresh(self) -> None:
+        import jwt
+
+        self._attempted_at = time.monotonic()
+        try:
+            response = get_breaker("supabase").call(
+                http_client("supabase").get,
+                self.jwks_url,
+                headers=_auth_headers(),
+                timeout=HTTP_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+            keys: Dict[str, Any] = {}
+            for jwk in response.json().get("keys", []):
+                try:
+                    keys[jwk.get("kid", "")] = jwt.PyJWK(jwk)
+                except jwt.PyJWTError:
+                    continue  # key type this PyJWT build cannot use
+        except Exception as exc:
+            _count("key_fetch_failures", exc)
+            raise
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+        _count("key_fetches")
+
+    def key_for(self, kid: str) -> Any:
+        with self._lock:
+            key = self._keys.get(kid)
+        if key is not None:
+            return key
+        # Unknown key id: the keys were rotated (or never fetched).
+        if time.monotonic() - self._attempted_at >= JWKS_MIN_REFETCH_SECONDS or not self._fetched_at:
+            try:
+                self.refresh()
+            except Exception as exc:  # noqa: BLE001
+                raise AuthError(f"Could not fetch the signing keys: {exc}") from exc
+            with self._lock:
+                key = self._keys.get(kid)
+        if key is None:
+            raise AuthError(f"Access token signed with an unknown key ({kid!r}).")
+        return key
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+
+
+class TokenVerifier:
+    """Verifies access tokens locally and remembers the ones already verified."""
+
+    def __init__(self, issuer: str, keys: SigningKeys, secret: str | None = None) -> None:
+        self.issuer = issuer
+        self.keys = keys
+        self.secret = secret
+        self._lock = threading.Lock()
+        self._verified: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Claims of a valid token; raises AuthError otherwise."""
+
+        import jwt
+
+        if not token:
+            raise AuthError("Missing access token.")
+        now = time.time()
+        with self._lock:
+            claims = self._verified.get(token)
+            if claims is not None and claims["exp"] + LEEWAY_SECONDS > now:
+                self._verified.move_to_end(token)
+                _count("cache_hits")
+                return claims
+            self._verified.pop(token, None)
+
+        try:
+            header = jwt.get_unverified_header(token)
+            algorithm = header.get("alg")
+            if algorithm == "HS256":
+                if not self.secret:
+                    raise AuthError("HS256 access token but SUPABASE_JWT_SECRET is not set.")
+                key: Any = self.secret
+            elif algorithm not in ("RS256", "ES256", "EdDSA"):
+                raise AuthError(f"Unsupported access token algorithm {algorithm!r}.")
+            else:
+                jwk = self.keys.key_for(header.get("kid", ""))
+                if jwk.algorithm_name != algorithm:
+                    raise AuthError("Access token algorithm does not match its signing key.")
+                key = jwk.key
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience=AUDIENCE,
+                issuer=self.issuer,
+                leeway=LEEWAY_SECONDS,
+                options={"require": ["exp", "sub"]},
+            )
+        except AuthError as exc:
+            _count("rejected", exc)
+            raise
+        except jwt.PyJWTError as exc:
+            _count("rejected", exc)
+            raise AuthError(f"Invalid access token: {exc}") from exc
+
+        _count("verifications")
+        with self._lock:
+            self._verified[token] = claims
+            while len(self._verified) > VERIFIED_CACHE_MAX:
+                self._verified.popitem(last=False)
+        return claims
+
+
+_verifier: Optional[TokenVerifier] = None
+_verifier_lock = threading.Lock()
+
+
+def get_token_verifier() -> TokenVerifier:
+    """Return the process-wide verifier, starting the key refresher on first use."""
+
+    global _verifier
+
+    with _verifier_lock:
+        if _verifier is None:
+            secret = os.getenv("SUPABASE_JWT_SECRET") or None
+            keys = SigningKeys(_auth_url("/.well-known/jwks.json"))
+            if not secret:
+                keys.start()
+            _verifier = TokenVerifier(_auth_url(""), keys, secret)
+        return _verifier
+
+
+def verify_user(token: str) -> Dict[str, Any]:
+    """Verify an access token locally and return the caller.
+
+    Returns user_id, email, role and expires_at (epoch seconds). Raises
+    AuthError when the token is missing, malformed, expired, not issued by
+    this project or not signed by one of its keys. Meant to be called on
+    every request; it only touches the network to fetch signing keys.
+    """
+
+    claims = get_token_verifier().verify(token)
+    return {
+        "user_id": str(claims["sub"]),
+        "email": claims.get("email"),
+        "role": claims.get("role"),
+        "expires_at": int(claims["exp"]),
+    }
+
+
+def _session_fields(session: Any) -> Tuple[str, str, float]:
+    def field(name: str) -> Any:
+        return session.get(name) if isinstance(session, dict) else getattr(session, name, None)
+
+    access_token, refresh_token = field("access_token"), field("refresh_token")
+    if not access_token or not refresh_token:
+        raise AuthError("Auth response did not contain a session.")
+    expires_at = field("expires_at")
+    if expires_at is None:
+        expires_at = time.time() + float(field("expires_in") or 0)
+    return str(access_token), str(refresh_token), float(expires_at)
+
+
+class AuthSession:
+    """One signed-in user's tokens, refreshed ahead of expiry."""
+
+    def __init__(self, access_token: str, refresh_token: str, expires_at: float) -> None:
+        self._lock = threading.Lock()
+        # Held for the whole exchange: a refresh token is single-use, so
+        # two concurrent refreshes would make one of them fail (or, with
+        # reuse detection, revoke the session).
+        self._refresh_lock = threading.Lock()
+        self._access_token = access_token
+        self._refresh_token = refresh_token
+        self.expires_at = expires_at
+        self._refreshing: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_auth_response(cls, resp: Any) -> Optional["AuthSession"]:
+        """Session of a sign-in/sign-up response.
+
+        None when the response has no session yet (a sign-up waiting for
+        email confirmation).
+        """
+
+        session = resp.get("session") if isinstance(resp, dict) else getattr(resp, "session", None)
+        if session is None:
+            return None
+        return cls(*_session_fields(session))
+
+    def access_token(self) -> str:
+        """A valid access token, refreshing it first if it already expired."""
+
+        remaining = self.expires_at - time.time()
+        if remaining <= LEEWAY_SECONDS:
+            # Waits for a background refresh in flight instead of sending
+            # the same refresh token again.
+            self.refresh(only_if_due=True)
+        elif remaining <= REFRESH_MARGIN_SECONDS:
+            self._refresh_in_background()
+        with self._lock:
+            return self._access_token
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self._background_refresh, name="remiro-token-refresh", daemon=True)
+            self._refreshing.start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh(only_if_due=True)
+        except AuthError:
+            pass  # counted; access_token() retries inline once the token expires
+
+    def refresh(self, only_if_due: bool = False) -> None:
+        """Exchange the refresh token for a new token pair (one GoTrue call).
+
+        Refreshes are serialized. With `only_if_due`, nothing is sent when
+        another caller refreshed the token while this one waited.
+        """
+
+        with self._refresh_lock:
+            if only_if_due and self.expires_at - time.time() > REFRESH_MARGIN_SECONDS:
+                return
+            self._exchange()
+
+    def _exchange(self) -> None:
+        with self._lock:
+            refresh_token = self._refresh_token
+        try:
+            response = get_breaker("supabase").call(
+                http_client("supabase").post,
+                _auth_url("/token?grant_type=refresh_token"),
+                headers=_auth_headers(),
+                json={"refresh_token": refresh_token},
+                timeout=HTTP_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+            access_token, new_refresh_token, expires_at = _session_fields(response.json())
+        except Exception as exc:
+            _count("refresh_failures", exc)
+            raise AuthError(f"Could not refresh the session: {exc}") from exc
+        with self._lock:
+            self._access_token = access_token
+            self._refresh_token = new_refresh_token
+            self.expires_at = expires_at
+        _count("refreshes")
@@ -0,0 +1,276 @@
+"""Run scripted multi-turn conversations through run_session in batch.
+
+Each line of the input JSONL file is one conversation of a synthetic user:
+
+    {"id": "pm-switch", "user_id": "<uuid>", "response_mode": "balanced",
+     "turns": ["I'm a marketer...", {"input": "What should I learn first?",
+                                     "response_mode": "fast"}]}
+
+`id` and `turns` are required; a turn is a string or an object with
+`input` and an optional per-turn `response_mode`. Without `user_id` the
+conversation runs as --user-id, or as a user id derived from the
+conversation id (the profiles/chat_sessions tables must then accept it).
+
+Conversations run concurrently (--concurrency at a time); the turns of one
+conversation run in order in the same session. Every finished turn is
+appended to the results JSONL file as soon as it completes:
+
+    {"conversation_id", "turn", "user_id", "session_id", "turn_id", "input",
+     "requested_mode", "response_mode", "active_agents", "cached",
+     "deduplicated", "reply",
+     "usage": {"calls", "input_tokens", "output_tokens", "cost_usd"},
+     "latency_s", "error"}
+
+Re-running with the same results file resumes: conversations continue
+after their last successful turn, in the same session. Turns use
+idempotency keys derived from the run, so a turn that was running when
+the process stopped is not stored twice. A failed turn is recorded with
+`error` and ends its conversation for this run (it is retried on resume).
+
+Daily quotas would degrade or refuse a large run part-way; they are
+disabled here unless REMIRO_DAILY_TOKEN_QUOTA / REMIRO_DAILY_COST_QUOTA_USD
+are set explicitly.
+
+Usage (from the project root, with the usual .env):
+
+    python benchmarks/batch_eval.py benchmarks/conversations.example.jsonl results.jsonl
+    python benchmarks/batch_eval.py convs.jsonl results.jsonl --concurrency 16 --limit 100
+    python benchmarks/batch_eval.py --summarize results.jsonl
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+DEFAULT_CONCURRENCY = 8
+_RUN_NAMESPACE = uuid.UUID("5d0e3f61-8a4c-4f7b-b2c9-1e6a7d90c4b3")
+
+
+def load_conversations(path: str) -> List[Dict[str, Any]]:
+    conversations: List[Dict[str, Any]] = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            conversation = json.loads(line)
+            conversation_id = str(conversation.get("id") or "")
+            turns = conversation.get("turns")
+            if not conversation_id or not isinstance(turns, list) or not turns:
+                raise RuntimeError(f"{path}:{line_number}: a conversation needs an 'id' and a non-empty 'turns' list.")
+            if conversation_id in seen:
+                raise RuntimeError(f"{path}:{line_number}: duplicate conversation id {conversation_id!r}.")
+            seen.add(conversation_id)
+            conversation["turns"] = [t if isinstance(t, dict) else {"input": str(t)} for t in turns]
+            conversations.append(conversation)
+    return conversations
+
+
+def read_results(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a results file; a torn last line (from a crash) is skipped."""
+
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def resume_points(path: str) -> Dict[str, Tuple[int, str | None]]:
+    """conversation id -> (next turn to run, session id) from earlier runs."""
+
+    points: Dict[str, Tuple[int, str | None]] = {}
+    for record in read_results(path):
+        if record.get("error"):
+            continue
+        next_turn, _ = points.get(record["conversation_id"], (0, None))
+        if record["turn"] + 1 > next_turn:
+            points[record["conversation_id"]] = (record["turn"] + 1, record.get("session_id"))
+    return points
+
+
+class ResultWriter:
+    """Appends one JSON line per turn; safe to share between threads."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._file = open(path, "a+", encoding="utf-8")
+        # Start on a fresh line after a torn record from an interrupted run.
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def run_conversation(
+    conversation: Dict[str, Any],
+    start_turn: int,
+    session_id: str | None,
+    run_id: str,
+    default_user_id: str | None,
+    writer: ResultWriter,
+) -> int:
+    """Run the remaining turns of one conversation; returns the turns that succeeded."""
+
+    from graph import run_session
+    from response_modes import DEFAULT_RESPONSE_MODE
+
+    conversation_id = str(conversation["id"])
+    user_id = str(
+        conversation.get("user_id")
+        or default_user_id
+        or uuid.uuid5(_RUN_NAMESPACE, f"user:{conversation_id}")
+    )
+    succeeded = 0
+    for index in range(start_turn, len(conversation["turns"])):
+        turn = conversation["turns"][index]
+        requested_mode = turn.get("response_mode") or conversation.get("response_mode") or DEFAULT_RESPONSE_MODE
+        record: Dict[str, Any] = {
+            "conversation_id": conversation_id,
+            "turn": index,
+            "user_id": user_id,
+            "session_id": session_id,
+            "input": turn["input"],
+            "requested_mode": requested_mode,
+        }
+        started = time.perf_counter()
+        try:
+            result = run_session(
+                user_id=user_id,
+                user_input=turn["input"],
+                session_id=session_id,
+                response_mode=requested_mode,
+                idempotency_key=str(uuid.uuid5(_RUN_NAMESPACE, f"{run_id}:{conversation_id}:{index}")),
+            )
+        except Exception as exc:  # noqa: BLE001 - recorded, the run goes on
+            record.update(latency_s=time.perf_counter() - started, error=repr(exc))
+            writer.write(record)
+            return succeeded
+        session_id = result["session_id"]
+        record.update(
+            session_id=session_id,
+            turn_id=result.get("turn_id"),
+            response_mode=result.get("response_mode"),
+            active_agents=result.get("active_agents", []),
+            cached=result.get("cached", False),
+            deduplicated=result.get("deduplicated", False),
+            reply=result.get("reply", ""),
+            usage=result.get("usage", {}),
+            latency_s=time.perf_counter() - started,
+            error=None,
+        )
+        writer.write(record)
+        succeeded += 1
+    return succeeded
+
+
+def summarize(path: str) -> Dict[str, Any]:
+    """Aggregate a results file (the latest record of each turn counts)."""
+
+    latest: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    for record in read_results(path):
+        latest[(record["conversation_id"], record["turn"])] = record
+    ok = [r for r in latest.values() if not r.get("error")]
+    latencies = sorted(r["latency_s"] for r in ok)
+    routing: Dict[str, int] = {}
+    for record in ok:
+        for agent in record.get("active_agents") or []:
+            routing[agent] = routing.get(agent, 0) + 1
+
+    def total(key: str) -> float:
+        return sum(float((r.get("usage") or {}).get(key, 0)) for r in ok)
+
+    return {
+        "conversations": len({key[0] for key in latest}),
+        "turns": len(latest),
+        "failed": len(latest) - len(ok),
+        "cached": sum(1 for r in ok if r.get("cached")),
+        "latency_p50_s": statistics.median(latencies) if latencies else 0.0,
+        "latency_p95_s": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+        "llm_calls": int(total("calls")),
+        "input_tokens": int(total("input_tokens")),
+        "output_tokens": int(total("output_tokens")),
+        "cost_usd": round(total("cost_usd"), 6),
+        "routing": dict(sorted(routing.items(), key=lambda item: -item[1])),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("conversations", nargs="?", help="input JSONL, one conversation per line")
+    parser.add_argument("results", help="results JSONL (appended to; resumed from)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="conversations run at once")
+    parser.add_argument("--user-id", help="run every conversation without a user_id as this user")
+    parser.add_argument("--run-id", help="idempotency namespace (default: the results file name)")
+    parser.add_argument("--limit", type=int, help="only the first N conversations")
+    parser.add_argument("--summarize", action="store_true", help="only summarize an existing results file")
+    args = parser.parse_args()
+
+    if not args.summarize:
+        if not args.conversations:
+            parser.error("the conversations file is required unless --summarize is given")
+
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        os.environ.setdefault("REMIRO_DAILY_TOKEN_QUOTA", "0")
+        os.environ.setdefault("REMIRO_DAILY_COST_QUOTA_USD", "0")
+
+        conversations = load_conversations(args.conversations)[: args.limit]
+        points = resume_points(args.results)
+        pending = [
+            (conversation, *points.get(str(conversation["id"]), (0, None)))
+            for conversation in conversations
+        ]
+        pending = [item for item in pending if item[1] < len(item[0]["turns"])]
+        skipped = len(conversations) - len(pending)
+        run_id = args.run_id or os.path.basename(args.results)
+        print(
+            f"{len(pending)} conversations to run ({skipped} already complete), "
+            f"concurrency {args.concurrency}",
+            file=sys.stderr,
+        )
+
+        from graph import warm_up
+
+        warm_up()
+        writer = ResultWriter(args.results)
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max(args.concurrency, 1), thread_name_prefix="batch-eval") as pool:
+                futures = [
+                    pool.submit(run_conversation, conversation, start, session_id, run_id, args.user_id, writer)
+                    for conversation, start, session_id in pending
+                ]
+                turns = sum(future.result() for future in futures)
+        finally:
+            writer.close()
+        print(f"{turns} turns in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+    print(json.dumps(summarize(args.results), indent=2))
+
+
+if __name__ == "__main__":
+    main()
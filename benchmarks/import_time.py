@@ -0,0 +1,93 @@
+"""Measure cold import time of the backend modules.
+
+Each sample imports the target module in a fresh interpreter, so the
+numbers reflect what a Streamlit cold start, a worker process or a CLI tool
+actually pays. It also reports whether any of the heavy dependencies that
+should be loaded lazily were pulled in by the import.
+
+Usage (from the project root):
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module agents --runs 10
+    python benchmarks/import_time.py --warm-up   # include graph.warm_up()
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported by `import graph` / `import agents`.
+HEAVY_MODULES = [
+    "langchain_google_genai",
+    "langchain_community",
+    "supabase",
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+if {warm_up}:
+    start_warm = time.perf_counter()
+    {module}.warm_up()
+    warm = time.perf_counter() - start_warm
+else:
+    warm = None
+print(json.dumps({{
+    "import_s": elapsed,
+    "warm_up_s": warm,
+    "modules": len(sys.modules),
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def sample(module: str, warm_up: bool) -> dict:
+    code = _PROBE.format(module=module, warm_up=warm_up, heavy=HEAVY_MODULES)
+    env = dict(os.environ)
+    # The Gemini client validates that a key is present when it is built.
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="graph")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="also time graph.warm_up()")
+    args = parser.parse_args()
+
+    samples = [sample(args.module, args.warm_up) for _ in range(args.runs)]
+    imports = [s["import_s"] for s in samples]
+
+    print(f"import {args.module}: {args.runs} runs")
+    print(f"  median  {statistics.median(imports) * 1000:8.1f} ms")
+    print(f"  min     {min(imports) * 1000:8.1f} ms")
+    print(f"  max     {max(imports) * 1000:8.1f} ms")
+    print(f"  modules {samples[-1]['modules']}")
+    if args.warm_up:
+        warm = [s["warm_up_s"] for s in samples]
+        print(f"  warm_up {statistics.median(warm) * 1000:8.1f} ms (median)")
+
+    heavy = samples[-1]["heavy"]
+    if heavy and not args.warm_up:
+        print(f"  WARNING: heavy modules imported eagerly: {', '.join(heavy)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Measure the memory footprint of long sessions and many concurrent users.
+
+Turns run through the compiled graph with a local scripted chat model in
+place of Gemini (replies of a realistic, fixed size and no network), and
+checkpoints go to a throwaway SQLite file, so the numbers isolate what the
+backend itself keeps in memory. tracemalloc reports Python allocations
+only; native buffers (SQLite page cache, numpy) are not included.
+
+Two scenarios:
+
+- long session: one session runs --turns turns; the graph state (message
+  count and size) and the memory still allocated are sampled along the
+  way. Both should plateau once the history manager starts summarizing.
+- concurrent users: --users sessions run --user-turns turns each from a
+  thread pool of --workers; reports the peak per in-flight turn
+  ((peak - baseline) / workers) and what stays allocated per session once
+  the turns are done ((retained - baseline) / users).
+
+A worker process therefore needs roughly: its baseline after warm-up +
+concurrent turns x peak per turn + open sessions x retained per session.
+
+Usage (from the project root):
+
+    python benchmarks/memory_footprint.py
+    python benchmarks/memory_footprint.py --turns 300 --users 200 --workers 16
+    python benchmarks/memory_footprint.py --max-turn-kb 1024   # fail above a ceiling
+"""
+
+import argparse
+import gc
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+# Scripted replies are about this long (a typical capped specialist answer).
+REPLY_CHARS = 1200
+QUERIES = [
+    "I'm a marketer with five years of experience. How do I move into product management?",
+    "What skills should I learn first to become a data analyst, and in what order?",
+    "How should I prepare for a salary negotiation with my current manager?",
+    "My team lead keeps taking credit for my work. How do I handle that?",
+    "Help me write a LinkedIn headline that shows my transition into UX research.",
+]
+
+
+def _scripted_chat_model():
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+    from langchain_core.runnables import RunnableLambda
+
+    class ScriptedChatModel(BaseChatModel):
+        """Deterministic stand-in for Gemini: fixed-size replies, no I/O."""
+
+        @property
+        def _llm_type(self) -> str:
+            return "scripted"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            prompt = str(messages[-1].content)
+            text = ("Advice on: " + prompt[:80] + ". ") * (REPLY_CHARS // 100)
+            usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4, "total_tokens": 0}
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+        def with_structured_output(self, schema, **kwargs):
+            def respond(_):
+                if "destination_agents" in schema.model_fields:
+                    return schema(destination_agents=["grand_strategy_director", "capability_growth_engineer"])
+                return schema(updated_profile={"current_role": "marketer"})
+
+            return RunnableLambda(respond)
+
+    return ScriptedChatModel()
+
+
+def _setup(checkpoint_path: str):
+    os.environ["REMIRO_CHECKPOINTER"] = "sqlite"
+    os.environ["REMIRO_CHECKPOINT_DB"] = checkpoint_path
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+    import graph
+
+    model = _scripted_chat_model()
+    graph.get_chat_model = lambda *args, **kwargs: model
+    graph.get_agent.cache_clear()
+    return graph
+
+
+def _run_turn(graph, session_id: str, turn: int) -> Dict[str, Any]:
+    from langchain_core.messages import HumanMessage
+
+    human = HumanMessage(content=QUERIES[turn % len(QUERIES)], id=str(uuid.uuid4()))
+    state = graph.new_turn_state(human, {"current_role": "marketer"})
+    return graph.get_app().invoke(state, graph._thread_config(session_id))
+
+
+def _state_size(state: Dict[str, Any]) -> Dict[str, int]:
+    messages = state.get("messages") or []
+    return {
+        "messages": len(messages),
+        "message_chars": sum(len(str(getattr(m, "content", ""))) for m in messages),
+        "pickled_bytes": len(pickle.dumps(state)),
+    }
+
+
+def _allocated() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def long_session(graph, turns: int, every: int) -> List[Dict[str, Any]]:
+    session_id = str(uuid.uuid4())
+    baseline = _allocated()
+    samples = []
+    for turn in range(1, turns + 1):
+        state = _run_turn(graph, session_id, turn)
+        if turn % every == 0 or turn == turns:
+            samples.append({"turn": turn, **_state_size(state), "allocated_kb": (_allocated() - baseline) / 1024})
+    return samples
+
+
+def concurrent_users(graph, users: int, user_turns: int, workers: int) -> Dict[str, Any]:
+    baseline = _allocated()
+    tracemalloc.reset_peak()
+    sessions = [str(uuid.uuid4()) for _ in range(users)]
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def run(session_id: str) -> None:
+        try:
+            for turn in range(user_turns):
+                _run_turn(graph, session_id, turn)
+        except Exception as exc:  # noqa: BLE001
+            with lock:
+                errors.append(repr(exc))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, sessions))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    retained = _allocated() - baseline
+    return {
+        "users": users,
+        "turns_per_user": user_turns,
+        "workers": workers,
+        "seconds": elapsed,
+        "peak_kb": (peak - baseline) / 1024,
+        "retained_kb": retained / 1024,
+        "per_turn_kb": (peak - baseline) / 1024 / min(workers, users),
+        "retained_per_session_kb": retained / 1024 / users,
+        "errors": errors[:5],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=150, help="turns of the long session")
+    parser.add_argument("--sample-every", type=int, default=25)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--user-turns", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print the raw results as JSON")
+    parser.add_argument("--max-turn-kb", type=float, help="exit 1 if the peak per in-flight turn is above this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        graph = _setup(os.path.join(tmp, "checkpoints.sqlite"))
+        # Build the app, agents and caches before measuring.
+        graph.warm_up(connections=False)
+        _run_turn(graph, str(uuid.uuid4()), 0)
+
+        tracemalloc.start()
+        samples = long_session(graph, args.turns, args.sample_every)
+        concurrent = concurrent_users(graph, args.users, args.user_turns, args.workers)
+        tracemalloc.stop()
+
+    if args.json:
+        print(json.dumps({"long_session": samples, "concurrent": concurrent}, indent=2))
+    else:
+        print(f"long session: {args.turns} turns")
+        print(f"  {'turn':>6} {'messages':>9} {'chars':>8} {'state KB':>9} {'alloc KB':>9}")
+        for s in samples:
+            print(
+                f"  {s['turn']:>6} {s['messages']:>9} {s['message_chars']:>8} "
+                f"{s['pickled_bytes'] / 1024:>9.1f} {s['allocated_kb']:>9.1f}"
+            )
+        print(
+            f"concurrent: {concurrent['users']} users x {concurrent['turns_per_user']} turns, "
+            f"{concurrent['workers']} workers, {concurrent['seconds']:.1f} s"
+        )
+        print(f"  peak     {concurrent['peak_kb']:9.1f} KB")
+        print(f"  retained {concurrent['retained_kb']:9.1f} KB")
+        print(f"  per turn {concurrent['per_turn_kb']:9.1f} KB (peak, per in-flight turn)")
+        print(f"  per user {concurrent['retained_per_session_kb']:9.1f} KB (retained, per session)")
+        for error in concurrent["errors"]:
+            print(f"  ERROR: {error}")
+
+    if concurrent["errors"] or (args.max_turn_kb is not None and concurrent["per_turn_kb"] > args.max_turn_kb):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
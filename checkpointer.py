@@ -0,0 +1,600 @@
+"""LangGraph checkpoint savers used to persist AgentState between turns.
+
+The compiled graph in `graph.py` uses one of these savers so that each chat
+turn resumes from the last checkpoint of its session (the session_id is used
+as the LangGraph thread id) instead of rebuilding the whole state from the
+`messages` table.
+
+Two storage backends are provided:
+
+- `SqliteCheckpointSaver` – a local SQLite file (the default).
+- `SupabaseCheckpointSaver` – two Supabase tables, for multi-instance
+  deployments where workers do not share a disk.
+
+Expected Supabase tables (payload columns hold base64 text):
+
+    create table graph_checkpoints (
+        thread_id text not null,
+        checkpoint_ns text not null default '',
+        checkpoint_id text not null,
+        parent_checkpoint_id text,
+        type text,
+        checkpoint text not null,
+        metadata text not null,
+        primary key (thread_id, checkpoint_ns, checkpoint_id)
+    );
+
+    create table graph_checkpoint_writes (
+        thread_id text not null,
+        checkpoint_ns text not null default '',
+        checkpoint_id text not null,
+        task_id text not null,
+        idx integer not null,
+        channel text not null,
+        type text,
+        value text,
+        task_path text not null default '',
+        primary key (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    );
+
+Storage is kept bounded in two ways:
+
+- Payloads are zlib-compressed before they are written.
+- At the start of every turn (an "input" checkpoint) older checkpoints of
+  that thread are pruned down to `keep_last`, and pending writes are only
+  kept for checkpoints that can still be resumed.
+"""
+
+import abc
+import base64
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from supabase_client import get_supabase
+
+
+# How many checkpoints per thread survive a prune. Each turn writes one
+# checkpoint per graph step, so this only needs to cover the latest turn.
+DEFAULT_KEEP_LAST = 2
+
+
+class _CompactingCheckpointSaver(BaseCheckpointSaver, abc.ABC):
+    """Shared checkpoint logic; subclasses only implement row storage.
+
+    Rows are plain dicts with the same keys as the table columns. Payload
+    columns (`checkpoint`, `metadata`, `value`) hold compressed bytes.
+    """
+
+    def __init__(self, *, keep_last: int = DEFAULT_KEEP_LAST, serde=None) -> None:
+        super().__init__(serde=serde)
+        self.keep_last = max(1, keep_last)
+
+    # --- Storage primitives (implemented by subclasses) ---
+
+    @abc.abstractmethod
+    def _select_checkpoints(
+        self,
+        thread_id: str,
+        checkpoint_ns: Optional[str],
+        checkpoint_id: Optional[str] = None,
+        before_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return checkpoint rows, newest first."""
+
+    @abc.abstractmethod
+    def _select_checkpoint_ids(self, thread_id: str, checkpoint_ns: str) -> List[str]:
+        """Return all checkpoint ids for a thread/namespace, newest first."""
+
+    @abc.abstractmethod
+    def _select_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> List[Dict[str, Any]]:
+        """Return the pending write rows of one checkpoint."""
+
+    @abc.abstractmethod
+    def _insert_checkpoint(self, row: Dict[str, Any]) -> None:
+        """Store a checkpoint row."""
+
+    @abc.abstractmethod
+    def _insert_writes(self, rows: List[Dict[str, Any]], overwrite: bool) -> None:
+        """Store write rows, replacing existing ones only with `overwrite`."""
+
+    @abc.abstractmethod
+    def _delete_checkpoints(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> None:
+        """Delete the given checkpoints of a thread/namespace."""
+
+    @abc.abstractmethod
+    def _delete_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> None:
+        """Delete the pending writes of the given checkpoints."""
+
+    def _compact_storage(self) -> None:
+        """Optional hook to reclaim space after pruning."""
+
+    # --- Serialization helpers ---
+
+    def _dump(self, obj: Any) -> Tuple[str, bytes]:
+        type_, payload = self.serde.dumps_typed(obj)
+        return type_, zlib.compress(payload)
+
+    def _load(self, type_: str, payload: bytes) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(payload)))
+
+    def _row_to_tuple(self, row: Dict[str, Any]) -> CheckpointTuple:
+        thread_id = row["thread_id"]
+        checkpoint_ns = row["checkpoint_ns"]
+        checkpoint_id = row["checkpoint_id"]
+        parent_id = row.get("parent_checkpoint_id")
+
+        writes = self._select_writes(thread_id, checkpoint_ns, checkpoint_id)
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self._load(row["type"], row["checkpoint"]),
+            metadata=self._load(row["type"], row["metadata"]),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (w["task_id"], w["channel"], self._load(w["type"], w["value"]))
+                for w in writes
+            ],
+        )
+
+    # --- BaseCheckpointSaver API ---
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        configurable = config["configurable"]
+        rows = self._select_checkpoints(
+            configurable["thread_id"],
+            configurable.get("checkpoint_ns", ""),
+            checkpoint_id=get_checkpoint_id(config),
+            limit=1,
+        )
+        if not rows:
+            return None
+        return self._row_to_tuple(rows[0])
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        if not config:
+            # Listing across every thread is not needed by the app and would
+            # be an unbounded scan of the table.
+            return
+
+        configurable = config["configurable"]
+        rows = self._select_checkpoints(
+            configurable["thread_id"],
+            configurable.get("checkpoint_ns"),
+            checkpoint_id=get_checkpoint_id(config),
+            before_id=get_checkpoint_id(before) if before else None,
+            # Metadata filters are applied after decoding, so only push the
+            # limit down to storage when there is nothing else to filter on.
+            limit=None if filter else limit,
+        )
+
+        remaining = limit
+        for row in rows:
+            item = self._row_to_tuple(row)
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                remaining -= 1
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+
+        type_, payload = self._dump(checkpoint)
+        _, metadata_payload = self._dump(get_checkpoint_metadata(config, metadata))
+        self._insert_checkpoint(
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+                "parent_checkpoint_id": configurable.get("checkpoint_id"),
+                "type": type_,
+                "checkpoint": payload,
+                "metadata": metadata_payload,
+            }
+        )
+
+        # Prune once per turn: the "input" checkpoint marks the start of a
+        # new invocation, so everything older than the last few checkpoints
+        # can no longer be resumed from by run_session.
+        if metadata.get("source") == "input":
+            self.prune(thread_id, checkpoint_ns)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        configurable = config["configurable"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, payload = self._dump(value)
+            rows.append(
+                {
+                    "thread_id": configurable["thread_id"],
+                    "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                    "checkpoint_id": configurable["checkpoint_id"],
+                    "task_id": task_id,
+                    "idx": WRITES_IDX_MAP.get(channel, idx),
+                    "channel": channel,
+                    "type": type_,
+                    "value": payload,
+                    "task_path": task_path,
+                }
+            )
+        if rows:
+            # Special channels (errors, interrupts) may be overwritten, regular
+            # writes are first-write-wins just like the in-memory saver.
+            overwrite = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+            self._insert_writes(rows, overwrite=overwrite)
+
+    def prune(self, thread_id: str, checkpoint_ns: str = "") -> None:
+        """Drop all but the newest `keep_last` checkpoints of a thread.
+
+        Pending writes are only useful for resuming an interrupted step, so
+        they are dropped for every checkpoint except the newest one.
+        """
+
+        ids = self._select_checkpoint_ids(thread_id, checkpoint_ns)
+        stale = ids[self.keep_last :]
+        stale_writes = ids[1:]
+        if stale_writes:
+            self._delete_writes(thread_id, checkpoint_ns, stale_writes)
+        if stale:
+            self._delete_checkpoints(thread_id, checkpoint_ns, stale)
+            self._compact_storage()
+
+
+class SqliteCheckpointSaver(_CompactingCheckpointSaver):
+    """Checkpoint saver backed by a local SQLite file."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        keep_last: int = DEFAULT_KEEP_LAST,
+        serde=None,
+    ) -> None:
+        super().__init__(keep_last=keep_last, serde=serde)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Streamlit serves each session from its own thread, so the
+        # connection is shared behind a lock instead of being thread-bound.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint BLOB NOT NULL,
+                    metadata BLOB NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    value BLOB,
+                    task_path TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                )
+                """
+            )
+
+    def _query(self, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def _select_checkpoints(
+        self,
+        thread_id: str,
+        checkpoint_ns: Optional[str],
+        checkpoint_id: Optional[str] = None,
+        before_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        sql = "SELECT * FROM checkpoints WHERE thread_id = ?"
+        params: List[Any] = [thread_id]
+        if checkpoint_ns is not None:
+            sql += " AND checkpoint_ns = ?"
+            params.append(checkpoint_ns)
+        if checkpoint_id:
+            sql += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        if before_id:
+            sql += " AND checkpoint_id < ?"
+            params.append(before_id)
+        sql += " ORDER BY checkpoint_id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def _select_checkpoint_ids(self, thread_id: str, checkpoint_ns: str) -> List[str]:
+        rows = self._query(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC",
+            (thread_id, checkpoint_ns),
+        )
+        return [r["checkpoint_id"] for r in rows]
+
+    def _select_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> List[Dict[str, Any]]:
+        return self._query(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def _insert_checkpoint(self, row: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) "
+                "VALUES (:thread_id, :checkpoint_ns, :checkpoint_id, :parent_checkpoint_id, :type, :checkpoint, :metadata)",
+                row,
+            )
+
+    def _insert_writes(self, rows: List[Dict[str, Any]], overwrite: bool) -> None:
+        verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"{verb} INTO writes "
+                "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                "VALUES (:thread_id, :checkpoint_ns, :checkpoint_id, :task_id, :idx, :channel, :type, :value, :task_path)",
+                rows,
+            )
+
+    def _delete_checkpoints(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, cid) for cid in checkpoint_ids],
+            )
+
+    def _delete_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, cid) for cid in checkpoint_ids],
+            )
+
+    def _compact_storage(self) -> None:
+        # Return a bounded number of free pages to the OS so the file does
+        # not keep the high-water mark of every pruned turn.
+        with self._lock:
+            self._conn.execute("PRAGMA incremental_vacuum(256)")
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+
+class SupabaseCheckpointSaver(_CompactingCheckpointSaver):
+    """Checkpoint saver backed by the `graph_checkpoints` Supabase tables."""
+
+    checkpoints_table = "graph_checkpoints"
+    writes_table = "graph_checkpoint_writes"
+
+    @staticmethod
+    def _encode(row: Dict[str, Any], *fields: str) -> Dict[str, Any]:
+        encoded = dict(row)
+        for field in fields:
+            if encoded.get(field) is not None:
+                encoded[field] = base64.b64encode(encoded[field]).decode("ascii")
+        return encoded
+
+    @staticmethod
+    def _decode(rows: List[Dict[str, Any]], *fields: str) -> List[Dict[str, Any]]:
+        for row in rows:
+            for field in fields:
+                if row.get(field) is not None:
+                    row[field] = base64.b64decode(row[field])
+        return rows
+
+    def _select_checkpoints(
+        self,
+        thread_id: str,
+        checkpoint_ns: Optional[str],
+        checkpoint_id: Optional[str] = None,
+        before_id: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        query = get_supabase().table(self.checkpoints_table).select("*").eq("thread_id", thread_id)
+        if checkpoint_ns is not None:
+            query = query.eq("checkpoint_ns", checkpoint_ns)
+        if checkpoint_id:
+            query = query.eq("checkpoint_id", checkpoint_id)
+        if before_id:
+            query = query.lt("checkpoint_id", before_id)
+        query = query.order("checkpoint_id", desc=True)
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.execute().data or []
+        return self._decode(rows, "checkpoint", "metadata")
+
+    def _select_checkpoint_ids(self, thread_id: str, checkpoint_ns: str) -> List[str]:
+        rows = (
+            get_supabase()
+            .table(self.checkpoints_table)
+            .select("checkpoint_id")
+            .eq("thread_id", thread_id)
+            .eq("checkpoint_ns", checkpoint_ns)
+            .order("checkpoint_id", desc=True)
+            .execute()
+            .data
+            or []
+        )
+        return [r["checkpoint_id"] for r in rows]
+
+    def _select_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> List[Dict[str, Any]]:
+        rows = (
+            get_supabase()
+            .table(self.writes_table)
+            .select("task_id, channel, type, value")
+            .eq("thread_id", thread_id)
+            .eq("checkpoint_ns", checkpoint_ns)
+            .eq("checkpoint_id", checkpoint_id)
+            .order("task_id")
+            .order("idx")
+            .execute()
+            .data
+            or []
+        )
+        return self._decode(rows, "value")
+
+    def _insert_checkpoint(self, row: Dict[str, Any]) -> None:
+        get_supabase().table(self.checkpoints_table).upsert(
+            self._encode(row, "checkpoint", "metadata")
+        ).execute()
+
+    def _insert_writes(self, rows: List[Dict[str, Any]], overwrite: bool) -> None:
+        get_supabase().table(self.writes_table).upsert(
+            [self._encode(r, "value") for r in rows],
+            ignore_duplicates=not overwrite,
+        ).execute()
+
+    def _delete_checkpoints(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> None:
+        (
+            get_supabase()
+            .table(self.checkpoints_table)
+            .delete()
+            .eq("thread_id", thread_id)
+            .eq("checkpoint_ns", checkpoint_ns)
+            .in_("checkpoint_id", checkpoint_ids)
+            .execute()
+        )
+
+    def _delete_writes(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_ids: List[str]
+    ) -> None:
+        (
+            get_supabase()
+            .table(self.writes_table)
+            .delete()
+            .eq("thread_id", thread_id)
+            .eq("checkpoint_ns", checkpoint_ns)
+            .in_("checkpoint_id", checkpoint_ids)
+            .execute()
+        )
+
+    def delete_thread(self, thread_id: str) -> None:
+        sb = get_supabase()
+        sb.table(self.checkpoints_table).delete().eq("thread_id", thread_id).execute()
+        sb.table(self.writes_table).delete().eq("thread_id", thread_id).execute()
+
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """Build the checkpoint saver selected by REMIRO_CHECKPOINTER.
+
+    - "sqlite" (default): local file at REMIRO_CHECKPOINT_DB.
+    - "supabase": the graph_checkpoints / graph_checkpoint_writes tables.
+    - "none": no checkpointer; run_session rebuilds state from Supabase.
+    """
+
+    backend = os.getenv("REMIRO_CHECKPOINTER", "sqlite").strip().lower()
+    keep_last = int(os.getenv("REMIRO_CHECKPOINT_KEEP", str(DEFAULT_KEEP_LAST)))
+
+    if backend in ("", "none", "off"):
+        return None
+    if backend == "supabase":
+        return SupabaseCheckpointSaver(keep_last=keep_last)
+    if backend == "sqlite":
+        path = os.getenv("REMIRO_CHECKPOINT_DB", os.path.join(".remiro", "checkpoints.sqlite"))
+        return SqliteCheckpointSaver(path, keep_last=keep_last)
+
+    raise RuntimeError(
+        f"Unknown REMIRO_CHECKPOINTER backend {backend!r}; expected 'sqlite', 'supabase' or 'none'."
+    )
@@ -0,0 +1,281 @@
+"""Circuit breakers for external dependencies (Serper, Gemini, Supabase).
+
+Without a breaker, an outage (or an exhausted Serper quota) makes every
+turn wait for the failing call before falling back. A breaker tracks the
+outcome of recent calls in a sliding time window:
+
+- closed: calls go through; once at least `min_calls` calls in the last
+  `window_seconds` failed at a rate >= `failure_rate`, the breaker opens;
+- open: calls fail fast with CircuitOpenError (callers use their
+  fallback) for `open_seconds`;
+- half-open: afterwards up to `half_open_calls` probe calls are let
+  through; a success closes the breaker, a failure re-opens it.
+
+Only exceptions for which `is_failure(exc)` is true count as failures
+(by default all of them); the others are re-raised without being
+recorded.
+
+Each transition is counted and kept in a short history, see
+`breaker_stats()`. Per-dependency settings live in BREAKER_SETTINGS.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from write_journal import is_retryable_error
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_SETTINGS: Dict[str, Dict[str, Any]] = {
+    # Quota exhaustion lasts a while; probe rarely.
+    "serper": {"window_seconds": 120.0, "min_calls": 3, "failure_rate": 0.5, "open_seconds": 300.0},
+    "gemini": {"window_seconds": 60.0, "min_calls": 5, "failure_rate": 0.5, "open_seconds": 20.0},
+    # Permanent errors (RLS, constraints, bad requests) say nothing about
+    # Supabase's health; one user's bad writes must not open it for all.
+    "supabase": {
+        "window_seconds": 30.0,
+        "min_calls": 5,
+        "failure_rate": 0.5,
+        "open_seconds": 15.0,
+        "is_failure": is_retryable_error,
+    },
+}
+
+TRANSITION_HISTORY = 50
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name} is temporarily unavailable (circuit open, retry in {retry_in:.0f}s).")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Thread-safe failure-rate breaker over a sliding time window."""
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = lambda exc: True,
+    ) -> None:
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # Outcomes in the window, oldest first, and how many of them failed.
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._window_failures = 0
+        self._transitions: Deque[Dict[str, Any]] = deque(maxlen=TRANSITION_HISTORY)
+        self.metrics: Dict[str, int] = {
+            "successes": 0,
+            "failures": 0,
+            "rejected": 0,
+            "ignored_errors": 0,
+            "opened": 0,
+            "half_opened": 0,
+            "closed": 0,
+        }
+
+    def _transition(self, state: str) -> None:
+        self._transitions.append({"from": self._state, "to": state, "at": time.time()})
+        self._state = state
+        self.metrics[{OPEN: "opened", HALF_OPEN: "half_opened", CLOSED: "closed"}[state]] += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._probes = 0
+        elif state == CLOSED:
+            self._calls.clear()
+            self._window_failures = 0
+
+    def _record(self, ok: bool) -> None:
+        """Add an outcome and drop the ones that left the window (O(1) amortized)."""
+
+        now = time.monotonic()
+        self._calls.append((now, ok))
+        self._window_failures += not ok
+        self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, ok = self._calls.popleft()
+            self._window_failures -= not ok
+
+    def _refresh(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (open, not yet due for a probe)."""
+
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        """Reserve a call; False means fail fast (the call is counted as rejected)."""
+
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.metrics["rejected"] += 1
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.metrics["successes"] += 1
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+            else:
+                self._record(True)
+
+    def record_ignored(self) -> None:
+        """An admitted call failed with an error that is not a failure.
+
+        Nothing enters the window; a half-open probe slot is handed back.
+        """
+
+        with self._lock:
+            self.metrics["ignored_errors"] += 1
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_error(self, exc: BaseException) -> None:
+        """Record an admitted call's exception as a failure or ignore it (see is_failure)."""
+
+        if self.is_failure(exc):
+            self.record_failure()
+        else:
+            self.record_ignored()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.metrics["failures"] += 1
+            if self._state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            self._record(False)
+            if (
+                self._state == CLOSED
+                and len(self._calls) >= self.min_calls
+                and self._window_failures / len(self._calls) >= self.failure_rate
+            ):
+                self._transition(OPEN)
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run func through the breaker; raises CircuitOpenError when open."""
+
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            self.record_error(exc)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            self._prune(time.monotonic())
+            return {
+                **self.metrics,
+                "state": self._state,
+                "window_calls": len(self._calls),
+                "transitions": list(self._transitions),
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker for a dependency."""
+
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **BREAKER_SETTINGS.get(name, {}))
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """State, counters and recent transitions of every breaker in use."""
+
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+class BreakerCallback(BaseCallbackHandler):
+    """Guards a LangChain chat model with a breaker.
+
+    Rejects calls up front while the breaker is open (raise_error makes
+    LangChain propagate the CircuitOpenError instead of logging it) and
+    records the outcome of every call that was let through.
+    """
+
+    raise_error = True
+
+    def __init__(self, breaker: CircuitBreaker) -> None:
+        self.breaker = breaker
+        self._admitted: set = set()
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_in())
+        with self._lock:
+            self._admitted.add(run_id)
+
+    def _finish(self, run_id: UUID) -> bool:
+        with self._lock:
+            if run_id not in self._admitted:
+                return False
+            self._admitted.discard(run_id)
+            return True
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        if self._finish(run_id):
+            self.breaker.record_success()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if self._finish(run_id):
+            self.breaker.record_error(error)
@@ -0,0 +1,300 @@
+"""Shared, pooled HTTP connections for Supabase and Gemini.
+
+Left to their defaults, the Supabase client and every Gemini chat client
+(one per model/temperature/max_tokens combination) each own a separate
+httpx pool whose idle connections are dropped after 5 seconds, so most
+turns opened new TCP+TLS connections, and concurrent turns contended for
+whichever pool they happened to share. This module owns one pool per
+upstream instead:
+
+- `http_client(name)` returns the process-wide httpx client for
+  "supabase" or "gemini" (HTTP/2 when `h2` is installed), with keep-alive
+  connections held for REMIRO_HTTP_KEEPALIVE_SECONDS and pool limits
+  sized from REMIRO_CONCURRENT_TURNS (the turns a worker runs at once);
+  `async_http_client(name)` is the asyncio counterpart, one per event loop.
+- `gemini_client_args()` is passed to every Gemini chat model when it is
+  built (see graph.get_chat_model), so the google-genai client each model
+  owns sends its requests through those pools.
+- `warm_up_connections()` opens the connections at startup (called from
+  graph.warm_up), so the first turn does not pay for the handshakes.
+- `connection_stats()` reports, per pool, requests, new connections, TLS
+  handshakes and the time requests waited for a connection (measured with
+  httpcore trace events: from send until a connection was acquired).
+
+Construction is guarded by a lock (sync) or created per event loop
+(async), so concurrent first requests build each client exactly once.
+"""
+
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, List
+
+if TYPE_CHECKING:
+    import httpx
+
+POOL_NAMES = ("supabase", "gemini")
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+
+# Upstream calls a single turn can have in flight at once (e.g. parallel
+# specialists and the progressive opening), used to size the pools.
+CALLS_PER_TURN = {"supabase": 2, "gemini": 4}
+DEFAULT_CONCURRENT_TURNS = 8
+DEFAULT_KEEPALIVE_SECONDS = 90.0
+CONNECT_TIMEOUT_SECONDS = 10.0
+READ_TIMEOUT_SECONDS = {"supabase": 120.0, "gemini": 300.0}
+WAIT_SAMPLES = 1024
+
+_lock = threading.RLock()
+_clients: Dict[str, "httpx.Client"] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+_shared_transports: Dict[str, Any] = {}
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, Any]] = {
+    name: {
+        "requests": 0,
+        "new_connections": 0,
+        "tls_handshakes": 0,
+        "wait_ms_total": 0.0,
+        "wait_ms_max": 0.0,
+        "warmed_up": 0,
+    }
+    for name in POOL_NAMES
+}
+_wait_samples: Dict[str, Deque[float]] = {name: deque(maxlen=WAIT_SAMPLES) for name in POOL_NAMES}
+
+
+def concurrent_turns() -> int:
+    return max(int(os.getenv("REMIRO_CONCURRENT_TURNS", str(DEFAULT_CONCURRENT_TURNS))), 1)
+
+
+def pool_limits(name: str) -> "httpx.Limits":
+    import httpx
+
+    size = concurrent_turns() * CALLS_PER_TURN[name]
+    return httpx.Limits(
+        max_connections=size,
+        max_keepalive_connections=size,
+        keepalive_expiry=float(os.getenv("REMIRO_HTTP_KEEPALIVE_SECONDS", str(DEFAULT_KEEPALIVE_SECONDS))),
+    )
+
+
+def _record_wait(name: str, waited: float, new_connection: bool) -> None:
+    waited_ms = waited * 1000.0
+    with _stats_lock:
+        stats = _stats[name]
+        stats["requests"] += 1
+        stats["new_connections"] += int(new_connection)
+        stats["wait_ms_total"] += waited_ms
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], waited_ms)
+        _wait_samples[name].append(waited_ms)
+
+
+class _PoolWaitTrace:
+    """httpcore trace callback timing how long a request waited for a connection.
+
+    The wait ends when a new connection starts connecting or, on a reused
+    connection, when the request headers start being sent.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started = time.perf_counter()
+        self.done = False
+        self.new_connection = False
+
+    def event(self, event_name: str) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self.new_connection = True
+            self._finish()
+        elif event_name == "connection.start_tls.started":
+            with _stats_lock:
+                _stats[self.name]["tls_handshakes"] += 1
+        elif event_name.endswith("send_request_headers.started"):
+            self._finish()
+
+    def _finish(self) -> None:
+        if not self.done:
+            self.done = True
+            _record_wait(self.name, time.perf_counter() - self.started, self.new_connection)
+
+    def __call__(self, event_name: str, info: Dict[str, Any]) -> None:
+        self.event(event_name)
+
+
+class _AsyncPoolWaitTrace(_PoolWaitTrace):
+    async def __call__(self, event_name: str, info: Dict[str, Any]) -> None:  # type: ignore[override]
+        self.event(event_name)
+
+
+def _shared_pool_transport(name: str) -> Any:
+    """An httpx transport (sync and async) sending requests through a shared pool.
+
+    Its close methods do nothing: the pools outlive every client that
+    wraps this transport (see close_connections).
+    """
+
+    import httpx
+
+    class SharedPoolTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            return http_client(name).send(request, stream=True)
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            return await async_http_client(name).send(request, stream=True)
+
+        def close(self) -> None:
+            pass
+
+        async def aclose(self) -> None:
+            pass
+
+    return SharedPoolTransport()
+
+
+def _client_kwargs(name: str) -> Dict[str, Any]:
+    import httpx
+
+    return {
+        "limits": pool_limits(name),
+        "timeout": httpx.Timeout(READ_TIMEOUT_SECONDS[name], connect=CONNECT_TIMEOUT_SECONDS),
+        "http2": importlib.util.find_spec("h2") is not None,
+        "follow_redirects": True,
+    }
+
+
+def http_client(name: str) -> "httpx.Client":
+    """The shared, pooled httpx client for an upstream ("supabase" or "gemini")."""
+
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    import httpx
+
+    def trace_request(request: httpx.Request) -> None:
+        request.extensions["trace"] = _PoolWaitTrace(name)
+
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            client = httpx.Client(event_hooks={"request": [trace_request]}, **_client_kwargs(name))
+            _clients[name] = client
+        return client
+
+
+def async_http_client(name: str) -> "httpx.AsyncClient":
+    """The pooled httpx.AsyncClient for an upstream on the running event loop.
+
+    Async clients cannot be shared across event loops, so there is one per
+    loop; within a loop no await happens between the lookup and the
+    insert, so concurrent tasks get the same client.
+    """
+
+    import httpx
+
+    loop = asyncio.get_running_loop()
+
+    async def trace_request(request: httpx.Request) -> None:
+        request.extensions["trace"] = _AsyncPoolWaitTrace(name)
+
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(name)
+        if client is None:
+            client = httpx.AsyncClient(event_hooks={"request": [trace_request]}, **_client_kwargs(name))
+            clients[name] = client
+        return client
+
+
+def gemini_client_args() -> Dict[str, Any]:
+    """`client_args` for a Gemini chat model, routing it through the shared pools.
+
+    The google-genai client a model builds wraps its own httpx clients
+    around the transport given here, which forwards every request to
+    http_client("gemini") (or async_http_client("gemini") on the running
+    loop). Closing a model's clients, which ChatGoogleGenerativeAI does
+    when it is garbage-collected, closes only that wrapper, never the pools.
+    """
+
+    import httpx
+
+    with _lock:
+        transport = _shared_transports.get("gemini")
+        if transport is None:
+            transport = _shared_pool_transport("gemini")
+            _shared_transports["gemini"] = transport
+    return {
+        "transport": transport,
+        "timeout": httpx.Timeout(READ_TIMEOUT_SECONDS["gemini"], connect=CONNECT_TIMEOUT_SECONDS),
+        "follow_redirects": True,
+    }
+
+
+def _warm_targets() -> Dict[str, str]:
+    targets = {"gemini": GEMINI_BASE_URL + "/"}
+    supabase_url = os.getenv("SUPABASE_URL")
+    if supabase_url:
+        targets["supabase"] = supabase_url.rstrip("/") + "/rest/v1/"
+    return targets
+
+
+def warm_up_connections(connections: int | None = None) -> Dict[str, int]:
+    """Open keep-alive connections to each upstream; returns how many per pool.
+
+    With HTTP/2 one connection per upstream is multiplexed by all requests;
+    over HTTP/1.1, `connections` (default: concurrent_turns()) are opened in
+    parallel. Failures are ignored: warm-up is only an optimization.
+    """
+
+    opened: Dict[str, int] = {}
+    for name, url in _warm_targets().items():
+        client = http_client(name)
+        count = 1 if _client_kwargs(name)["http2"] else (connections or concurrent_turns())
+        headers = {"apikey": os.getenv("SUPABASE_ANON_KEY", "")} if name == "supabase" else {}
+
+        def probe() -> None:
+            try:
+                client.head(url, headers=headers)
+            except Exception:  # noqa: BLE001
+                pass
+
+        threads: List[threading.Thread] = [threading.Thread(target=probe, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(CONNECT_TIMEOUT_SECONDS)
+        opened[name] = count
+        with _stats_lock:
+            _stats[name]["warmed_up"] += count
+    return opened
+
+
+def connection_stats() -> Dict[str, Dict[str, Any]]:
+    """Per pool: requests, new connections, TLS handshakes and pool wait (ms)."""
+
+    result: Dict[str, Dict[str, Any]] = {}
+    with _stats_lock:
+        for name in POOL_NAMES:
+            stats = dict(_stats[name])
+            samples = sorted(_wait_samples[name])
+            stats["wait_ms_avg"] = stats["wait_ms_total"] / stats["requests"] if stats["requests"] else 0.0
+            stats["wait_ms_p95"] = samples[int(0.95 * (len(samples) - 1))] if samples else 0.0
+            stats["reused_connections"] = stats["requests"] - stats["new_connections"]
+            result[name] = stats
+    return result
+
+
+def close_connections() -> None:
+    """Close the sync pools (e.g. at worker shutdown)."""
+
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
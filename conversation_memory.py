@@ -0,0 +1,233 @@
+"""Per-user long-term conversational memory.
+
+Specialists only see the last few messages of the current session plus the
+profile, so something the user said twenty turns (or three sessions) ago
+is lost. This module keeps a small vector index per user over everything
+they and Remiro have said, so `run_session` can hand each specialist the
+few past snippets that are relevant to the current query instead of more
+raw history.
+
+Layout on disk (one directory per user under REMIRO_MEMORY_DIR):
+
+- `vectors.f32` – row-major float32 matrix, appended to in place and read
+  back through `numpy.memmap`, so opening an index does not copy it.
+- `chunks.jsonl` – one JSON line of metadata per matrix row.
+
+Embeddings come from `embeddings.HashingEmbedder`; a search is one
+matrix-vector product plus `argpartition`, well under a millisecond for
+users with thousands of messages.
+"""
+
+import json
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from embeddings import HashingEmbedder
+
+MEMORY_DIM = 256
+CHUNK_WORDS = 80
+MIN_SCORE = 0.15
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def chunk_text(text: str, max_words: int = CHUNK_WORDS) -> List[str]:
+    """Split text into chunks of whole sentences of at most ~max_words."""
+
+    chunks: List[str] = []
+    current: List[str] = []
+    count = 0
+    for sentence in _SENTENCE_SPLIT_RE.split(text or ""):
+        words = sentence.split()
+        if not words:
+            continue
+        if current and count + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current, count = [], 0
+        current.extend(words)
+        count += len(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class UserMemoryIndex:
+    """Append-only vector index of one user's past messages."""
+
+    def __init__(self, directory: str, embedder: Optional[HashingEmbedder] = None) -> None:
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder(dim=MEMORY_DIM)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._chunks_path = os.path.join(directory, "chunks.jsonl")
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._chunks: List[Dict[str, Any]] = []
+        if os.path.exists(self._chunks_path):
+            with open(self._chunks_path, "r", encoding="utf-8") as f:
+                self._chunks = [json.loads(line) for line in f if line.strip()]
+        self._message_ids = {c.get("message_id") for c in self._chunks}
+
+        # A crash between the two appends can leave them out of step (or
+        # leave a partial vector row); keep only complete rows that have
+        # both a vector and its metadata.
+        row_bytes = 4 * self.embedder.dim
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        if size != len(self._chunks) * row_bytes:
+            self._truncate(min(size // row_bytes, len(self._chunks)))
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def _truncate(self, rows: int) -> None:
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(rows * 4 * self.embedder.dim)
+        self._chunks = self._chunks[:rows]
+        with open(self._chunks_path, "w", encoding="utf-8") as f:
+            for chunk in self._chunks:
+                f.write(json.dumps(chunk) + "\n")
+        self._message_ids = {c.get("message_id") for c in self._chunks}
+
+    def _load_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            rows = len(self._chunks)
+            if rows == 0:
+                self._matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(
+                    self._vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(rows, self.embedder.dim),
+                )
+        return self._matrix
+
+    def add(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Index messages given as dicts with message_id, role, content, session_id.
+
+        Messages whose id is already indexed are skipped, so callers can
+        pass overlapping windows. Returns the number of chunks added.
+        """
+
+        new_chunks: List[Dict[str, Any]] = []
+        with self._lock:
+            for item in items:
+                message_id = item.get("message_id")
+                if message_id is not None and message_id in self._message_ids:
+                    continue
+                for text in chunk_text(item.get("content", "")):
+                    new_chunks.append({
+                        "message_id": message_id,
+                        "session_id": item.get("session_id"),
+                        "role": item.get("role"),
+                        "text": text,
+                    })
+                self._message_ids.add(message_id)
+
+            if not new_chunks:
+                return 0
+
+            vectors = self.embedder.embed_many(c["text"] for c in new_chunks)
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.astype(np.float32).tobytes())
+            with open(self._chunks_path, "a", encoding="utf-8") as f:
+                for chunk in new_chunks:
+                    f.write(json.dumps(chunk) + "\n")
+            self._chunks.extend(new_chunks)
+            # Re-map lazily on the next search to pick up the new rows.
+            self._matrix = None
+            return len(new_chunks)
+
+    def search(
+        self,
+        query: str,
+        k: int = 4,
+        exclude_message_ids: Iterable[str] = (),
+        min_score: float = MIN_SCORE,
+    ) -> List[Dict[str, Any]]:
+        """Return up to k past chunks most similar to the query, best first."""
+
+        with self._lock:
+            matrix = self._load_matrix()
+            if matrix.shape[0] == 0:
+                return []
+            scores = np.asarray(matrix @ self.embedder.embed(query))
+            excluded = set(exclude_message_ids)
+            # Over-fetch a little so excluded/duplicate rows do not starve k.
+            top_n = min(len(scores), k + len(excluded) + k)
+            candidates = np.argpartition(-scores, top_n - 1)[:top_n]
+            candidates = candidates[np.argsort(-scores[candidates])]
+
+            results: List[Dict[str, Any]] = []
+            seen_texts = set()
+            for row in candidates:
+                score = float(scores[row])
+                if score < min_score:
+                    break
+                chunk = self._chunks[int(row)]
+                if chunk.get("message_id") in excluded or chunk["text"] in seen_texts:
+                    continue
+                seen_texts.add(chunk["text"])
+                results.append({**chunk, "score": score})
+                if len(results) >= k:
+                    break
+            return results
+
+
+def format_memory_context(snippets: List[Dict[str, Any]], max_chars: int = 1200) -> str:
+    """Render retrieved snippets compactly for a specialist prompt."""
+
+    lines: List[str] = []
+    used = 0
+    for snippet in snippets:
+        line = f"- [{snippet.get('role') or 'message'}] {snippet['text']}"
+        if used + len(line) > max_chars:
+            break
+        lines.append(line)
+        used += len(line)
+    return "\n".join(lines)
+
+
+_indexes: "OrderedDict[str, UserMemoryIndex]" = OrderedDict()
+# Every index still referenced anywhere, by directory, including ones
+# evicted from the LRU while a thread is using them, so the files of a
+# user never have two open indexes.
+_live_indexes: "weakref.WeakValueDictionary[str, UserMemoryIndex]" = weakref.WeakValueDictionary()
+_indexes_lock = threading.Lock()
+MAX_OPEN_INDEXES = 64
+
+
+def memory_enabled() -> bool:
+    return os.getenv("REMIRO_MEMORY", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_user_memory(user_id: str) -> UserMemoryIndex:
+    """Return the (cached) memory index for a user.
+
+    At most MAX_OPEN_INDEXES stay cached, but an evicted index that is
+    still in use is handed out again instead of a second one being opened
+    over the same files (two writers would interleave their appends).
+    """
+
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            root = os.getenv("REMIRO_MEMORY_DIR", os.path.join(".remiro", "memory"))
+            safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)
+            directory = os.path.abspath(os.path.join(root, safe_id))
+            index = _live_indexes.get(directory)
+            if index is None:
+                index = UserMemoryIndex(directory)
+                _live_indexes[directory] = index
+            _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+        return index
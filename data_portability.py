@@ -0,0 +1,295 @@
+"""Streaming export and import of a user's data as NDJSON.
+
+Exports one user's profile, chat sessions and messages to a newline-
+delimited JSON file, and imports such a file back (into the same or
+another Supabase project), for data portability, backups and migrations
+between storage backends. Memory stays constant whatever the size of the
+account:
+
+- reads use keyset pagination on (created_at, id): sessions page by page,
+  then each session's messages page by page, each line written as soon as
+  its page arrives (archives page on (first_created_at, first_id), a few
+  blobs at a time);
+- imports read line by line and write in batches with idempotent upserts
+  (rows keep their ids), so an interrupted import can simply be re-run.
+
+File format, one JSON object per line:
+
+    {"type": "header", "version": 1, "user_id": ..., "exported_at": ...}
+    {"type": "profile", "row": {...}}          (if the user has one)
+    {"type": "session", "row": {...}}          (before its messages)
+    {"type": "message", "row": {...}}
+    {"type": "archive", "row": {...}}          (compressed older messages)
+    ...
+    {"type": "footer", "counts": {"profiles": n, "sessions": n, "messages": n, "archives": n}}
+
+Archive rows are copied as they are (see message_archive.py), so archived
+history survives the round trip without being decompressed.
+
+Paths ending in ".gz" are gzip-compressed; "-" is stdout/stdin.
+
+Usage (from the project root; Supabase settings come from the
+environment, so point SUPABASE_URL/SUPABASE_ANON_KEY at the target project
+before importing):
+
+    python data_portability.py export --user-id <uuid> --out user.ndjson.gz
+    python data_portability.py import --in user.ndjson.gz [--as-user <uuid>]
+
+Rows still waiting in the write-behind journal are not in Supabase yet;
+export after the app has flushed them (see write_journal.py).
+"""
+
+import argparse
+import gzip
+import io
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from circuit_breaker import get_breaker
+from supabase_client import get_supabase
+
+FORMAT_VERSION = 1
+PAGE_SIZE = 1000
+BATCH_SIZE = 500
+# Archive rows carry up to message_archive.BLOB_MAX_MESSAGES messages each.
+ARCHIVE_PAGE_SIZE = 20
+
+# Keyset position: (created_at, id) of the last row read.
+Cursor = Tuple[str, str]
+# Columns of the keyset: message archives have no created_at of their own.
+ROW_ORDER = ("created_at", "id")
+ARCHIVE_ORDER = ("first_created_at", "first_id")
+
+
+def _execute(query: Any) -> List[Dict[str, Any]]:
+    resp = get_breaker("supabase").call(query.execute)
+    return list(getattr(resp, "data", None) or [])
+
+
+def _after(query: Any, cursor: Optional[Cursor], order: Tuple[str, str] = ROW_ORDER) -> Any:
+    """Rows strictly after `cursor` in `order` (default (created_at, id))."""
+
+    if cursor is None:
+        return query
+    time_column, id_column = order
+    created_at, row_id = cursor
+    return query.or_(
+        f'{time_column}.gt."{created_at}",'
+        f'and({time_column}.eq."{created_at}",{id_column}.gt."{row_id}")'
+    )
+
+
+def _paged(
+    table: str,
+    column: str,
+    value: str,
+    page_size: int,
+    order: Tuple[str, str] = ROW_ORDER,
+) -> Iterator[Dict[str, Any]]:
+    """All rows of `table` with column == value, oldest first, one page at a time."""
+
+    time_column, id_column = order
+    cursor: Optional[Cursor] = None
+    while True:
+        query = get_supabase().table(table).select("*").eq(column, value)
+        rows = _execute(
+            _after(query, cursor, order)
+            .order(time_column, desc=False)
+            .order(id_column, desc=False)
+            .limit(page_size)
+        )
+        yield from rows
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1][time_column], rows[-1][id_column])
+
+
+def iter_user_records(user_id: str, page_size: int = PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield the export records of one user (header to footer)."""
+
+    counts = {"profiles": 0, "sessions": 0, "messages": 0, "archives": 0}
+    yield {
+        "type": "header",
+        "version": FORMAT_VERSION,
+        "user_id": user_id,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    for row in _execute(get_supabase().table("profiles").select("*").eq("user_id", user_id)):
+        counts["profiles"] += 1
+        yield {"type": "profile", "row": row}
+
+    for session in _paged("chat_sessions", "user_id", user_id, page_size):
+        counts["sessions"] += 1
+        yield {"type": "session", "row": session}
+        for message in _paged("messages", "session_id", session["id"], page_size):
+            counts["messages"] += 1
+            yield {"type": "message", "row": message}
+        for archive in _paged(
+            "message_archives", "session_id", session["id"], min(page_size, ARCHIVE_PAGE_SIZE), ARCHIVE_ORDER
+        ):
+            counts["archives"] += 1
+            yield {"type": "archive", "row": archive}
+
+    yield {"type": "footer", "counts": counts}
+
+
+@contextmanager
+def _open(path: str, mode: str) -> Iterator[IO[str]]:
+    if path == "-":
+        yield sys.stdout if mode == "w" else sys.stdin
+    elif path.endswith(".gz"):
+        with gzip.open(path, mode + "t", encoding="utf-8") as f:
+            yield f
+    else:
+        with io.open(path, mode, encoding="utf-8") as f:
+            yield f
+
+
+def export_user(user_id: str, path: str, page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """Stream one user's data to an NDJSON file; returns the record counts."""
+
+    counts: Dict[str, int] = {}
+    with _open(path, "w") as out:
+        for record in iter_user_records(user_id, page_size):
+            out.write(json.dumps(record, default=str) + "\n")
+            if record["type"] == "footer":
+                counts = record["counts"]
+    return counts
+
+
+class _BatchWriter:
+    """Buffers rows per table and upserts them in batches.
+
+    Sessions are always written before the messages and archives that
+    reference them.
+    """
+
+    def __init__(self, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.sessions: List[Dict[str, Any]] = []
+        self.messages: List[Dict[str, Any]] = []
+        self.archives: List[Dict[str, Any]] = []
+        self.counts = {"profiles": 0, "sessions": 0, "messages": 0, "archives": 0}
+
+    def profile(self, row: Dict[str, Any]) -> None:
+        _execute(get_supabase().table("profiles").upsert(row, on_conflict="user_id"))
+        self.counts["profiles"] += 1
+
+    def session(self, row: Dict[str, Any]) -> None:
+        self.sessions.append(row)
+        if len(self.sessions) >= self.batch_size:
+            self.flush_sessions()
+
+    def message(self, row: Dict[str, Any]) -> None:
+        self.messages.append(row)
+        if len(self.messages) >= self.batch_size:
+            self.flush()
+
+    def archive(self, row: Dict[str, Any]) -> None:
+        self.archives.append(row)
+        if len(self.archives) >= min(self.batch_size, ARCHIVE_PAGE_SIZE):
+            self.flush()
+
+    def flush_sessions(self) -> None:
+        if self.sessions:
+            _execute(get_supabase().table("chat_sessions").upsert(self.sessions, on_conflict="id"))
+            self.counts["sessions"] += len(self.sessions)
+            self.sessions = []
+
+    def flush(self) -> None:
+        self.flush_sessions()
+        if self.messages:
+            _execute(
+                get_supabase()
+                .table("messages")
+                .upsert(self.messages, on_conflict="id", ignore_duplicates=True)
+            )
+            self.counts["messages"] += len(self.messages)
+            self.messages = []
+        if self.archives:
+            _execute(
+                get_supabase()
+                .table("message_archives")
+                .upsert(self.archives, on_conflict="id", ignore_duplicates=True)
+            )
+            # Readers only look for archives of flagged sessions.
+            _execute(
+                get_supabase()
+                .table("chat_sessions")
+                .update({"has_archive": True})
+                .in_("id", sorted({row["session_id"] for row in self.archives}))
+            )
+            self.counts["archives"] += len(self.archives)
+            self.archives = []
+
+
+def import_user(path: str, as_user: str | None = None, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Stream an NDJSON export into Supabase; returns the rows written per table.
+
+    `as_user` re-owns the profile and sessions (e.g. when the account has a
+    different id in the target project).
+    """
+
+    writer = _BatchWriter(batch_size)
+    with _open(path, "r") as source:
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.get("type")
+            row = dict(record.get("row") or {})
+            if kind == "header":
+                if record.get("version") != FORMAT_VERSION:
+                    raise RuntimeError(
+                        f"Unsupported export format version {record.get('version')!r} "
+                        f"(expected {FORMAT_VERSION})."
+                    )
+                continue
+            if kind in ("profile", "session") and as_user:
+                row["user_id"] = as_user
+            if kind == "profile":
+                writer.profile(row)
+            elif kind == "session":
+                writer.session(row)
+            elif kind == "message":
+                writer.message(row)
+            elif kind == "archive":
+                writer.archive(row)
+            elif kind != "footer":
+                raise RuntimeError(f"Unknown record type {kind!r} on line {line_number}.")
+    writer.flush()
+    return writer.counts
+
+
+def main(argv: List[str] | None = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="Export one user's data to NDJSON.")
+    export_cmd.add_argument("--user-id", required=True)
+    export_cmd.add_argument("--out", required=True, help='Output path (".gz" to compress, "-" for stdout).')
+    export_cmd.add_argument("--page-size", type=int, default=PAGE_SIZE)
+
+    import_cmd = commands.add_parser("import", help="Import an NDJSON export.")
+    import_cmd.add_argument("--in", dest="path", required=True, help='Input path ("-" for stdin).')
+    import_cmd.add_argument("--as-user", help="Import the data under this user id.")
+    import_cmd.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        counts = export_user(args.user_id, args.out, args.page_size)
+    else:
+        counts = import_user(args.path, args.as_user, args.batch_size)
+    print(json.dumps({args.command: counts}), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Local, dependency-light text embeddings.
+
+`HashingEmbedder` maps text to a fixed-size, L2-normalized NumPy vector
+using signed feature hashing over content words and word bigrams. It needs
+no model download and no network call, runs in microseconds per query and
+is good enough for near-duplicate detection (semantic cache) and lexical
+recall (conversation memory). Cosine similarity is a plain dot product.
+"""
+
+import re
+import zlib
+from typing import Iterable, List
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+
+# Function words carry no topical signal and would otherwise make every
+# "how do I ..." question look alike.
+STOPWORDS = frozenset(
+    """
+    a an the and or but if then so of to in on at by for with from into about
+    as is are was were be been being do does did doing have has had having
+    i me my we our you your he she it its they them their this that these those
+    what which who whom how why when where can could should would will shall may
+    might must just also very really any some there here not no yes please
+    get got make made want need like know tell give let
+    """.split()
+)
+
+# Negations are stopwords for topical matching, but they flip the meaning of
+# advice ("should I (not) accept the counteroffer?"), so embedders that
+# match whole questions keep them.
+NEGATIONS = frozenset("not no never nor cannot without".split())
+_NEGATED_CONTRACTION_RE = re.compile(r"n['\u2019]t\b")
+
+
+def _stem(token: str) -> str:
+    """Very light plural folding ("interviews" -> "interview")."""
+
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str, keep_negations: bool = False) -> List[str]:
+    """Lowercase word tokens with stopwords removed.
+
+    With `keep_negations`, negation words survive and contractions such as
+    "don't" become "do not".
+    """
+
+    text = text.lower()
+    if keep_negations:
+        text = _NEGATED_CONTRACTION_RE.sub(" not", text)
+        return [
+            _stem(t) for t in _TOKEN_RE.findall(text) if t in NEGATIONS or t not in STOPWORDS
+        ]
+    return [_stem(t) for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+class HashingEmbedder:
+    """Signed feature-hashing embedder (unigrams + bigrams)."""
+
+    def __init__(self, dim: int = 512, bigram_weight: float = 0.5, keep_negations: bool = False) -> None:
+        self.dim = dim
+        self.bigram_weight = bigram_weight
+        self.keep_negations = keep_negations
+
+    def _features(self, tokens: List[str]) -> Iterable[tuple]:
+        for token in tokens:
+            yield token, 1.0
+        for left, right in zip(tokens, tokens[1:]):
+            yield f"{left} {right}", self.bigram_weight
+
+    def embed(self, text: str) -> np.ndarray:
+        """Return a unit-length float32 vector (all zeros for empty text)."""
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(tokenize(text, self.keep_negations)):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Low bits pick the bucket, one high bit picks the sign so that
+            # collisions cancel out on average instead of accumulating.
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            vector[h % self.dim] += sign * weight
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        rows = [self.embed(t) for t in texts]
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(rows)
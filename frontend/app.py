@@ -1,6 +1,10 @@
 import os
 import sys
+import threading
 import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List
 
 import streamlit as st
 
@@ -10,8 +14,18 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from graph import run_session, list_user_sessions, get_session_messages
+from graph import (
+    run_session,
+    run_session_stream,
+    list_user_sessions,
+    get_session_messages,
+    message_cursor,
+    search_conversations,
+    warm_up,
+)
+from auth_tokens import AuthError, AuthSession, get_token_verifier, verify_user
 from supabase_client import sign_up_user, sign_in_user
+from usage_ledger import QuotaExceededError
 
 
 st.set_page_config(
@@ -20,24 +34,293 @@ st.set_page_config(
 )
 
 
+# The sidebar session list is fetched one page at a time and reused across
+# reruns until it expires or a new session is created, so ordinary reruns
+# (keystrokes, chat messages) cost no backend round trips.
+SESSION_PAGE_SIZE = 20
+SESSION_CACHE_TTL_SECONDS = 300
+
+# Only the latest page of a conversation is fetched and rendered; older
+# pages are loaded on demand so reruns cost the same for any session length.
+MESSAGE_PAGE_SIZE = 30
+# At most this many messages are kept in st.session_state per browser
+# session; the oldest are dropped (and can be fetched again) beyond it.
+CHAT_HISTORY_MAX_MESSAGES = 300
+# Longer messages are refused by the input box (a pasted CV still fits).
+MAX_USER_MESSAGE_CHARS = 12000
+
+# A message re-submitted within this window reuses its idempotency key.
+TURN_KEY_REUSE_SECONDS = 30
+
+# Conversations listed under the sidebar search box.
+SEARCH_RESULT_LIMIT = 8
+
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """Small shared pool used to prefetch session messages in the background."""
+
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="remiro-prefetch")
+
+
+@st.cache_resource(show_spinner=False)
+def start_backend_warm_up() -> threading.Thread:
+    """Build the LLM clients, agents and compiled graph once per process.
+
+    Runs in a background thread so the login screen renders immediately
+    while the heavy backend initialization happens in parallel.
+    """
+
+    thread = threading.Thread(target=warm_up, name="remiro-warm-up", daemon=True)
+    thread.start()
+    try:
+        # Starts fetching the token signing keys in the background too.
+        get_token_verifier()
+    except AuthError:
+        pass  # Supabase not configured; login reports it
+    return thread
+
+
+def turn_key_for(user_input: str) -> str:
+    """Client-side idempotency key for submitting `user_input` in this session.
+
+    Re-submitting the same text within TURN_KEY_REUSE_SECONDS (a rerun or a
+    double submit) reuses the key, so the backend attaches to the turn
+    already running instead of starting a second one.
+    """
+
+    pending = st.session_state.pending_turn
+    now = time.time()
+    if (
+        not pending
+        or pending["input"] != user_input
+        or pending["session_id"] != st.session_state.session_id
+        or now - pending["at"] > TURN_KEY_REUSE_SECONDS
+    ):
+        pending = {
+            "input": user_input,
+            "session_id": st.session_state.session_id,
+            "key": str(uuid.uuid4()),
+            "at": now,
+        }
+        st.session_state.pending_turn = pending
+    return pending["key"]
+
+
 def init_state() -> None:
     if "user_id" not in st.session_state:
         st.session_state.user_id = None
+    if "auth" not in st.session_state:
+        st.session_state.auth = None
     if "email" not in st.session_state:
         st.session_state.email = ""
     if "session_id" not in st.session_state:
         st.session_state.session_id = None
     if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+        set_chat_history([])
     if "auth_mode" not in st.session_state:
         st.session_state.auth_mode = "Login"
+    if "response_mode" not in st.session_state:
+        st.session_state.response_mode = "balanced"
+    if "sessions_cache" not in st.session_state:
+        st.session_state.sessions_cache = None
+    if "message_prefetch" not in st.session_state:
+        st.session_state.message_prefetch = {}
+    if "pending_turn" not in st.session_state:
+        # Idempotency key of the last submitted message (see turn_key_for).
+        st.session_state.pending_turn = None
+
+
+def set_chat_history(messages: List[Dict[str, Any]], has_more: bool = False) -> None:
+    """Replace the local chat history with the latest page of a session."""
+
+    st.session_state.chat_history = [m for m in messages if m["role"] in ("user", "assistant")]
+    # Whether older pages exist in the backend before chat_history[0].
+    st.session_state.history_has_more = has_more
+    # How many of the most recent local messages are rendered.
+    st.session_state.visible_count = MESSAGE_PAGE_SIZE
+
+
+def load_earlier_messages() -> None:
+    """Reveal the next older page, fetching it from the backend if needed."""
+
+    history = st.session_state.chat_history
+    hidden = len(history) - st.session_state.visible_count
+    if hidden <= 0 and st.session_state.history_has_more and history:
+        cursor = message_cursor(history[0])
+        if cursor is None:
+            st.session_state.history_has_more = False
+        else:
+            page = get_session_messages(
+                st.session_state.session_id, cursor=cursor, limit=MESSAGE_PAGE_SIZE
+            )
+            st.session_state.history_has_more = len(page) == MESSAGE_PAGE_SIZE
+            st.session_state.chat_history = [
+                m for m in page if m["role"] in ("user", "assistant")
+            ] + history
+    st.session_state.visible_count += MESSAGE_PAGE_SIZE
+
+
+def append_chat_message(role: str, content: str) -> None:
+    """Append to the local chat history, keeping it within CHAT_HISTORY_MAX_MESSAGES."""
+
+    history = st.session_state.chat_history
+    history.append({"role": role, "content": content})
+    overflow = len(history) - CHAT_HISTORY_MAX_MESSAGES
+    if overflow > 0:
+        del history[:overflow]
+        st.session_state.history_has_more = True
+        st.session_state.visible_count = min(st.session_state.visible_count, len(history))
+
+
+def current_user_id() -> str | None:
+    """The signed-in user, re-verified from the access token on every rerun.
+
+    Verification is local (see auth_tokens.py), so this costs no network
+    call; an expired or revoked session logs the user out.
+    """
+
+    auth = st.session_state.auth
+    if not st.session_state.user_id or auth is None:
+        return None
+    try:
+        user = verify_user(auth.access_token())
+    except AuthError as e:
+        logout()
+        st.warning(f"Your session has ended, please log in again. ({e})")
+        return None
+    if user["user_id"] != st.session_state.user_id:
+        logout()
+        return None
+    return user["user_id"]
 
 
 def logout() -> None:
     st.session_state.user_id = None
+    st.session_state.auth = None
     st.session_state.email = ""
     st.session_state.session_id = None
-    st.session_state.chat_history = []
+    set_chat_history([])
+    invalidate_session_cache()
+    st.session_state.message_prefetch = {}
+
+
+def invalidate_session_cache() -> None:
+    """Force the next sidebar render to refetch the session list."""
+
+    st.session_state.sessions_cache = None
+
+
+def get_cached_sessions() -> Dict[str, Any]:
+    """Return the cached session list, refetching the first page when stale."""
+
+    cache = st.session_state.sessions_cache
+    user_id = st.session_state.user_id
+    expired = (
+        cache is None
+        or cache["user_id"] != user_id
+        or time.monotonic() - cache["fetched_at"] > SESSION_CACHE_TTL_SECONDS
+    )
+    if expired:
+        page = list_user_sessions(user_id, limit=SESSION_PAGE_SIZE)
+        cache = {
+            "user_id": user_id,
+            "items": page,
+            "has_more": len(page) == SESSION_PAGE_SIZE,
+            "fetched_at": time.monotonic(),
+        }
+        st.session_state.sessions_cache = cache
+
+        # Most users resume their latest conversation, so start loading it
+        # while they are still looking at the sidebar.
+        if page:
+            prefetch_session_messages(page[0]["id"])
+    return cache
+
+
+def load_more_sessions() -> None:
+    """Append the next keyset page (older than the last shown session)."""
+
+    cache = st.session_state.sessions_cache
+    if not cache or not cache["items"]:
+        return
+    page = list_user_sessions(
+        cache["user_id"],
+        limit=SESSION_PAGE_SIZE,
+        before=cache["items"][-1]["created_at"],
+    )
+    cache["items"].extend(page)
+    cache["has_more"] = len(page) == SESSION_PAGE_SIZE
+
+
+def open_search_result(session_id: str, title: str) -> None:
+    """Select a session found by search (button callback, runs before the sidebar)."""
+
+    cache = st.session_state.sessions_cache
+    if cache and all(sess.get("id") != session_id for sess in cache["items"]):
+        # Older than the loaded pages: show it at the top of the list.
+        cache["items"].insert(0, {"id": session_id, "title": title, "created_at": None})
+    # Let the session radio pick the selection up from session_id.
+    st.session_state.pop("session_selector", None)
+    st.session_state.session_id = session_id
+    try:
+        msgs = fetch_session_messages(session_id)
+        set_chat_history(msgs, has_more=len(msgs) == MESSAGE_PAGE_SIZE)
+    except Exception as load_err:  # noqa: BLE001
+        set_chat_history([])
+        st.error(f"Could not load messages for this session: {load_err}")
+
+
+def render_search() -> None:
+    """Search box over the user's past messages, with matching conversations."""
+
+    query = st.text_input(
+        "Search conversations",
+        key="search_query",
+        placeholder="e.g. salary negotiation",
+    )
+    if not query.strip():
+        return
+    try:
+        hits = search_conversations(st.session_state.user_id, query, limit=SEARCH_RESULT_LIMIT)
+    except Exception:  # noqa: BLE001
+        st.caption("(Search is unavailable right now.)")
+        return
+    if not hits:
+        st.caption("No matching conversations.")
+        return
+    for hit in hits:
+        st.button(
+            hit["title"],
+            key=f"search_hit_{hit['session_id']}",
+            on_click=open_search_result,
+            args=(hit["session_id"], hit["title"]),
+            use_container_width=True,
+        )
+        st.caption(hit["snippet"])
+
+
+def prefetch_session_messages(session_id: str) -> None:
+    """Start fetching a session's messages in the background (once)."""
+
+    prefetched = st.session_state.message_prefetch
+    if session_id not in prefetched:
+        prefetched[session_id] = get_prefetch_executor().submit(
+            get_session_messages, session_id, None, MESSAGE_PAGE_SIZE
+        )
+
+
+def fetch_session_messages(session_id: str) -> List[Dict[str, Any]]:
+    """Return the latest page of a session, using a prefetched result when available."""
+
+    future: Future | None = st.session_state.message_prefetch.pop(session_id, None)
+    if future is not None:
+        try:
+            return future.result()
+        except Exception:  # noqa: BLE001
+            # Fall through to a direct fetch so the real error is surfaced.
+            pass
+    return get_session_messages(session_id, limit=MESSAGE_PAGE_SIZE)
 
 
 def auth_description() -> None:
@@ -84,15 +367,20 @@ def render_auth_screen() -> None:
             try:
                 if mode == "Login":
                     auth_result = sign_in_user(email, password)
-                    st.success("Logged in successfully.")
                 else:
                     auth_result = sign_up_user(email, password)
-                    st.success("Account created and logged in.")
 
+                auth = AuthSession.from_auth_response(auth_result["raw"])
+                if auth is None:
+                    st.info("Account created. Confirm your email address, then log in.")
+                    return
+                st.success("Logged in successfully." if mode == "Login" else "Account created and logged in.")
+
+                st.session_state.auth = auth
                 st.session_state.user_id = auth_result["user_id"]
                 st.session_state.email = email
                 st.session_state.session_id = None
-                st.session_state.chat_history = []
+                set_chat_history([])
             except Exception as e:  # noqa: BLE001
                 st.error(f"Authentication failed: {e}")
 
@@ -107,59 +395,68 @@ def render_sidebar() -> None:
 
             if st.button("Log out", use_container_width=True):
                 logout()
-                st.experimental_rerun()
+                st.rerun()
 
             st.markdown("---")
 
+            st.radio(
+                "Response mode",
+                ["fast", "balanced", "thorough"],
+                key="response_mode",
+                horizontal=True,
+                help="Fast: one specialist, quickest answer. Thorough: more specialists and web search.",
+            )
+
             if st.button("New chat", use_container_width=True):
                 st.session_state.session_id = None
-                st.session_state.chat_history = []
+                set_chat_history([])
+
+            render_search()
 
             try:
-                sessions = list_user_sessions(st.session_state.user_id)
+                cache = get_cached_sessions()
+                sessions = cache["items"]
             except Exception:
                 # If loading sessions fails (for example, if the tables are not
                 # yet initialized in Supabase), do not interrupt the user with
                 # a red error popup. Instead, show a gentle hint and proceed.
                 st.caption("(We couldn't load past conversations yet. You can still start a new chat.)")
+                cache = None
                 sessions = []
 
             if sessions:
                 st.subheader("Your conversations")
 
-                # Build a mapping from label to session id for a cleaner selection UI.
-                labels = []
-                id_by_label = {}
-                for sess in sessions:
-                    title = sess.get("title") or "Untitled session"
-                    sid = sess.get("id")
-                    label = f"{title}"
-                    labels.append(label)
-                    id_by_label[label] = sid
+                # Select by id so sessions with identical titles stay distinct.
+                title_by_id = {
+                    sess.get("id"): sess.get("title") or "Untitled session"
+                    for sess in sessions
+                }
+                session_ids = list(title_by_id)
 
                 current_id = st.session_state.session_id
-                current_label = None
-                for lbl, sid in id_by_label.items():
-                    if sid == current_id:
-                        current_label = lbl
-                        break
-
-                selected_label = st.radio(
+                selected_id = st.radio(
                     "Select a session",
-                    labels,
-                    index=labels.index(current_label) if current_label in labels else 0,
+                    session_ids,
+                    index=session_ids.index(current_id) if current_id in session_ids else 0,
+                    format_func=lambda sid: title_by_id.get(sid, "Untitled session"),
                     key="session_selector",
                 )
 
-                selected_id = id_by_label.get(selected_label)
+                if cache and cache["has_more"]:
+                    if st.button("Load more", use_container_width=True):
+                        try:
+                            load_more_sessions()
+                        except Exception as more_err:  # noqa: BLE001
+                            st.error(f"Could not load more conversations: {more_err}")
+                        st.rerun()
+
                 if selected_id and selected_id != st.session_state.session_id:
                     st.session_state.session_id = selected_id
                     # Load past messages for this session into the local history
                     try:
-                        msgs = get_session_messages(selected_id)
-                        st.session_state.chat_history = [
-                            m for m in msgs if m["role"] in ("user", "assistant")
-                        ]
+                        msgs = fetch_session_messages(selected_id)
+                        set_chat_history(msgs, has_more=len(msgs) == MESSAGE_PAGE_SIZE)
                     except Exception as load_err:  # noqa: BLE001
                         st.error(f"Could not load messages for this session: {load_err}")
             else:
@@ -173,53 +470,106 @@ def render_chat() -> None:
         "Remiro AI is not designed for real‑time market data, medical, legal, or general trivia questions."
     )
 
-    # Display existing chat history
-    for msg in st.session_state.chat_history:
+    # Display only the most recent window of the chat history; older
+    # messages are revealed (and fetched) page by page on request.
+    history = st.session_state.chat_history
+    visible = history[-st.session_state.visible_count:]
+    if len(visible) < len(history) or st.session_state.history_has_more:
+        if st.button("Load earlier messages"):
+            try:
+                load_earlier_messages()
+            except Exception as load_err:  # noqa: BLE001
+                st.error(f"Could not load earlier messages: {load_err}")
+            st.rerun()
+
+    for msg in visible:
         role = msg.get("role", "assistant")
         content = msg.get("content", "")
         with st.chat_message(role):
             st.markdown(content)
 
-    user_input = st.chat_input("Ask about your career, goals, or next moves...")
+    # Re-phrase the last answer from the cached specialist outputs (only the
+    # synthesizer runs again).
+    if st.session_state.session_id and history and history[-1].get("role") == "assistant":
+        if st.button("Regenerate answer"):
+            with st.spinner("Rephrasing the last answer..."):
+                try:
+                    result = run_session(
+                        user_id=st.session_state.user_id,
+                        user_input="",
+                        session_id=st.session_state.session_id,
+                        regenerate=True,
+                        response_mode=st.session_state.response_mode,
+                    )
+                    history[-1] = {"role": "assistant", "content": result.get("reply", "")}
+                    st.session_state.message_prefetch.pop(st.session_state.session_id, None)
+                except Exception as e:  # noqa: BLE001
+                    st.error(f"Could not regenerate the answer: {e}")
+            st.rerun()
+
+    user_input = st.chat_input(
+        "Ask about your career, goals, or next moves...", max_chars=MAX_USER_MESSAGE_CHARS
+    )
 
     if user_input:
         # Optimistically show the user message
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
+        append_chat_message("user", user_input)
         with st.chat_message("user"):
             st.markdown(user_input)
 
-        # Get assistant reply via the orchestrated backend, then stream it
-        # into the UI word-by-word for a more responsive feel.
+        # Stream the turn: node progress goes into a status box and reply
+        # tokens into the message as the synthesizer produces them.
         with st.chat_message("assistant"):
+            status = st.status("Thinking with the specialist agents...", expanded=False)
             placeholder = st.empty()
-            with st.spinner("Thinking with all specialist agents..."):
-                try:
-                    result = run_session(
-                        user_id=st.session_state.user_id,
-                        user_input=user_input,
-                        session_id=st.session_state.session_id,
-                    )
-                    reply = result.get("reply", "")
-                    st.session_state.session_id = result.get("session_id", st.session_state.session_id)
-                except Exception as e:  # noqa: BLE001
-                    reply = f"There was an error processing your request: {e}"
-
-            # Simple front-end streaming: progressively reveal the reply
-            # once it is available from the backend.
             streamed = ""
-            for word in reply.split(" "):
-                streamed += (word + " ")
-                placeholder.markdown(streamed)
-                # Small delay to make the streaming perceptible but fast.
-                time.sleep(0.01)
+            try:
+                result: Dict[str, Any] = {}
+                for event in run_session_stream(
+                    user_id=st.session_state.user_id,
+                    user_input=user_input,
+                    session_id=st.session_state.session_id,
+                    response_mode=st.session_state.response_mode,
+                    idempotency_key=turn_key_for(user_input),
+                ):
+                    if event["type"] == "progress":
+                        status.update(label=event["message"])
+                        status.write(event["message"])
+                    elif event["type"] == "token":
+                        streamed += event["text"]
+                        placeholder.markdown(streamed + "▌")
+                    elif event["type"] == "result":
+                        result = event
+                reply = result.get("reply", "") or streamed
+                new_session_id = result.get("session_id", st.session_state.session_id)
+                if new_session_id != st.session_state.session_id:
+                    # A session row was just created; the cached list is stale.
+                    invalidate_session_cache()
+                st.session_state.session_id = new_session_id
+                # Any prefetched copy of this session is now outdated.
+                st.session_state.message_prefetch.pop(new_session_id, None)
+                status.update(label="Done", state="complete")
+                if result.get("response_mode") not in (None, st.session_state.response_mode):
+                    st.caption(
+                        f"You're close to today's usage limit, so this answer used the "
+                        f"{result['response_mode']} mode."
+                    )
+            except QuotaExceededError as e:
+                reply = str(e)
+                status.update(label="Daily limit reached", state="error")
+            except Exception as e:  # noqa: BLE001
+                reply = f"There was an error processing your request: {e}"
+                status.update(label="Something went wrong", state="error")
+            placeholder.markdown(reply)
 
-        st.session_state.chat_history.append({"role": "assistant", "content": reply})
+        append_chat_message("assistant", reply)
 
 
 def main() -> None:
     init_state()
+    start_backend_warm_up()
 
-    if not st.session_state.user_id:
+    if not current_user_id():
         render_auth_screen()
     else:
         render_sidebar()
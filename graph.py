@@ -1,83 +1,300 @@
+import contextvars
 import os
-from typing import TypedDict, Annotated, List, Dict, Any
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from queue import Queue
+from typing import TypedDict, Annotated, List, Dict, Any, Callable, Iterator, Tuple
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
-from langgraph.graph.message import add_messages
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.graph.message import REMOVE_ALL_MESSAGES, add_messages
+from langgraph.types import Command
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage
 from dotenv import load_dotenv
 
+from circuit_breaker import BreakerCallback, get_breaker
+from connections import gemini_client_args, warm_up_connections
+from conversation_memory import format_memory_context, get_user_memory, memory_enabled
+from message_archive import archived_rows_before, note_new_session, note_session_rows
+from model_policy import ModelUsageCallback, choose_model
+from output_compression import compress_agent_outputs
+from profile_compaction import compact_profile, merge_profile_update, profile_fields, profile_for_prompt
+from profile_triggers import should_update_profile
+from response_modes import DEFAULT_RESPONSE_MODE, get_response_mode, node_settings
+from scope_guard import OUT_OF_SCOPE_REPLY, classify_scope, scope_guard_enabled
+from search_index import get_search_index, search_enabled
+from semantic_cache import get_semantic_cache, is_profile_independent
 from supabase_client import get_supabase
-
-# Import Agents
-from agents import (
-    CoreIdentityArchitect,
-    PurposeMotivationNavigator,
-    GrandStrategyDirector,
-    CapabilityGrowthEngineer,
-    WorkplaceDynamicsCultureCoach,
-    ChiefMarketingOfficer,
-    QueryParser,
-    ResponseSynthesizer,
-    WebSearcher,
-    ProfileUpdater,
+from usage_ledger import (
+    UsageLedger,
+    UsageLedgerCallback,
+    annotate_usage,
+    apply_quota,
+    get_usage_ledger,
+    new_turn_usage,
+    usage_scope,
 )
+from write_journal import get_write_journal
 
 # Load environment variables
 load_dotenv()
 
 # Define State
+def merge_agent_outputs(current: Dict[str, str] | None, update: Dict[str, str] | None) -> Dict[str, str]:
+    """Reducer for agent_outputs: nodes return only the outputs they produced.
+
+    An empty update clears the outputs; that is how a new turn's input
+    (see new_turn_state) starts from none.
+    """
+
+    if not update:
+        return {}
+    return {**(current or {}), **update}
+
+
 class AgentState(TypedDict):
     messages: Annotated[List[Any], add_messages]
     user_profile: Dict[str, Any]  # Shared memory for structured user data
     active_agents: List[str]      # List of agents selected by the router
-    agent_outputs: Dict[str, str] # Outputs from the specialist agents for the synthesizer
+    agent_outputs: Annotated[Dict[str, str], merge_agent_outputs]  # Outputs from the specialist agents for the synthesizer
     web_search_results: str | None  # Optional shared web search context
+    memory_context: str | None  # Relevant snippets from the user's past conversations
+    response_mode: str  # Pipeline profile for this turn (see response_modes.py)
+    tokens_used: int  # Estimated output tokens generated so far this turn
+    profile_processed_ids: List[str]  # Messages already seen by the profile updater
+    progressive: bool  # Stream progress/tokens and synthesize progressively (run_session_stream)
+    synthesis_opening: str | None  # Opening already streamed while specialists were running
+
+# --- Lazy construction of LLMs, agents and the compiled graph ---
+#
+# Nothing below talks to Gemini or Serper at import time. The Gemini
+# clients, agent objects and the compiled app are built on first use (or
+# eagerly via warm_up()), so tools that only need the persistence helpers
+# (e.g. list_user_sessions) do not pay for langchain_google_genai,
+# langchain_community or graph compilation.
 
-# Initialize LLM (Google Gemini)
 # Use a currently supported chat model; see Google AI docs for options.
-# max_tokens caps response length to control cost across all agents.
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.7,
-    max_tokens=512,
-)
+DEFAULT_MODEL = "gemini-2.5-flash"
 
-# A lighter-outputs LLM variant for utility-style agents where
-# short, factual responses are sufficient (router, web search,
-# profile updates, history summarization).
-utility_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.5,
-    max_tokens=256,
-)
 
-# Initialize Agent Classes
-identity_agent = CoreIdentityArchitect(llm)
-purpose_agent = PurposeMotivationNavigator(llm)
-strategy_agent = GrandStrategyDirector(llm)
-capability_agent = CapabilityGrowthEngineer(llm)
-dynamics_agent = WorkplaceDynamicsCultureCoach(llm)
-cmo_agent = ChiefMarketingOfficer(llm)
-
-# Utility agents use the smaller-output LLM to minimize cost where
-# only compact facts or structured updates are needed.
-router = QueryParser(utility_llm)
-synthesizer = ResponseSynthesizer(llm)
-web_searcher = WebSearcher(utility_llm)
-profile_updater = ProfileUpdater(utility_llm)
+@lru_cache(maxsize=None)
+def get_chat_model(model: str = DEFAULT_MODEL, temperature: float = 0.7, max_tokens: int = 512):
+    """Return a shared Gemini chat client for the given settings.
+
+    Every client reports latency, token usage and estimated cost per call
+    to model_policy (see model_policy.model_stats()) and to the per-user
+    usage ledger, and is guarded by the "gemini" circuit breaker, so calls
+    fail fast during an outage. Each client's own google-genai client sends
+    its requests through the shared keep-alive pool (see connections.py).
+    """
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        client_args=gemini_client_args(),
+        callbacks=[
+            ModelUsageCallback(model),
+            UsageLedgerCallback(model, get_ledger()),
+            BreakerCallback(get_breaker("gemini")),
+        ],
+    )
+
+
+# tier -> (temperature, default max_tokens)
+LLM_TIERS: Dict[str, tuple] = {
+    "main": (0.7, 512),
+    "utility": (0.5, 256),
+}
+
+
+def get_llm():
+    """Main LLM; max_tokens caps response length to control cost across all agents."""
+
+    return get_chat_model(DEFAULT_MODEL, *LLM_TIERS["main"])
+
+
+def get_utility_llm():
+    """A lighter-outputs LLM variant for utility-style agents where
+    short, factual responses are sufficient (router, web search,
+    profile updates, history summarization).
+    """
+
+    return get_chat_model(DEFAULT_MODEL, *LLM_TIERS["utility"])
+
+
+# agent_id -> (class name in the agents package, LLM tier). Utility agents
+# use the smaller-output LLM to minimize cost where only compact facts or
+# structured updates are needed.
+AGENT_SPECS: Dict[str, tuple] = {
+    "core_identity_architect": ("CoreIdentityArchitect", "main"),
+    "purpose_motivation_navigator": ("PurposeMotivationNavigator", "main"),
+    "grand_strategy_director": ("GrandStrategyDirector", "main"),
+    "capability_growth_engineer": ("CapabilityGrowthEngineer", "main"),
+    "workplace_dynamics_coach": ("WorkplaceDynamicsCultureCoach", "main"),
+    "chief_marketing_officer": ("ChiefMarketingOfficer", "main"),
+    "router": ("QueryParser", "utility"),
+    "synthesizer": ("ResponseSynthesizer", "main"),
+    "web_searcher": ("WebSearcher", "utility"),
+    "profile_updater": ("ProfileUpdater", "utility"),
+}
+
+# Display names used as keys in agent_outputs for the synthesizer.
+SPECIALIST_NAMES: Dict[str, str] = {
+    "core_identity_architect": "Core Identity Architect",
+    "purpose_motivation_navigator": "Purpose Navigator",
+    "grand_strategy_director": "Strategy Director",
+    "capability_growth_engineer": "Capability Engineer",
+    "workplace_dynamics_coach": "Dynamics Coach",
+    "chief_marketing_officer": "Chief Marketing Officer",
+}
+
+
+@lru_cache(maxsize=None)
+def get_agent(agent_id: str, model: str | None = None, max_tokens: int | None = None):
+    """Return the shared agent instance for an agent id (see AGENT_SPECS).
+
+    `model` and `max_tokens` override the tier defaults; each distinct
+    combination gets its own (cached) agent bound to a matching client.
+    """
+
+    import agents
+
+    class_name, tier = AGENT_SPECS[agent_id]
+    temperature, default_max_tokens = LLM_TIERS[tier]
+    agent_llm = get_chat_model(model or DEFAULT_MODEL, temperature, max_tokens or default_max_tokens)
+    return getattr(agents, class_name)(agent_llm)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for turn budgets."""
+
+    return len(text or "") // 4 + 1
+
+
+def get_node_agent(state: "AgentState", agent_id: str, node: str, pending_calls: int = 1):
+    """Agent for a node, picked by the model policy for this turn.
+
+    The response mode's node settings are the starting point; the policy
+    then chooses the model and max_tokens from the query's complexity and
+    the output tokens left in the mode's per-turn budget, shared among the
+    `pending_calls` generation calls still to run (see model_policy).
+    """
+
+    mode_name = state.get("response_mode")
+    messages = state.get("messages") or []
+    query = getattr(messages[-1], "content", "") if messages else ""
+    tokens_remaining = get_response_mode(mode_name)["token_budget"] - state.get("tokens_used", 0)
+    choice = choose_model(
+        node,
+        str(query),
+        node_settings(mode_name, node),
+        tokens_remaining=tokens_remaining,
+        pending_calls=pending_calls,
+    )
+    return get_agent(agent_id, choice["model"], choice["max_tokens"])
+
+
+# Backwards-compatible module attributes (graph.llm, graph.router, ...)
+# resolved lazily through __getattr__ below.
+_LAZY_ATTRIBUTES = {
+    "llm": get_llm,
+    "utility_llm": get_utility_llm,
+    "identity_agent": lambda: get_agent("core_identity_architect"),
+    "purpose_agent": lambda: get_agent("purpose_motivation_navigator"),
+    "strategy_agent": lambda: get_agent("grand_strategy_director"),
+    "capability_agent": lambda: get_agent("capability_growth_engineer"),
+    "dynamics_agent": lambda: get_agent("workplace_dynamics_coach"),
+    "cmo_agent": lambda: get_agent("chief_marketing_officer"),
+    "router": lambda: get_agent("router"),
+    "synthesizer": lambda: get_agent("synthesizer"),
+    "web_searcher": lambda: get_agent("web_searcher"),
+    "profile_updater": lambda: get_agent("profile_updater"),
+    "app": lambda: get_app(),
+    "checkpointer": lambda: get_graph_checkpointer(),
+}
+
+
+def __getattr__(name: str):
+    factory = _LAZY_ATTRIBUTES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory()
 
 # --- Node Functions ---
 
+# --- Progress events ---
+#
+# Nodes report progress through LangGraph's custom stream ("custom" stream
+# mode); run_session_stream forwards these events to the caller. Outside a
+# streaming run the writer is a no-op.
+
+StreamWriter = Callable[[Dict[str, Any]], None]
+
+
+def _stream_writer() -> StreamWriter:
+    """The current run's custom stream writer (a no-op outside a graph run)."""
+
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda event: None
+
+
+def emit_progress(stage: str, message: str, writer: StreamWriter | None = None, **details: Any) -> None:
+    """Emit a {"type": "progress"} event, e.g. stage="routing"."""
+
+    (writer or _stream_writer())({"type": "progress", "stage": stage, "message": message, **details})
+
+
+def scope_guard_node(state: AgentState):
+    """Answer clearly off-topic queries with the canned reply, without any LLM call.
+
+    Unsure or in-scope queries pass through unchanged to the router (see
+    scope_guard.py for the rules, model and thresholds). Once the session
+    has had an in-scope answer the guard is skipped: a short follow-up
+    ("what about the politics angle?") cannot be judged without the
+    conversation, and the synthesizer still enforces the domain.
+    """
+
+    if not scope_guard_enabled():
+        return {}
+    if any(
+        isinstance(m, AIMessage) and m.content != OUT_OF_SCOPE_REPLY
+        for m in state["messages"][:-1]
+    ):
+        return {}
+    decision = classify_scope(str(state["messages"][-1].content))
+    if decision.label != "off_topic":
+        return {}
+    return {"messages": [_reply_message(state, OUT_OF_SCOPE_REPLY)]}
+
+
+def scope_next(state: AgentState) -> str:
+    """Skip the whole pipeline when the scope guard already answered."""
+
+    if isinstance(state["messages"][-1], AIMessage):
+        return "out_of_scope"
+    return "router"
+
+
 def router_node(state: AgentState):
     """Analyzes the user query and selects the appropriate agents."""
     last_message = state["messages"][-1].content
-    result = router.get_chain().invoke({"input": last_message})
+    mode = get_response_mode(state.get("response_mode"))
+    emit_progress("routing", "Working out which specialists to ask...")
+    result = get_node_agent(state, "router", "router").get_chain().invoke({"input": last_message})
 
     # Base list from the router LLM
     destination_agents = list(getattr(result, "destination_agents", []) or [])
 
     # --- 1) Limit how many specialist agents run per query ---
-    max_specialist_agents = 3
+    max_specialist_agents = mode["max_specialists"]
     specialist_order = [
         "core_identity_architect",
         "purpose_motivation_navigator",
@@ -134,10 +351,18 @@ def router_node(state: AgentState):
 
     # Only keep the web_searcher when the query clearly needs fresh data,
     # or when the router chose ONLY the web_searcher and no specialists.
-    if wants_web_search:
-        if needs_web_search or not selected_specialists:
+    # Fast mode never searches; thorough mode trusts the router.
+    # Skip web search entirely while the Serper breaker is open.
+    web_policy = mode["web_search"]
+    if wants_web_search and web_policy != "off" and not get_breaker("serper").is_open():
+        if web_policy == "router" or needs_web_search or not selected_specialists:
             active_agents.append("web_searcher")
 
+    emit_progress(
+        "routed",
+        "Consulting " + (", ".join(SPECIALIST_NAMES[a] for a in selected_specialists) or "the web"),
+        agents=active_agents,
+    )
     return {"active_agents": active_agents}
 
 
@@ -151,15 +376,18 @@ def web_search_node(state: AgentState):
 
     # Use the WebSearcher helper to run Serper + LLM summarization without
     # relying on any model-specific tool-calling APIs.
+    emit_progress("web_search", "Searching the web...")
+    specialists = [a for a in state.get("active_agents", []) if a in SPECIALIST_NAMES]
+    web_searcher = get_node_agent(
+        state, "web_searcher", "web_searcher", pending_calls=len(specialists) + 2
+    )
     content = web_searcher.run(last_message, history)
 
     # Store as global web context and also as an agent output under a fixed key
-    new_agent_outputs = dict(state.get("agent_outputs", {}))
-    new_agent_outputs["web_searcher"] = content
-
     return {
         "web_search_results": content,
-        "agent_outputs": new_agent_outputs,
+        "agent_outputs": {"web_searcher": content},
+        "tokens_used": state.get("tokens_used", 0) + estimate_tokens(content),
     }
 
 def run_agent(
@@ -173,17 +401,16 @@ def run_agent(
     In addition to the raw user message, we inject:
     - Shared user_profile data.
     - Shared web_search_results (if any).
+    - Relevant snippets retrieved from the user's past conversations (if any).
     - Optionally, summarized outputs from other agents that have already
       run in this turn (prior_agent_insights).
     """
 
     last_message = state["messages"][-1].content
 
-    # Compact user profile context (avoid sending an unbounded dict string).
-    profile = state.get("user_profile", {})
-    profile_str = str(profile)
-    if len(profile_str) > 1200:
-        profile_str = profile_str[:1200] + "... (truncated)"
+    # The profile's compact summary is already size-capped (see
+    # profile_compaction.py), so it is sent as-is.
+    profile_str = profile_for_prompt(state.get("user_profile", {}))
     profile_context = f"\n\n[Shared User Profile Data]: {profile_str}"
 
     # Compact shared web search context if present.
@@ -194,6 +421,14 @@ def run_agent(
             web_text = web_text[:1200] + "... (truncated)"
         web_context = f"\n\n[Shared Web Search Data]: {web_text}"
 
+    # Retrieved long-term memory is already ranked and size-capped.
+    memory_context = ""
+    if state.get("memory_context"):
+        memory_context = (
+            "\n\n[Relevant Earlier Conversation]:\n"
+            f"{state['memory_context']}"
+        )
+
     # Limit how much of the prior agents' insights we resend.
     insights_context = ""
     if prior_agent_insights:
@@ -206,7 +441,7 @@ def run_agent(
             f"{insights_text}"
         )
 
-    full_input = last_message + profile_context + web_context + insights_context
+    full_input = last_message + profile_context + web_context + memory_context + insights_context
 
     # Only send a short recent history window to each specialist.
     history = state.get("messages", [])
@@ -221,64 +456,53 @@ def run_agent(
 
 # Individual Agent Nodes
 def specialist_agents_node(state: AgentState):
-    """Runs all selected specialist agents (except web_searcher) and aggregates outputs."""
-    outputs: Dict[str, str] = dict(state.get("agent_outputs", {}))
+    """Runs all selected specialist agents (except web_searcher) and aggregates outputs.
+
+    Only this node's outputs are returned; merge_agent_outputs adds them to
+    the web searcher's.
+    """
+    earlier_outputs = state.get("agent_outputs") or {}
+    outputs: Dict[str, str] = {}
     active = state.get("active_agents", [])
 
     # Accumulate a simple text summary of previous agents' outputs so that
     # later agents in this turn can see what has already been concluded.
     prior_insights_str = ""
 
-    for agent_id in active:
-        if agent_id == "web_searcher":
-            # Already handled (if selected) by web_search_node
-            continue
+    # web_searcher was already handled (if selected) by web_search_node and
+    # unknown agent ids are skipped.
+    specialists = [a for a in active if a in SPECIALIST_NAMES]
+    mode = get_response_mode(state.get("response_mode"))
+    # Generation calls still to come after the specialists: the synthesizer,
+    # unless a lone specialist's answer is passed through.
+    synthesis_calls = 0 if mode["single_agent_passthrough"] and len(earlier_outputs) + len(specialists) == 1 else 1
+    tokens_used = state.get("tokens_used", 0)
+
+    # Progressive synthesis: once the first output lands and more
+    # specialists are still to run, stream an opening in the background so
+    # the user sees the answer start while the rest are working.
+    writer = _stream_writer()
+    progressive = bool(state.get("progressive")) and synthesis_calls and len(specialists) > 1
+    opening: Dict[str, str] = {}
+    opening_thread: threading.Thread | None = None
+
+    for position, agent_id in enumerate(specialists):
+        agent_name = SPECIALIST_NAMES[agent_id]
+        emit_progress("specialist_started", f"{agent_name} is thinking...", writer, agent=agent_name)
+        agent = get_node_agent(
+            {**state, "tokens_used": tokens_used},
+            agent_id,
+            "specialist",
+            pending_calls=len(specialists) - position + synthesis_calls,
+        )
 
-        if agent_id == "core_identity_architect":
-            result = run_agent(
-                identity_agent,
-                state,
-                "Core Identity Architect",
-                prior_agent_insights=prior_insights_str,
-            )
-        elif agent_id == "purpose_motivation_navigator":
+        with usage_scope(agent=agent_id):
             result = run_agent(
-                purpose_agent,
+                agent,
                 state,
-                "Purpose Navigator",
+                agent_name,
                 prior_agent_insights=prior_insights_str,
             )
-        elif agent_id == "grand_strategy_director":
-            result = run_agent(
-                strategy_agent,
-                state,
-                "Strategy Director",
-                prior_agent_insights=prior_insights_str,
-            )
-        elif agent_id == "capability_growth_engineer":
-            result = run_agent(
-                capability_agent,
-                state,
-                "Capability Engineer",
-                prior_agent_insights=prior_insights_str,
-            )
-        elif agent_id == "workplace_dynamics_coach":
-            result = run_agent(
-                dynamics_agent,
-                state,
-                "Dynamics Coach",
-                prior_agent_insights=prior_insights_str,
-            )
-        elif agent_id == "chief_marketing_officer":
-            result = run_agent(
-                cmo_agent,
-                state,
-                "Chief Marketing Officer",
-                prior_agent_insights=prior_insights_str,
-            )
-        else:
-            # Unknown agent id; skip
-            continue
 
         # Merge this agent's output into the aggregated outputs
         outputs.update(result)
@@ -286,60 +510,280 @@ def specialist_agents_node(state: AgentState):
         # Also append it into the shared insights string for later agents
         for name, text in result.items():
             prior_insights_str += f"--- {name} ---\n{text}\n\n"
+            tokens_used += estimate_tokens(text)
+        emit_progress("specialist_done", f"{agent_name} done", writer, agent=agent_name)
+
+        if progressive and opening_thread is None and position < len(specialists) - 1:
+            # Run in a copy of this node's context: the stream writer needs it.
+            opening_thread = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(
+                    _stream_opening,
+                    state["messages"][-1].content,
+                    {**earlier_outputs, **outputs},
+                    state.get("response_mode"),
+                    writer,
+                    opening,
+                ),
+                daemon=True,
+            )
+            opening_thread.start()
+
+    if opening_thread is not None:
+        opening_thread.join()
+        tokens_used += estimate_tokens(opening.get("text", ""))
+
+    update: Dict[str, Any] = {
+        "tokens_used": tokens_used,
+        "synthesis_opening": opening.get("text") or None,
+    }
+    if outputs:
+        # An empty update would clear the web searcher's output.
+        update["agent_outputs"] = outputs
+    return update
+
+
+OPENING_MAX_TOKENS = 192
+OPENING_STYLE = {
+    "scope": (
+        "Write only the opening of the answer: 2-3 sentences that acknowledge the "
+        "user's situation and set up the advice. More specialist input is still "
+        "arriving and the rest of the answer will follow."
+    ),
+}
+
+
+def _stream_opening(
+    user_query: str,
+    agent_outputs: Dict[str, str],
+    response_mode: str | None,
+    writer: StreamWriter,
+    result: Dict[str, str],
+) -> None:
+    """Stream an opening from the first specialist outputs (runs in a thread)."""
+
+    try:
+        with usage_scope(agent="synthesizer"):
+            synthesizer = get_agent(
+                "synthesizer",
+                node_settings(response_mode, "synthesizer").get("model"),
+                OPENING_MAX_TOKENS,
+            )
+            result["text"] = _run_synthesizer(
+                synthesizer,
+                user_query,
+                _format_agent_outputs(agent_outputs, user_query, response_mode),
+                _format_style(OPENING_STYLE),
+                lambda text: writer({"type": "token", "text": text}),
+            )
+        if result["text"]:
+            writer({"type": "token", "text": "\n\n"})
+    except Exception:  # noqa: BLE001 - the full synthesis still runs
+        result.pop("text", None)
+
+
+def _format_style(style: Dict[str, str] | None) -> str:
+    """Render optional style settings (tone, length, format, ...) for the synthesizer."""
+
+    if not style:
+        return ""
+    return "\n".join(f"- {key}: {value}" for key, value in style.items() if value)
+
+
+def _format_agent_outputs(agent_outputs: Dict[str, str], user_query: str, response_mode: str | None) -> str:
+    """Agent outputs for the synthesizer, deduplicated and fitted to the mode's budget."""
+
+    return compress_agent_outputs(
+        agent_outputs,
+        user_query,
+        get_response_mode(response_mode)["synthesis_input_tokens"],
+    )
+
+
+def _run_synthesizer(
+    synthesizer,
+    user_query: str,
+    formatted_outputs: str,
+    style_instructions: str,
+    on_token: Callable[[str], None] | None = None,
+) -> str:
+    """Invoke the synthesizer chain, streaming chunks to `on_token` if given."""
+
+    chain = synthesizer.get_chain(style_instructions=style_instructions)
+    inputs = {
+        "user_query": user_query,
+        "agent_outputs": formatted_outputs,
+        "style_instructions": style_instructions,
+    }
+    if on_token is None:
+        return chain.invoke(inputs).content
+
+    parts: List[str] = []
+    for chunk in chain.stream(inputs):
+        text = chunk.content if isinstance(chunk.content, str) else ""
+        if text:
+            parts.append(text)
+            on_token(text)
+    return "".join(parts)
+
+
+def synthesize_reply(
+    user_query: str,
+    agent_outputs: Dict[str, str],
+    style: Dict[str, str] | None = None,
+    response_mode: str | None = None,
+    tokens_used: int = 0,
+    opening: str | None = None,
+    on_token: Callable[[str], None] | None = None,
+) -> str:
+    """Run the ResponseSynthesizer over a set of agent outputs.
+
+    `tokens_used` is what the turn has already generated; the synthesizer's
+    max_tokens is capped by what is left of the mode's token budget.
+
+    With `opening` (already shown to the user), the synthesizer continues
+    from it and the returned reply is the opening plus the continuation.
+    `on_token` receives the generated text chunk by chunk.
+    """
+
+    formatted_outputs = _format_agent_outputs(agent_outputs, user_query, response_mode)
+
+    style = dict(style or {})
+    if opening:
+        style["continuation"] = (
+            "The user has already been shown the opening below. Continue the answer "
+            "from there, folding in all specialist outputs, without repeating the "
+            f"opening or greeting again. Opening: \"{opening}\""
+        )
+    style_instructions = _format_style(style)
+    synthesizer = get_node_agent(
+        {
+            "response_mode": response_mode,
+            "messages": [HumanMessage(content=user_query)],
+            "tokens_used": tokens_used,
+        },
+        "synthesizer",
+        "synthesizer",
+    )
+    reply = _run_synthesizer(synthesizer, user_query, formatted_outputs, style_instructions, on_token)
+    return f"{opening}\n\n{reply}" if opening else reply
 
-    return {"agent_outputs": outputs}
 
 def synthesizer_node(state: AgentState):
     """Synthesizes all agent outputs into a final response."""
     user_query = state["messages"][-1].content
-    agent_outputs = state["agent_outputs"]
-    
-    # Format outputs for the synthesizer, but cap total length to keep context small
-    formatted_outputs = "\n\n".join([f"--- {k} ---\n{v}" for k, v in agent_outputs.items()])
-    if len(formatted_outputs) > 4000:
-        formatted_outputs = formatted_outputs[:4000] + "... (truncated)"
-    
-    response = synthesizer.get_chain().invoke({
-        "user_query": user_query,
-        "agent_outputs": formatted_outputs
-    })
-    
-    return {"messages": [AIMessage(content=response.content)]}
+    tokens_used = state.get("tokens_used", 0)
+    writer = _stream_writer()
+    emit_progress("synthesizing", "Putting the answer together...", writer)
+    reply = synthesize_reply(
+        user_query,
+        state["agent_outputs"],
+        response_mode=state.get("response_mode"),
+        tokens_used=tokens_used,
+        opening=state.get("synthesis_opening"),
+        on_token=(lambda text: writer({"type": "token", "text": text})) if state.get("progressive") else None,
+    )
+    return {
+        "messages": [_reply_message(state, reply)],
+        "tokens_used": tokens_used + estimate_tokens(reply),
+    }
+
+
+def passthrough_node(state: AgentState):
+    """Return a lone specialist's output as the final answer (no synthesizer call)."""
+
+    (reply,) = state["agent_outputs"].values()
+    if state.get("progressive"):
+        _stream_writer()({"type": "token", "text": reply})
+    return {"messages": [_reply_message(state, reply)]}
+
+
+def synthesis_next(state: AgentState) -> str:
+    """Skip the synthesizer when the mode allows it and only one agent answered."""
+
+    mode = get_response_mode(state.get("response_mode"))
+    outputs = state.get("agent_outputs") or {}
+    if mode["single_agent_passthrough"] and len(outputs) == 1 and "web_searcher" not in outputs:
+        return "passthrough"
+    return "synthesizer"
 
 
 def profile_updater_node(state: AgentState):
-    """Updates the long-term user_profile based on recent conversation."""
-    # Run this less frequently to save tokens: only on every 3rd user turn.
-    messages = state.get("messages", [])
-    human_count = sum(1 for m in messages if getattr(m, "type", None) == "human")
-    if human_count % 3 != 0:
-        return {}
+    """Updates the long-term user_profile from messages it has not seen yet.
+
+    `profile_processed_ids` is the high-water mark: ids of the messages in
+    state that were already considered, so each message is sent to the
+    ProfileUpdater at most once. The LLM is only called when the local
+    detector (profile_triggers) finds a probable stable fact in the user's
+    unseen messages, or when too many of them have piled up; otherwise the
+    messages stay unseen and are reconsidered next turn.
+    """
 
-    # Build a compact text representation of recent messages
-    recent_messages = state.get("messages", [])[-8:]
+    messages = [
+        m for m in state.get("messages", []) if getattr(m, "name", None) != HISTORY_SUMMARY_NAME
+    ]
+    processed = state.get("profile_processed_ids")
+    if processed is None:
+        # No mark yet (new thread or no checkpointer): everything before the
+        # current user message is treated as already processed.
+        last_human = max(
+            (i for i, m in enumerate(messages) if getattr(m, "type", None) == "human"),
+            default=len(messages),
+        )
+        processed = [m.id for m in messages[:last_human]]
+    processed_set = set(processed)
+
+    unseen = [m for m in messages if m.id not in processed_set]
+    user_texts = [str(m.content) for m in unseen if getattr(m, "type", None) == "human"]
+    # Keep the mark bounded to messages still present in state.
+    present_ids = [m.id for m in messages if m.id in processed_set]
+
+    if not user_texts or should_update_profile(user_texts) is None:
+        return {"profile_processed_ids": present_ids}
+
+    # Build a compact text representation of the unseen messages. Assistant
+    # replies are only context for the user's answers, so keep them short.
     conversation_lines = []
-    for msg in recent_messages:
+    for msg in unseen:
         role = msg.type if hasattr(msg, "type") else msg.__class__.__name__
-        content = getattr(msg, "content", str(msg))
+        content = str(getattr(msg, "content", msg))
+        if role != "human" and len(content) > 300:
+            content = content[:300] + "..."
         conversation_lines.append(f"[{role}] {content}")
 
     conversation_text = "\n".join(conversation_lines)
 
     current_profile = state.get("user_profile", {})
 
-    result = profile_updater.get_chain().invoke(
+    result = get_node_agent(state, "profile_updater", "profile_updater").get_chain().invoke(
         {
-            "current_profile": current_profile,
+            "current_profile": profile_for_prompt(current_profile) or "{}",
             "conversation_text": conversation_text,
         }
     )
 
-    updated = dict(current_profile)
-    # Merge only the new/changed fields
-    for key, value in (result.updated_profile or {}).items():
-        updated[key] = value
+    # Merge only the new/changed fields; keys are normalized, fields carry
+    # timestamps/hit counts and the profile is kept within its size budget.
+    updated = merge_profile_update(current_profile, result.updated_profile or {})
+
+    return {
+        "user_profile": updated,
+        "profile_processed_ids": present_ids + [m.id for m in unseen],
+    }
+
+
+# Name given to the rolling summary message so it is kept in graph state but
+# never persisted as a regular chat message.
+HISTORY_SUMMARY_NAME = "history_summary"
 
-    return {"user_profile": updated}
+# Bounds of the message list in graph state. Past STATE_MAX_MESSAGES, the
+# older messages (at most SUMMARY_SOURCE_MESSAGES of them) are folded into
+# the rolling summary and only STATE_KEEP_RECENT stay verbatim, so a
+# session's state never holds more than STATE_MAX_MESSAGES + 2 messages
+# (see benchmarks/memory_footprint.py).
+STATE_MAX_MESSAGES = 60
+STATE_KEEP_RECENT = 10
+SUMMARY_SOURCE_MESSAGES = 40
 
 
 def history_manager_node(state: AgentState):
@@ -353,18 +797,14 @@ def history_manager_node(state: AgentState):
 
     messages = state.get("messages", [])
     # Raise the threshold so summarization happens less often.
-    max_messages = 60
-    keep_recent = 10
-
-    if len(messages) <= max_messages:
+    if len(messages) <= STATE_MAX_MESSAGES:
         return {}
 
-    older = messages[:-keep_recent]
+    older = messages[:-STATE_KEEP_RECENT]
     # Only summarize a bounded window of older messages to avoid huge prompts.
-    max_older_messages = 40
-    if len(older) > max_older_messages:
-        older = older[-max_older_messages:]
-    recent = messages[-keep_recent:]
+    if len(older) > SUMMARY_SOURCE_MESSAGES:
+        older = older[-SUMMARY_SOURCE_MESSAGES:]
+    recent = messages[-STATE_KEEP_RECENT:]
 
     lines = []
     for msg in older:
@@ -382,33 +822,24 @@ def history_manager_node(state: AgentState):
 
     # Use the smaller-output LLM here; the summary only needs to be
     # short and factual.
-    summary_response = utility_llm.invoke(summary_prompt)
+    summary_response = get_utility_llm().invoke(summary_prompt)
     summary_content = getattr(summary_response, "content", str(summary_response))
 
     summary_message = AIMessage(
-        content=f"(Summary of earlier conversation)\n{summary_content}"
+        content=f"(Summary of earlier conversation)\n{summary_content}",
+        name=HISTORY_SUMMARY_NAME,
     )
 
-    new_messages = [summary_message] + recent
+    # The add_messages reducer only appends/merges, so the older messages
+    # must be removed explicitly; otherwise the checkpointed state would
+    # keep growing with every turn.
+    new_messages = [RemoveMessage(id=REMOVE_ALL_MESSAGES), summary_message] + recent
 
     return {"messages": new_messages}
 
 
 # --- Graph Construction ---
 
-workflow = StateGraph(AgentState)
-
-# Add Nodes
-workflow.add_node("router", router_node)
-workflow.add_node("web_searcher", web_search_node)
-workflow.add_node("specialist_agents", specialist_agents_node)
-workflow.add_node("synthesizer", synthesizer_node)
-workflow.add_node("profile_updater", profile_updater_node)
-workflow.add_node("history_manager", history_manager_node)
-
-# Set Entry Point
-workflow.set_entry_point("router")
-
 
 def router_next(state: AgentState) -> str:
     """Decide whether to run web_searcher first or go straight to specialists."""
@@ -418,27 +849,167 @@ def router_next(state: AgentState) -> str:
     return "specialist_agents"
 
 
-# From router, either go to web_searcher (if selected) or straight to specialists
-workflow.add_conditional_edges(
-    "router",
-    router_next,
-    {
-        "web_searcher": "web_searcher",
-        "specialist_agents": "specialist_agents",
-    },
-)
+def build_workflow() -> StateGraph:
+    """Declare the (uncompiled) agent graph."""
+
+    workflow = StateGraph(AgentState)
+
+    # Add Nodes
+    workflow.add_node("scope_guard", scope_guard_node)
+    workflow.add_node("router", router_node)
+    workflow.add_node("web_searcher", web_search_node)
+    workflow.add_node("specialist_agents", specialist_agents_node)
+    workflow.add_node("synthesizer", synthesizer_node)
+    workflow.add_node("passthrough", passthrough_node)
+    workflow.add_node("profile_updater", profile_updater_node)
+    workflow.add_node("history_manager", history_manager_node)
+
+    # Set Entry Point
+    workflow.set_entry_point("scope_guard")
+
+    # Clearly off-topic queries were already answered by the scope guard;
+    # only history management runs for them.
+    workflow.add_conditional_edges(
+        "scope_guard",
+        scope_next,
+        {
+            "router": "router",
+            "out_of_scope": "history_manager",
+        },
+    )
+
+    # From router, either go to web_searcher (if selected) or straight to specialists
+    workflow.add_conditional_edges(
+        "router",
+        router_next,
+        {
+            "web_searcher": "web_searcher",
+            "specialist_agents": "specialist_agents",
+        },
+    )
+
+    # If web_searcher runs, always continue to specialists
+    workflow.add_edge("web_searcher", "specialist_agents")
+
+    # From specialists to synthesizer (or straight through when a single
+    # specialist answered in fast mode), then profile updater, then history
+    # manager, then end
+    workflow.add_conditional_edges(
+        "specialist_agents",
+        synthesis_next,
+        {
+            "synthesizer": "synthesizer",
+            "passthrough": "passthrough",
+        },
+    )
+    workflow.add_edge("synthesizer", "profile_updater")
+    workflow.add_edge("passthrough", "profile_updater")
+    workflow.add_edge("profile_updater", "history_manager")
+    workflow.add_edge("history_manager", END)
+
+    return workflow
+
+
+# Compiled lazily by get_app(). The checkpointer lets each turn resume
+# from the session's last state (thread_id = session_id) instead of
+# rebuilding it from Supabase.
+_compiled_app = None
+_graph_checkpointer = None
+_shared_answer_app = None
+
+
+def get_graph_checkpointer():
+    """Return the checkpointer the app is compiled with (None if disabled)."""
+
+    get_app()
+    return _graph_checkpointer
+
+
+def get_app():
+    """Return the compiled LangGraph app, compiling it on first use."""
+
+    global _compiled_app, _graph_checkpointer
+
+    if _compiled_app is None:
+        from checkpointer import get_checkpointer
+
+        _graph_checkpointer = get_checkpointer()
+        _compiled_app = build_workflow().compile(checkpointer=_graph_checkpointer)
+    return _compiled_app
+
+
+def get_shared_answer_app():
+    """The graph compiled without a checkpointer, for answers shared via the semantic cache.
+
+    Turns run on it start from an empty profile and no history, so nothing
+    of the asking user reaches the answer.
+    """
+
+    global _shared_answer_app
+
+    if _shared_answer_app is None:
+        _shared_answer_app = build_workflow().compile()
+    return _shared_answer_app
+
+
+def warm_up(agent_ids: List[str] | None = None, connections: bool = True) -> None:
+    """Eagerly build the compiled app, LLM clients and agents.
+
+    Long-running workers can call this at startup (or from a background
+    thread) so the first user turn does not pay for lazy initialization.
+    With `connections`, keep-alive connections to Supabase and Gemini are
+    opened too. CLI tools that only use the persistence helpers should not
+    call it.
+    """
+
+    get_app()
+    for agent_id in agent_ids or list(AGENT_SPECS):
+        get_agent(agent_id)
+    if connections:
+        warm_up_connections()
+
+
+# --- Regeneration cache ---
+#
+# The specialist outputs of recent turns, keyed by (session_id, turn_id), so
+# "regenerate" can re-run only the synthesizer (one LLM call) instead of the
+# router, web search and every specialist. Bounded LRU, per process.
+TURN_CACHE_MAX_ENTRIES = 256
+
+_turn_cache: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+_latest_turn_by_session: Dict[str, str] = {}
+_turn_cache_lock = threading.Lock()
+
+
+def _remember_turn(session_id: str, turn_id: str, entry: Dict[str, Any]) -> None:
+    with _turn_cache_lock:
+        _turn_cache[(session_id, turn_id)] = entry
+        _turn_cache.move_to_end((session_id, turn_id))
+        _latest_turn_by_session[session_id] = turn_id
+        while len(_turn_cache) > TURN_CACHE_MAX_ENTRIES:
+            (old_session, old_turn), _ = _turn_cache.popitem(last=False)
+            if _latest_turn_by_session.get(old_session) == old_turn:
+                del _latest_turn_by_session[old_session]
+
 
-# If web_searcher runs, always continue to specialists
-workflow.add_edge("web_searcher", "specialist_agents")
+def _recall_turn(session_id: str, turn_id: str | None) -> Tuple[str | None, Dict[str, Any] | None]:
+    """Return (turn_id, cached entry); turn_id defaults to the session's latest turn."""
 
-# From specialists to synthesizer, then profile updater, then history manager, then end
-workflow.add_edge("specialist_agents", "synthesizer")
-workflow.add_edge("synthesizer", "profile_updater")
-workflow.add_edge("profile_updater", "history_manager")
-workflow.add_edge("history_manager", END)
+    with _turn_cache_lock:
+        turn_id = turn_id or _latest_turn_by_session.get(session_id)
+        if turn_id is None:
+            return None, None
+        entry = _turn_cache.get((session_id, turn_id))
+        if entry is not None:
+            _turn_cache.move_to_end((session_id, turn_id))
+        return turn_id, entry
+
+
+def _thread_config(session_id: str) -> Dict[str, Any]:
+    """LangGraph config addressing the checkpoint thread of a session."""
+
+    return {"configurable": {"thread_id": session_id}}
 
-# Compile
-app = workflow.compile()
 
 def _db_role_from_message(msg: Any) -> str:
     """Map a LangChain message to a DB role string."""
@@ -466,35 +1037,153 @@ def _message_from_db_row(row: Dict[str, Any]) -> Any:
     return AIMessage(content=content)
 
 
+def _execute(query):
+    """Execute a Supabase query through the "supabase" circuit breaker.
+
+    Raises CircuitOpenError without touching the network while the
+    breaker is open.
+    """
+
+    return get_breaker("supabase").call(query.execute)
+
+
+# Last profile loaded or saved per user, served when Supabase is unavailable.
+PROFILE_CACHE_MAX_ENTRIES = 1024
+_profile_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_profile_cache_lock = threading.Lock()
+
+
+def _cache_profile(user_id: str, profile: Dict[str, Any]) -> None:
+    with _profile_cache_lock:
+        _profile_cache[user_id] = profile
+        _profile_cache.move_to_end(user_id)
+        while len(_profile_cache) > PROFILE_CACHE_MAX_ENTRIES:
+            _profile_cache.popitem(last=False)
+
+
 def load_user_profile(user_id: str) -> Dict[str, Any]:
-    """Load (or initialize) the long-term user_profile from Supabase."""
+    """Load (or initialize) the long-term user_profile from Supabase.
 
+    A profile still waiting in the write-behind journal is newer than the
+    stored one and is returned instead. If Supabase fails (or its breaker
+    is open), the last profile seen for the user in this process is
+    served; without one the error is raised rather than risking an empty
+    profile overwriting the stored one.
+    """
+
+    journal = get_write_journal(_write_rows)
+    if journal is not None:
+        pending = journal.pending_rows("profiles", lambda row: row.get("user_id") == user_id)
+        if pending:
+            return pending[-1]["data"]
+
+    try:
+        profile = _load_stored_profile(user_id)
+    except Exception:
+        with _profile_cache_lock:
+            cached = _profile_cache.get(user_id)
+        if cached is None:
+            raise
+        return cached
+    _cache_profile(user_id, profile)
+    return profile
+
+
+def _load_stored_profile(user_id: str) -> Dict[str, Any]:
     sb = get_supabase()
-    resp = (
+    resp = _execute(
         sb.table("profiles")
         .select("data")
         .eq("user_id", user_id)
         .maybe_single()
-        .execute()
     )
 
     data = getattr(resp, "data", None) or (resp.get("data") if isinstance(resp, dict) else None)
     if data:
         # modern supabase-py returns either a dict or a list of dicts
         row = data if isinstance(data, dict) else data[0]
-        return row.get("data", {}) or {}
+        stored = row.get("data", {}) or {}
+        if not stored:
+            return {}
+        # Ages out stale fields and upgrades profiles written before
+        # compaction existed; written back only when something changed.
+        compacted = compact_profile(stored)
+        if compacted != stored:
+            save_user_profile(user_id, compacted)
+        return compacted
 
     # If no profile exists yet (or we cannot see one due to RLS),
     # ensure an empty row exists using an upsert to avoid duplicate-key errors.
-    sb.table("profiles").upsert({"user_id": user_id, "data": {}}).execute()
+    _execute(sb.table("profiles").upsert({"user_id": user_id, "data": {}}))
     return {}
 
 
 def save_user_profile(user_id: str, profile: Dict[str, Any]) -> None:
-    """Persist the user_profile back to Supabase."""
+    """Persist the user_profile back to Supabase (via the write-behind journal)."""
+
+    _cache_profile(user_id, profile)
+    _persist_rows("profiles", [{"user_id": user_id, "data": profile}])
+
+
+def _write_rows(table: str, rows: List[Dict[str, Any]]) -> None:
+    """Idempotently write rows to Supabase (also the journal's flush target).
+
+    Every row carries its primary key, so re-sending a batch after a
+    failure or crash cannot create duplicates. Message rows overwrite a
+    stored row with the same id, which is how a regenerated reply replaces
+    its predecessor; re-sent rows are identical, so this stays idempotent.
+    """
 
     sb = get_supabase()
-    sb.table("profiles").upsert({"user_id": user_id, "data": profile}).execute()
+    if table == "profiles":
+        # Only the newest profile of each user in a batch matters.
+        latest: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            latest[row["user_id"]] = row
+        _execute(sb.table("profiles").upsert(list(latest.values()), on_conflict="user_id"))
+    else:
+        _execute(sb.table(table).upsert(rows, on_conflict="id", ignore_duplicates=table != "messages"))
+
+
+def _persist_rows(table: str, rows: List[Dict[str, Any]]) -> None:
+    """Hand rows to the write-behind journal, or write them now if it is disabled."""
+
+    journal = get_write_journal(_write_rows)
+    if journal is not None:
+        journal.append(table, rows)
+    else:
+        _write_rows(table, rows)
+
+
+def _load_daily_usage(user_id: str, day: str) -> Dict[str, float]:
+    """Sum a user's stored (and still journaled) usage_ledger rows for a day."""
+
+    def is_users_day(row: Dict[str, Any]) -> bool:
+        return row.get("user_id") == user_id and row.get("day") == day
+
+    resp = _execute(
+        get_supabase()
+        .table("usage_ledger")
+        .select("calls, input_tokens, output_tokens, cost_usd")
+        .eq("user_id", user_id)
+        .eq("day", day)
+    )
+    rows = list(resp.data or [])
+    journal = get_write_journal(_write_rows)
+    if journal is not None:
+        rows.extend(journal.pending_rows("usage_ledger", is_users_day))
+
+    totals = {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+    for row in rows:
+        for name in totals:
+            totals[name] += row.get(name) or 0
+    return totals
+
+
+def get_ledger() -> UsageLedger:
+    """The process-wide usage ledger, flushing through the write journal."""
+
+    return get_usage_ledger(lambda rows: _persist_rows("usage_ledger", rows), _load_daily_usage)
 
 
 def get_or_create_session(user_id: str, session_id: str | None, title: str | None) -> str:
@@ -514,81 +1203,286 @@ def get_or_create_session(user_id: str, session_id: str | None, title: str | Non
     # In supabase-py v2, insert() returns the inserted rows by default
     # when returning="representation" (the default). There is no .select()
     # method on the insert builder, so we just execute and read the data.
-    resp = sb.table("chat_sessions").insert({"user_id": user_id, "title": title}).execute()
+    journal = get_write_journal(_write_rows)
+    if journal is not None and get_breaker("supabase").is_open():
+        # Supabase is down: create the session locally; the journal writes
+        # it before the session's messages once the database is back.
+        new_id = str(uuid.uuid4())
+        journal.append("chat_sessions", [{
+            "id": new_id,
+            "user_id": user_id,
+            "title": title,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }])
+        note_new_session(new_id)
+        return new_id
+
+    resp = _execute(sb.table("chat_sessions").insert({"user_id": user_id, "title": title}))
 
     data = getattr(resp, "data", None) or (resp.get("data") if isinstance(resp, dict) else None)
-    if isinstance(data, dict):
-        return data.get("id")
-    if isinstance(data, list) and data:
-        return data[0].get("id")
+    row = data if isinstance(data, dict) else (data[0] if isinstance(data, list) and data else None)
+    if row is not None and row.get("id"):
+        note_new_session(str(row["id"]))
+        return row["id"]
 
     raise RuntimeError("Failed to create or retrieve chat session ID from Supabase.")
 
 
-def load_session_messages(session_id: str) -> List[Any]:
-    """Load all messages for a given session from Supabase, oldest first."""
+# A message cursor is the (created_at, id) pair of the oldest message a
+# client already has; pages are fetched strictly before it.
+MessageCursor = Tuple[str, Any]
+
+
+def _select_session_message_rows(
+    session_id: str,
+    cursor: MessageCursor | None = None,
+    limit: int | None = None,
+    include_archived: bool = False,
+) -> List[Dict[str, Any]]:
+    """Return message rows of a session, oldest first.
+
+    With `limit`, only the newest `limit` rows older than `cursor` are read,
+    using keyset pagination on (created_at, id) so the cost of a page does
+    not depend on how long the session is. With `include_archived`, a page
+    that runs past the hot rows continues into the session's archived
+    history (see message_archive.py).
+    """
 
     sb = get_supabase()
-    resp = (
+    query = (
         sb.table("messages")
-        .select("role, content")
+        .select("id, role, content, created_at")
         .eq("session_id", session_id)
-        .order("created_at", desc=False)
-        .execute()
     )
+    if cursor is not None:
+        created_at, row_id = cursor
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+
+    if limit is None:
+        resp = _execute(query.order("created_at", desc=False).order("id", desc=False))
+    else:
+        resp = _execute(
+            query.order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+        )
 
-    data = getattr(resp, "data", None) or resp.get("data") if isinstance(resp, dict) else None
+    data = getattr(resp, "data", None) or (resp.get("data") if isinstance(resp, dict) else None)
     rows = data or []
+    if limit is not None:
+        rows = list(reversed(rows))
+
+    # Merge rows still waiting in the write-behind journal so a session
+    # reads its own latest messages before they reach Supabase.
+    journal = get_write_journal(_write_rows)
+    pending = [] if journal is None else journal.pending_rows(
+        "messages",
+        lambda row: row.get("session_id") == session_id
+        and (cursor is None or (row["created_at"], row["id"]) < tuple(cursor)),
+    )
+    if pending:
+        # A journaled row also replaces a stored one with the same id (a
+        # regenerated reply, see replace_session_message).
+        newest = {
+            row["id"]: {key: row[key] for key in ("id", "role", "content", "created_at")}
+            for row in pending
+        }
+        rows = [newest.pop(row.get("id"), row) for row in rows]
+        rows = sorted(rows + list(newest.values()), key=lambda row: (str(row.get("created_at")), str(row.get("id"))))
+        if limit is not None:
+            rows = rows[-limit:]
+
+    if include_archived and (limit is None or len(rows) < limit):
+        # Archived rows are all older than the hot ones; starting strictly
+        # before the oldest hot row also skips rows an interrupted archival
+        # run left in both places.
+        if rows:
+            before = (str(rows[0].get("created_at")), str(rows[0].get("id")))
+        else:
+            before = None if cursor is None else (str(cursor[0]), str(cursor[1]))
+        missing = None if limit is None else limit - len(rows)
+        rows = archived_rows_before(session_id, before, missing) + rows
+    return rows
+
+
+def load_session_messages(session_id: str, limit: int | None = None) -> List[Any]:
+    """Load the hot messages of a session from Supabase, oldest first.
+
+    Archived history (see message_archive.py) is not loaded; the rolling
+    summary in the checkpoint already covers it. With `limit`, only the
+    newest `limit` messages are loaded.
+    """
+
+    rows = _select_session_message_rows(session_id, limit=limit)
     return [_message_from_db_row(row) for row in rows]
 
 
-def append_session_messages(session_id: str, messages: List[Any]) -> None:
-    """Append new messages for this session into Supabase."""
+def append_session_messages(session_id: str, messages: List[Any], user_id: str | None = None) -> None:
+    """Append new messages for this session into Supabase.
+
+    created_at is assigned here, one microsecond apart, so messages written
+    in the same insert keep their order under (created_at, id) pagination
+    instead of sharing the transaction timestamp. The rows go through the
+    write-behind journal (see write_journal.py), so this returns as soon as
+    they are durable locally. With `user_id`, the messages are also added
+    to the user's search index (see search_conversations).
+    """
 
     if not messages:
         return
 
-    sb = get_supabase()
+    now = datetime.now(timezone.utc)
     rows = []
-    for msg in messages:
+    for i, msg in enumerate(messages):
         content = getattr(msg, "content", str(msg))
         role = _db_role_from_message(msg)
         rows.append({
+            # The message id doubles as the row id (idempotency key).
+            "id": _message_row_id(msg),
             "session_id": session_id,
             "role": role,
             "content": content,
+            "created_at": (now + timedelta(microseconds=i)).isoformat(),
         })
 
-    sb.table("messages").insert(rows).execute()
+    _persist_rows("messages", rows)
+
+    if user_id and search_enabled():
+        get_search_index(user_id).add({**row, "message_id": row["id"]} for row in rows)
+
+
+def session_title(first_message: str) -> str:
+    """Title of a session started with `first_message` (its first 60 characters)."""
+
+    if first_message and len(first_message) > 60:
+        return first_message[:60] + "..."
+    return first_message
+
+
+def replace_session_message(session_id: str, message: Any, user_id: str | None = None) -> None:
+    """Overwrite a stored message of this session with `message` (same id).
+
+    The row keeps its created_at, so the message stays in place, and with
+    `user_id` its search index entry is replaced too. A message that is no
+    longer in the messages table (archived, or never stored) is appended
+    instead, like append_session_messages.
+    """
+
+    journal = get_write_journal(_write_rows)
+    pending = [] if journal is None else journal.pending_rows(
+        "messages", lambda row: row.get("id") == message.id
+    )
+    if pending:
+        stored = pending[-1]
+    else:
+        resp = _execute(
+            get_supabase()
+            .table("messages")
+            .select("id, session_id, created_at")
+            .eq("id", message.id)
+            .limit(1)
+        )
+        data = getattr(resp, "data", None) or (resp.get("data") if isinstance(resp, dict) else None)
+        stored = (data or [None])[0]
+    if stored is None or stored.get("session_id") != session_id:
+        append_session_messages(session_id, [message], user_id=user_id)
+        return
+
+    row = {
+        "id": message.id,
+        "session_id": session_id,
+        "role": _db_role_from_message(message),
+        "content": getattr(message, "content", str(message)),
+        "created_at": stored["created_at"],
+    }
+    _persist_rows("messages", [row])
+
+    if user_id and search_enabled():
+        get_search_index(user_id).add([{**row, "message_id": row["id"]}], replace=True)
 
 
-def list_user_sessions(user_id: str) -> List[Dict[str, Any]]:
-    """Return a list of this user's chat sessions (for sidebar-style UI)."""
+def _message_row_id(message: Any) -> str:
+    """Row id for a message: its own id when that is a UUID, else a fresh one."""
+
+    message_id = getattr(message, "id", None)
+    try:
+        return str(uuid.UUID(str(message_id)))
+    except ValueError:
+        return str(uuid.uuid4())
+
+
+def list_user_sessions(
+    user_id: str,
+    limit: int | None = None,
+    before: str | None = None,
+) -> List[Dict[str, Any]]:
+    """Return a list of this user's chat sessions (for sidebar-style UI).
+
+    Sessions are ordered newest first. Pass `limit` to fetch one page and
+    `before` (the `created_at` of the last session already shown) to fetch
+    the next page using keyset pagination instead of an offset scan.
+    """
 
     sb = get_supabase()
-    resp = (
+    # "*" rather than a column list: has_archive (see message_archive.py)
+    # is read when the deployment has it, without failing when it does not.
+    query = (
         sb.table("chat_sessions")
-        .select("id, title, created_at")
+        .select("*")
         .eq("user_id", user_id)
-        .order("created_at", desc=True)
-        .execute()
     )
+    if before:
+        query = query.lt("created_at", before)
+    query = query.order("created_at", desc=True)
+    if limit is not None:
+        query = query.limit(limit)
+    resp = _execute(query)
 
-    data = getattr(resp, "data", None) or resp.get("data") if isinstance(resp, dict) else None
-    return data or []
-
-
-def get_session_messages(session_id: str) -> List[Dict[str, str]]:
+    data = getattr(resp, "data", None) or (resp.get("data") if isinstance(resp, dict) else None)
+    sessions = data or []
+    note_session_rows(sessions)
+
+    # Sessions created while Supabase was unavailable are still journaled.
+    journal = get_write_journal(_write_rows)
+    pending = [] if journal is None else journal.pending_rows(
+        "chat_sessions",
+        lambda row: row.get("user_id") == user_id and (not before or row["created_at"] < before),
+    )
+    if pending:
+        known_ids = {row.get("id") for row in sessions}
+        extra = [
+            {key: row[key] for key in ("id", "title", "created_at")}
+            for row in pending
+            if row["id"] not in known_ids
+        ]
+        sessions = sorted(sessions + extra, key=lambda row: str(row.get("created_at")), reverse=True)
+        if limit is not None:
+            sessions = sessions[:limit]
+    return sessions
+
+
+def get_session_messages(
+    session_id: str,
+    cursor: MessageCursor | None = None,
+    limit: int | None = None,
+) -> List[Dict[str, Any]]:
     """Return messages for a session as simple role/content dicts for UIs.
 
     Roles are normalized to "user", "assistant", or "system" to match
-    common chat UI expectations.
+    common chat UI expectations. Each dict also carries the row's `id` and
+    `created_at`; pass `message_cursor(oldest_message)` as `cursor` together
+    with `limit` to page backwards through long sessions. Without a limit
+    the whole session is returned.
     """
 
-    lc_messages = load_session_messages(session_id)
-    normalized: List[Dict[str, str]] = []
+    rows = _select_session_message_rows(session_id, cursor=cursor, limit=limit, include_archived=True)
+    normalized: List[Dict[str, Any]] = []
 
-    for msg in lc_messages:
+    for row in rows:
+        msg = _message_from_db_row(row)
         role = getattr(msg, "type", None)
         if role == "human":
             ui_role = "user"
@@ -600,67 +1494,661 @@ def get_session_messages(session_id: str) -> List[Dict[str, str]]:
             ui_role = "assistant"
 
         content = getattr(msg, "content", str(msg))
-        normalized.append({"role": ui_role, "content": content})
+        normalized.append({
+            "role": ui_role,
+            "content": content,
+            "id": row.get("id"),
+            "created_at": row.get("created_at"),
+        })
 
     return normalized
 
 
+def message_cursor(message: Dict[str, Any]) -> MessageCursor | None:
+    """Cursor for fetching the page before `message` (a get_session_messages item)."""
+
+    if message.get("created_at") is None or message.get("id") is None:
+        return None
+    return (message["created_at"], message["id"])
+
+
+# --- Conversation search ---
+
+SEARCH_BACKFILL_PAGE_SIZE = 100
+# How long a search waits for a user's first backfill before answering
+# from what is indexed so far.
+SEARCH_BACKFILL_WAIT_SECONDS = 2.0
+
+_backfills: Dict[str, threading.Thread] = {}
+_backfills_lock = threading.Lock()
+
+
+def search_conversations(user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Full-text search over a user's past conversations (BM25, see search_index.py).
+
+    Returns the best-matching message per session, best first, with
+    session_id, title, highlighted `snippet` (markdown), score and the
+    number of matching messages. Messages stored before the index existed
+    are indexed once, in the background, starting with the user's first
+    search; that search waits up to SEARCH_BACKFILL_WAIT_SECONDS for it
+    and searches what is indexed by then. After that, searches never read
+    the messages table.
+    """
+
+    if not search_enabled():
+        return []
+    index = get_search_index(user_id)
+    if not index.backfilled:
+        start_search_backfill(user_id).join(SEARCH_BACKFILL_WAIT_SECONDS)
+    hits = index.search(query, limit=limit)
+    for hit in hits:
+        hit["title"] = session_title(hit.pop("first_message")) or "Untitled session"
+    return hits
+
+
+def start_search_backfill(user_id: str) -> threading.Thread:
+    """Start indexing a user's stored messages in the background (once per process)."""
+
+    with _backfills_lock:
+        thread = _backfills.get(user_id)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(
+                target=_backfill_search_index, args=(user_id,), name="search-backfill", daemon=True
+            )
+            _backfills[user_id] = thread
+            thread.start()
+        return thread
+
+
+def _backfill_search_index(user_id: str) -> None:
+    """Index every stored message of a user, one keyset page at a time.
+
+    Sessions and their messages are both read in pages of
+    SEARCH_BACKFILL_PAGE_SIZE, newest first, so no single query grows with
+    the user's history. Already indexed messages are skipped, so an
+    interrupted run is simply started again.
+    """
+
+    index = get_search_index(user_id)
+    try:
+        before = None
+        while True:
+            sessions = list_user_sessions(user_id, limit=SEARCH_BACKFILL_PAGE_SIZE, before=before)
+            for session in sessions:
+                cursor: MessageCursor | None = None
+                while True:
+                    messages = get_session_messages(session["id"], cursor=cursor, limit=SEARCH_BACKFILL_PAGE_SIZE)
+                    index.add(
+                        {
+                            "message_id": message["id"],
+                            "session_id": session["id"],
+                            "role": message["role"],
+                            "content": message["content"],
+                            "created_at": message["created_at"],
+                        }
+                        for message in messages
+                        if message.get("id") is not None
+                    )
+                    cursor = message_cursor(messages[0]) if messages else None
+                    if len(messages) < SEARCH_BACKFILL_PAGE_SIZE or cursor is None:
+                        break
+            if len(sessions) < SEARCH_BACKFILL_PAGE_SIZE:
+                break
+            before = sessions[-1]["created_at"]
+        index.mark_backfilled()
+    finally:
+        with _backfills_lock:
+            if _backfills.get(user_id) is threading.current_thread():
+                del _backfills[user_id]
+
+
+# --- Turn idempotency ---
+#
+# run_session registers every turn under its idempotency key. Duplicate
+# submissions (Streamlit reruns, double clicks) attach to the registered
+# flight and get its result; finished flights are kept for
+# TURN_RESULT_TTL_SECONDS so late duplicates are answered too.
+
+TURN_DEDUP_WINDOW_SECONDS = 30
+TURN_RESULT_TTL_SECONDS = 120
+TURN_FLIGHTS_MAX_ENTRIES = 1024
+
+_TURN_NAMESPACE = uuid.UUID("5d1c4f0e-7f3a-4a5e-9a63-2f3e8b1c9d20")
+
+
+class _TurnFlight:
+    """One turn being (or recently) run, shared by duplicate submissions."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Dict[str, Any] | None = None
+        self.error: BaseException | None = None
+        self.finished_at: float | None = None
+
+
+_flights: "OrderedDict[str, _TurnFlight]" = OrderedDict()
+_flights_lock = threading.Lock()
+
+
+def turn_idempotency_key(
+    user_id: str,
+    session_id: str | None,
+    user_input: str,
+    at: float | None = None,
+    window_seconds: int = TURN_DEDUP_WINDOW_SECONDS,
+) -> str:
+    """Derive a turn key from user, session, normalized text and time window."""
+
+    bucket = int((time.time() if at is None else at) // window_seconds)
+    text = " ".join((user_input or "").split()).lower()
+    return str(uuid.uuid5(_TURN_NAMESPACE, f"{user_id}|{session_id or ''}|{text}|{bucket}"))
+
+
+def _join_or_start_flight(keys: List[str]) -> Tuple[_TurnFlight, bool]:
+    """Return (flight, True) for a new turn or (existing flight, False) for a duplicate."""
+
+    now = time.monotonic()
+    with _flights_lock:
+        # Drop finished flights past their TTL.
+        expired = [
+            key
+            for key, flight in _flights.items()
+            if flight.finished_at is not None and now - flight.finished_at > TURN_RESULT_TTL_SECONDS
+        ]
+        for key in expired:
+            del _flights[key]
+        for key in keys:
+            flight = _flights.get(key)
+            if flight is not None:
+                return flight, False
+        flight = _TurnFlight()
+        _flights[keys[0]] = flight
+        while len(_flights) > TURN_FLIGHTS_MAX_ENTRIES:
+            _flights.popitem(last=False)
+        return flight, True
+
+
+def _reply_message(state: Dict[str, Any], content: str) -> AIMessage:
+    """AIMessage whose id is derived from the turn's user message id.
+
+    A retried turn therefore writes the same reply row (the persistence
+    layer upserts on id and ignores duplicates).
+    """
+
+    human = next(
+        (m for m in reversed(state.get("messages") or []) if isinstance(m, HumanMessage)), None
+    )
+    try:
+        reply_id = str(uuid.uuid5(uuid.UUID(str(human.id)), "reply"))
+    except (AttributeError, ValueError):
+        reply_id = str(uuid.uuid4())
+    return AIMessage(content=content, id=reply_id)
+
+
 def run_session(
     user_id: str,
     user_input: str,
     session_id: str | None = None,
+    regenerate: bool = False,
+    turn_id: str | None = None,
+    style: Dict[str, str] | None = None,
+    response_mode: str = DEFAULT_RESPONSE_MODE,
+    idempotency_key: str | None = None,
+    on_event: Callable[[Dict[str, Any]], None] | None = None,
 ) -> Dict[str, Any]:
     """High-level helper: run one turn of a chat session with persistence.
 
-    - Loads user_profile and previous messages from Supabase.
-    - Runs the LangGraph app for the new user_input.
-    - Saves updated profile and new messages back to Supabase.
-    - Returns the session_id and the assistant's latest reply.
+    `response_mode` selects the pipeline profile ("fast", "balanced" or
+    "thorough"; see response_modes.py).
+
+    Turns are idempotent: `idempotency_key` (e.g. generated by the client
+    per submitted message) identifies the turn; without one it is derived
+    from user, session and message text within a short time window (see
+    turn_idempotency_key). A duplicate submission waits for the in-flight
+    (or just finished) turn with the same key and returns its result with
+    `deduplicated: True` instead of running the pipeline again.
+
+    `on_event`, if given, receives progress events ({"type": "progress",
+    "stage", "message", ...}) and reply text chunks ({"type": "token",
+    "text"}) while the turn runs, and synthesis starts as soon as the first
+    specialist has answered (see run_session_stream).
+
+    Every LLM call is recorded in the usage ledger under the user and
+    session. Near the daily quota the turn runs in a cheaper mode (the
+    result's `response_mode` says which); over it, QuotaExceededError is
+    raised (see usage_ledger.py). The result's `usage` holds the turn's
+    LLM calls, prompt/completion tokens and estimated cost, and
+    `active_agents` the router's decision.
+
+    With `regenerate=True` no new turn is run: the answer to an earlier turn
+    (`turn_id`, default the latest one) is re-synthesized from its cached
+    specialist outputs, optionally with different `style` settings such as
+    {"tone": "more direct", "length": "short"}. `user_input` is ignored.
+
+    - Loads user_profile from Supabase.
+    - Resumes the session's graph state from its last checkpoint and sends
+      only the new user message (falling back to the stored messages when
+      no checkpoint exists yet, e.g. for sessions created before
+      checkpointing or when running without a checkpointer).
+    - Saves updated profile and the new messages back to Supabase.
+    - Returns the session_id, the assistant's latest reply, the turn_id, the
+      response_mode used, active_agents and usage.
     """
 
-    # 1) Load long-term profile
-    profile = load_user_profile(user_id)
+    if regenerate:
+        if not session_id:
+            raise ValueError("regenerate=True requires the session_id of an existing session.")
+        return regenerate_reply(
+            user_id, session_id, turn_id=turn_id, style=style, response_mode=response_mode
+        )
 
-    # 2) Get or create session row
-    title = (user_input[:60] + "...") if user_input and len(user_input) > 60 else user_input
-    session_id = get_or_create_session(user_id, session_id, title)
+    # Fail fast on an unknown mode, before any backend work.
+    get_response_mode(response_mode)
+
+    if idempotency_key:
+        keys = [idempotency_key]
+    else:
+        # Also match the previous window so a double-submit straddling a
+        # window boundary is still caught.
+        now = time.time()
+        keys = [
+            turn_idempotency_key(user_id, session_id, user_input, now),
+            turn_idempotency_key(user_id, session_id, user_input, now - TURN_DEDUP_WINDOW_SECONDS),
+        ]
+
+    flight, owner = _join_or_start_flight(keys)
+    if not owner:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return {**flight.result, "deduplicated": True}
+
+    try:
+        turn_usage = new_turn_usage()
+        with usage_scope(user_id=user_id, session_id=session_id, turn_usage=turn_usage):
+            # Users close to their daily quota get a cheaper mode.
+            allowed_mode = apply_quota(get_ledger(), user_id, response_mode)
+            result = _run_turn(user_id, user_input, session_id, allowed_mode, keys[0], on_event)
+        flight.result = {**result, "usage": dict(turn_usage)}
+        return flight.result
+    except BaseException as exc:
+        flight.error = exc
+        # A failed turn may be retried with the same key.
+        with _flights_lock:
+            _flights.pop(keys[0], None)
+        raise
+    finally:
+        flight.finished_at = time.monotonic()
+        flight.done.set()
+
+
+def run_session_stream(
+    user_id: str,
+    user_input: str,
+    session_id: str | None = None,
+    response_mode: str = DEFAULT_RESPONSE_MODE,
+    idempotency_key: str | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """Run one turn like run_session, yielding events as they happen.
+
+    Yields {"type": "progress", "stage", "message", ...} events as nodes
+    start and finish (routing, web search, each specialist, synthesis) and
+    {"type": "token", "text"} chunks of the reply as it is generated. When
+    several specialists are consulted, an opening is streamed from the first
+    output while the rest are still running and the final synthesis
+    continues from it. The last event is {"type": "result", **run_session
+    result}; errors from the turn are raised from the generator.
+    """
+
+    events: "Queue[Tuple[str, Any]]" = Queue()
+
+    def worker() -> None:
+        try:
+            result = run_session(
+                user_id,
+                user_input,
+                session_id=session_id,
+                response_mode=response_mode,
+                idempotency_key=idempotency_key,
+                on_event=lambda event: events.put(("event", event)),
+            )
+            events.put(("result", result))
+        except BaseException as exc:  # noqa: BLE001 - re-raised in the caller
+            events.put(("error", exc))
+
+    threading.Thread(target=worker, name="run-session-stream", daemon=True).start()
+    while True:
+        kind, payload = events.get()
+        if kind == "event":
+            yield payload
+        elif kind == "result":
+            yield {"type": "result", **payload}
+            return
+        else:
+            raise payload
+
+
+def _invoke_graph(
+    app: Any,
+    state: Dict[str, Any],
+    config: Dict[str, Any] | None,
+    on_event: Callable[[Dict[str, Any]], None] | None = None,
+) -> Dict[str, Any]:
+    """Run a turn through a compiled graph and return the final state.
+
+    With `on_event`, custom (progress/token) events are streamed to the
+    caller; the last "values" chunk is the final state.
+    """
+
+    if on_event is None:
+        return app.invoke(state, config)
+    final_state = state
+    for stream_mode, chunk in app.stream(state, config, stream_mode=["custom", "values"]):
+        if stream_mode == "custom":
+            on_event(chunk)
+        else:
+            final_state = chunk
+    return final_state
 
-    # 3) Load previous messages
-    past_messages = load_session_messages(session_id)
 
-    # 4) Build initial state for this turn
-    initial_messages = past_messages + [HumanMessage(content=user_input)]
-    initial_state: AgentState = {
-        "messages": initial_messages,
+def _latest_reply(messages: List[Any]) -> str:
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage):
+            return msg.content
+    return ""
+
+
+def new_turn_state(
+    human_message: HumanMessage,
+    profile: Dict[str, Any],
+    response_mode: str = DEFAULT_RESPONSE_MODE,
+    progressive: bool = False,
+) -> AgentState:
+    """Graph input for a new turn.
+
+    Per-turn fields are reset explicitly because they would otherwise
+    carry over from the checkpoint.
+    """
+
+    return {
+        "messages": [human_message],
         "user_profile": profile,
         "active_agents": [],
         "agent_outputs": {},
         "web_search_results": None,
+        "memory_context": None,
+        "response_mode": response_mode,
+        "tokens_used": 0,
+        "progressive": progressive,
+        "synthesis_opening": None,
     }
 
-    # 5) Run the graph synchronously to get the final state
-    final_state = app.invoke(initial_state)
+
+def _run_turn(
+    user_id: str,
+    user_input: str,
+    session_id: str | None,
+    response_mode: str,
+    turn_key: str,
+    on_event: Callable[[Dict[str, Any]], None] | None = None,
+) -> Dict[str, Any]:
+    """Run one (new) turn through the graph; see run_session."""
+
+    # 1) Load long-term profile
+    profile = load_user_profile(user_id)
+
+    # 2) Get or create session row
+    title = session_title(user_input)
+    new_session = not session_id
+    session_id = get_or_create_session(user_id, session_id, title)
+    annotate_usage(session_id=session_id)
+
+    # 3) Build the input for this turn. The message id is derived from the
+    # turn's idempotency key, so the stored row (and the reply row derived
+    # from it) is unique per turn.
+    human_message = HumanMessage(content=user_input, id=str(uuid.uuid5(_TURN_NAMESPACE, turn_key)))
+    turn_input = new_turn_state(human_message, profile, response_mode, progressive=on_event is not None)
+
+    app = get_app()
+    checkpointer = get_graph_checkpointer()
+    config = _thread_config(session_id)
+    previous_messages: List[Any] = []
+    if checkpointer is not None:
+        previous_messages = app.get_state(config).values.get("messages") or []
+    if not previous_messages and not new_session:
+        # 4) Seed the thread from the stored conversation. Older messages
+        # would never reach the history manager's summary anyway.
+        previous_messages = load_session_messages(session_id, limit=STATE_MAX_MESSAGES)
+        turn_input["messages"] = previous_messages + [human_message]
+
+    # With the semantic cache enabled, generic, profile-independent
+    # questions get an answer that may be shared with other users: served
+    # from the cache, or generated without this user's profile, history and
+    # memory and then cached.
+    semantic_cache = get_semantic_cache()
+    shared = semantic_cache is not None and is_profile_independent(user_input)
+
+    # Retrieve relevant snippets from the user's earlier conversations,
+    # skipping what the specialists already see in their history window.
+    memory = get_user_memory(user_id) if memory_enabled() else None
+    if memory is not None and not shared:
+        snippets = memory.search(
+            user_input,
+            exclude_message_ids=[m.id for m in previous_messages[-6:] if m.id],
+        )
+        turn_input["memory_context"] = format_memory_context(snippets) or None
+
+    # 5) Run the graph (streaming its progress and reply tokens to on_event
+    # when given), or answer a shared question as described above.
+    cached = semantic_cache.lookup(user_input, response_mode) if semantic_cache is not None else None
+    generated_shared = False
+    if shared:
+        if cached is not None:
+            answer = cached
+            if on_event is not None:
+                on_event({"type": "progress", "stage": "cache_hit", "message": "Found a matching answer"})
+                on_event({"type": "token", "text": cached["reply"]})
+        else:
+            generic_input = new_turn_state(
+                human_message, {}, response_mode, progressive=on_event is not None
+            )
+            generic_state = _invoke_graph(get_shared_answer_app(), generic_input, None, on_event)
+            answer = {
+                "reply": _latest_reply(generic_state.get("messages") or []),
+                "agent_outputs": generic_state.get("agent_outputs"),
+                "active_agents": generic_state.get("active_agents"),
+            }
+            generated_shared = True
+        final_state = {
+            **turn_input,
+            "messages": turn_input["messages"] + [_reply_message(turn_input, answer["reply"])],
+            "agent_outputs": dict(answer.get("agent_outputs") or {}),
+            "active_agents": list(answer.get("active_agents") or []),
+        }
+        if checkpointer is not None:
+            # Record the turn in the thread as if the graph had produced it.
+            # agent_outputs merges, so the previous turn's are cleared first.
+            app.update_state(
+                config,
+                Command(update=[("agent_outputs", {}), *final_state.items()]),
+                as_node="history_manager",
+            )
+    else:
+        final_state = _invoke_graph(app, turn_input, config if checkpointer is not None else None, on_event)
 
     final_messages = final_state["messages"]
     updated_profile = final_state.get("user_profile", {})
 
-    # 6) Persist profile and only the new messages
-    save_user_profile(user_id, updated_profile)
-
-    new_messages = final_messages[len(past_messages) :]
-    append_session_messages(session_id, new_messages)
+    # 6) Persist the profile (only when it changed) and only the new
+    # messages: the user message plus whatever the graph produced after it
+    # (the rolling history summary only lives in graph state).
+    if updated_profile != profile:
+        save_user_profile(user_id, updated_profile)
+
+    new_messages = [human_message]
+    seen_human = False
+    for msg in final_messages:
+        if msg.id == human_message.id:
+            seen_human = True
+        elif seen_human and getattr(msg, "name", None) != HISTORY_SUMMARY_NAME:
+            new_messages.append(msg)
+    append_session_messages(session_id, new_messages, user_id=user_id)
+
+    # Index the new messages (and a fresh rolling summary, if one was just
+    # written) into the user's long-term memory.
+    if memory is not None:
+        to_index = list(new_messages)
+        if final_messages and getattr(final_messages[0], "name", None) == HISTORY_SUMMARY_NAME:
+            to_index.append(final_messages[0])
+        memory.add(
+            {
+                "message_id": msg.id,
+                "session_id": session_id,
+                "role": (
+                    "summary"
+                    if getattr(msg, "name", None) == HISTORY_SUMMARY_NAME
+                    else _db_role_from_message(msg)
+                ),
+                "content": msg.content,
+            }
+            for msg in to_index
+        )
 
     # 7) Extract the latest assistant reply for convenience
-    latest_reply = ""
-    for msg in reversed(final_messages):
-        if isinstance(msg, AIMessage):
-            latest_reply = msg.content
-            break
+    latest_reply = _latest_reply(new_messages)
+
+    # One copy of the outputs, shared read-only by both caches.
+    agent_outputs = dict(final_state.get("agent_outputs") or {})
+
+    # Only answers generated without the user's context are shared; canned
+    # out-of-scope replies (no agent outputs) are not worth caching.
+    if generated_shared and latest_reply and agent_outputs:
+        semantic_cache.store(
+            user_input,
+            {
+                "reply": latest_reply,
+                "agent_outputs": agent_outputs,
+                "active_agents": final_state["active_agents"],
+            },
+            response_mode,
+        )
+
+    reply_ids = [msg.id for msg in new_messages if isinstance(msg, AIMessage)]
+    _remember_turn(
+        session_id,
+        human_message.id,
+        {
+            "user_id": user_id,
+            "user_query": user_input,
+            "agent_outputs": agent_outputs,
+            "web_search_results": final_state.get("web_search_results"),
+            "reply_id": reply_ids[-1] if reply_ids else None,
+        },
+    )
 
     return {
         "session_id": session_id,
+        "turn_id": human_message.id,
         "reply": latest_reply,
-        "profile": updated_profile,
+        "profile": profile_fields(updated_profile),
+        "cached": cached is not None,
+        "response_mode": response_mode,
+        "active_agents": list(final_state.get("active_agents") or []),
+    }
+
+
+def _turn_from_checkpoint(
+    app: Any, config: Dict[str, Any], user_id: str, turn_id: str | None
+) -> Tuple[str | None, Dict[str, Any] | None]:
+    """Rebuild a turn cache entry from the session's checkpoints.
+
+    Without `turn_id` the latest turn is used. An explicit turn is looked
+    up in the checkpoints the saver still keeps (see checkpointer.py); the
+    last one of that turn holds its specialist outputs.
+    """
+
+    for snapshot in app.get_state_history(config):
+        values = snapshot.values or {}
+        messages = values.get("messages") or []
+        last_human = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+        if last_human is None or (turn_id is not None and last_human.id != turn_id):
+            continue
+        if not values.get("agent_outputs"):
+            # A turn's input checkpoint; its outputs are in a later one.
+            if turn_id is None:
+                break
+            continue
+        last_ai = next((m for m in reversed(messages) if isinstance(m, AIMessage)), None)
+        return last_human.id, {
+            "user_id": user_id,
+            "user_query": last_human.content,
+            "agent_outputs": dict(values["agent_outputs"]),
+            "web_search_results": values.get("web_search_results"),
+            "reply_id": last_ai.id if last_ai is not None else None,
+        }
+    return turn_id, None
+
+
+def regenerate_reply(
+    user_id: str,
+    session_id: str,
+    turn_id: str | None = None,
+    style: Dict[str, str] | None = None,
+    response_mode: str = DEFAULT_RESPONSE_MODE,
+) -> Dict[str, Any]:
+    """Re-synthesize a turn's answer from its cached specialist outputs.
+
+    Only the synthesizer runs. The outputs come from the in-process turn
+    cache, or from the session's last checkpoint when the cache no longer
+    has them (e.g. after a restart). The new answer replaces the previous
+    one in the graph state and overwrites its row in the stored
+    conversation. Like a new turn, it counts against the user's daily quota.
+    """
+
+    cached_turn_id, entry = _recall_turn(session_id, turn_id)
+    app = get_app()
+    config = _thread_config(session_id)
+    checkpointer = get_graph_checkpointer()
+
+    if entry is None and checkpointer is not None:
+        cached_turn_id, entry = _turn_from_checkpoint(app, config, user_id, turn_id)
+
+    if entry is None or entry.get("user_id") != user_id or not entry.get("agent_outputs"):
+        raise RuntimeError(
+            "No cached specialist outputs for this turn; send the message again instead."
+        )
+    turn_id = cached_turn_id
+
+    regen_style = dict(style or {})
+    regen_style.setdefault(
+        "variation", "Write a fresh phrasing rather than repeating an earlier answer."
+    )
+    with usage_scope(user_id=user_id, session_id=session_id, agent="synthesizer", node="regenerate"):
+        response_mode = apply_quota(get_ledger(), user_id, response_mode)
+        reply = synthesize_reply(
+            entry["user_query"], entry["agent_outputs"], regen_style, response_mode=response_mode
+        )
+    # The new reply takes over the old reply's id: the graph state replaces
+    # the message in place and the stored row is overwritten.
+    reply_message = AIMessage(content=reply, id=entry.get("reply_id") or str(uuid.uuid4()))
+
+    if checkpointer is not None:
+        # Record the update as if the last node had produced it so the
+        # graph does not schedule any further steps.
+        app.update_state(config, {"messages": [reply_message]}, as_node="history_manager")
+
+    if entry.get("reply_id"):
+        replace_session_message(session_id, reply_message, user_id=user_id)
+    else:
+        append_session_messages(session_id, [reply_message], user_id=user_id)
+    _remember_turn(session_id, turn_id, {**entry, "reply_id": reply_message.id})
+
+    return {
+        "session_id": session_id,
+        "turn_id": turn_id,
+        "reply": reply,
+        "regenerated": True,
+        "response_mode": response_mode,
     }
 
 
@@ -0,0 +1,427 @@
+"""Cold-storage archival of old messages into compressed per-session blobs.
+
+The `messages` table grows by one row per message forever. The archival
+job (`archive_inactive_sessions`, also runnable as a script) moves the
+history of inactive sessions out of it:
+
+- a session is inactive when its newest message is older than
+  `inactive_days`;
+- its newest ACTIVE_WINDOW_MESSAGES messages stay hot; the rolling
+  history summary lives in the graph checkpoint and is not touched, so a
+  resumed session keeps its context;
+- older rows are written, oldest first, as blobs of up to
+  BLOB_MAX_MESSAGES messages to `message_archives` (JSON, compressed with
+  zstd when the optional `zstandard` package is installed, else zlib,
+  base64-encoded), then deleted from `messages`.
+
+Blob ids are derived from the session and their first message, so a job
+interrupted between writing a blob and deleting its rows can be re-run;
+readers drop rows that are both archived and still hot.
+
+Reading is transparent: graph.get_session_messages pages back into the
+archive once the hot rows run out. `chat_sessions.has_archive` (set by the
+job before it deletes any hot row, cached per process and primed from the
+session list) says whether there is anything to page into, so sessions
+without archives never query `message_archives`. Only blob metadata is
+read to plan a page (cached per session), and a blob is fetched and
+decompressed only when a page actually reaches it. Deployments without the
+table or the column behave as if no session had archives.
+
+Expected Supabase schema (in addition to chat_sessions and messages):
+
+    create table message_archives (
+        id uuid primary key,
+        session_id uuid not null references chat_sessions (id) on delete cascade,
+        first_created_at timestamptz not null,
+        first_id uuid not null,
+        last_created_at timestamptz not null,
+        last_id uuid not null,
+        message_count integer not null,
+        codec text not null,
+        payload text not null
+    );
+    create index message_archives_session_idx
+        on message_archives (session_id, first_created_at, first_id);
+
+    alter table chat_sessions add column has_archive boolean not null default false;
+
+Usage (from the project root; needs a key allowed to read and delete all
+users' messages):
+
+    python message_archive.py --inactive-days 30 [--dry-run]
+"""
+
+import argparse
+import base64
+import json
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from circuit_breaker import get_breaker
+from supabase_client import get_supabase
+
+ACTIVE_WINDOW_MESSAGES = 40
+BLOB_MAX_MESSAGES = 500
+DEFAULT_INACTIVE_DAYS = 30
+SESSION_PAGE_SIZE = 200
+
+# Blob metadata per session, kept briefly so paging back does not re-query it.
+ARCHIVE_META_TTL_SECONDS = 300
+ARCHIVE_META_MAX_SESSIONS = 256
+# Recently decompressed blobs (paging back usually reads consecutive pages).
+BLOB_CACHE_MAX = 16
+# Per-session has_archive flags (kept for ARCHIVE_META_TTL_SECONDS).
+ARCHIVE_FLAG_MAX_SESSIONS = 4096
+
+# PostgreSQL / PostgREST codes for a table or column that does not exist.
+_MISSING_SCHEMA_CODES = ("42P01", "42703", "PGRST204", "PGRST205")
+
+_ARCHIVE_NAMESPACE = uuid.UUID("a7c0f3de-2b1e-4d38-9f61-0c4d5e6f7a81")
+_META_COLUMNS = "id, session_id, first_created_at, first_id, last_created_at, last_id, message_count, codec"
+_ROW_KEYS = ("id", "role", "content", "created_at")
+
+# (created_at, id) of a message; rows are ordered by it.
+RowKey = Tuple[str, str]
+
+
+def _execute(query: Any) -> List[Dict[str, Any]]:
+    resp = get_breaker("supabase").call(query.execute)
+    return list(getattr(resp, "data", None) or [])
+
+
+def _row_key(row: Dict[str, Any]) -> RowKey:
+    return (str(row.get("created_at")), str(row.get("id")))
+
+
+def _is_missing_schema(exc: Exception) -> bool:
+    code = str(getattr(exc, "code", "") or "")
+    return code in _MISSING_SCHEMA_CODES or "does not exist" in str(exc)
+
+
+# Parts of the schema this deployment turned out not to have; they are not
+# queried again by this process.
+_missing_schema: set = set()
+
+
+# --- compression ---
+
+
+def _compress(rows: List[Dict[str, Any]]) -> Tuple[str, str]:
+    raw = json.dumps(rows, separators=(",", ":"), default=str).encode("utf-8")
+    try:
+        import zstandard
+
+        return "zstd", base64.b64encode(zstandard.ZstdCompressor(level=10).compress(raw)).decode("ascii")
+    except ImportError:
+        return "zlib", base64.b64encode(zlib.compress(raw, 9)).decode("ascii")
+
+
+def _decompress(codec: str, payload: str) -> List[Dict[str, Any]]:
+    data = base64.b64decode(payload)
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise RuntimeError("This archive is zstd-compressed; install the zstandard package to read it.") from exc
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        data = zlib.decompress(data)
+    else:
+        raise RuntimeError(f"Unknown archive codec {codec!r}.")
+    return json.loads(data)
+
+
+# --- reading ---
+
+
+class _ArchiveReader:
+    """Blob metadata and decompressed blobs, cached per process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._meta: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._blobs: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._flags: "OrderedDict[str, Tuple[float, bool]]" = OrderedDict()
+
+    def flag(self, session_id: str) -> Optional[bool]:
+        with self._lock:
+            cached = self._flags.get(session_id)
+            if cached is None or time.monotonic() - cached[0] >= ARCHIVE_META_TTL_SECONDS:
+                return None
+            return cached[1]
+
+    def note_flag(self, session_id: str, has_archive: bool) -> None:
+        with self._lock:
+            self._flags[session_id] = (time.monotonic(), has_archive)
+            self._flags.move_to_end(session_id)
+            while len(self._flags) > ARCHIVE_FLAG_MAX_SESSIONS:
+                self._flags.popitem(last=False)
+
+    def blobs_for(self, session_id: str) -> List[Dict[str, Any]]:
+        """Metadata of a session's blobs, oldest first (no payloads)."""
+
+        with self._lock:
+            cached = self._meta.get(session_id)
+            if cached is not None and time.monotonic() - cached[0] < ARCHIVE_META_TTL_SECONDS:
+                self._meta.move_to_end(session_id)
+                return cached[1]
+        metas = _execute(
+            get_supabase()
+            .table("message_archives")
+            .select(_META_COLUMNS)
+            .eq("session_id", session_id)
+            .order("first_created_at", desc=False)
+            .order("first_id", desc=False)
+        )
+        with self._lock:
+            self._meta[session_id] = (time.monotonic(), metas)
+            while len(self._meta) > ARCHIVE_META_MAX_SESSIONS:
+                self._meta.popitem(last=False)
+        return metas
+
+    def rows_of(self, meta: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._blobs.get(meta["id"])
+            if rows is not None:
+                self._blobs.move_to_end(meta["id"])
+                return rows
+        found = _execute(get_supabase().table("message_archives").select("codec, payload").eq("id", meta["id"]))
+        rows = _decompress(found[0]["codec"], found[0]["payload"]) if found else []
+        with self._lock:
+            self._blobs[meta["id"]] = rows
+            while len(self._blobs) > BLOB_CACHE_MAX:
+                self._blobs.popitem(last=False)
+        return rows
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self._meta.pop(session_id, None)
+            self._flags.pop(session_id, None)
+
+
+_reader = _ArchiveReader()
+
+
+def note_session_rows(sessions: List[Dict[str, Any]]) -> None:
+    """Remember the has_archive flags of chat_sessions rows already read."""
+
+    for session in sessions:
+        if "has_archive" in session and session.get("id"):
+            _reader.note_flag(str(session["id"]), bool(session["has_archive"]))
+
+
+def note_new_session(session_id: str) -> None:
+    """A session created by this process has nothing archived."""
+
+    _reader.note_flag(session_id, False)
+
+
+def session_has_archive(session_id: str) -> bool:
+    """Whether the session has archived messages (cached chat_sessions.has_archive)."""
+
+    if _missing_schema:
+        return False
+    flag = _reader.flag(session_id)
+    if flag is None:
+        try:
+            rows = _execute(get_supabase().table("chat_sessions").select("has_archive").eq("id", session_id))
+        except Exception as exc:
+            if not _is_missing_schema(exc):
+                raise
+            _missing_schema.add("chat_sessions.has_archive")
+            return False
+        flag = bool(rows and rows[0].get("has_archive"))
+        _reader.note_flag(session_id, flag)
+    return flag
+
+
+def archived_rows_before(
+    session_id: str,
+    before: RowKey | None,
+    limit: int | None = None,
+) -> List[Dict[str, Any]]:
+    """Archived message rows older than `before`, oldest first.
+
+    With `limit`, only the newest `limit` of them, decompressing just the
+    blobs needed for that. Sessions without archives cost no query once
+    their flag is cached.
+    """
+
+    if not session_has_archive(session_id):
+        return []
+    try:
+        metas = _reader.blobs_for(session_id)
+    except Exception as exc:
+        if not _is_missing_schema(exc):
+            raise
+        _missing_schema.add("message_archives")
+        return []
+    rows: List[Dict[str, Any]] = []
+    for meta in reversed(metas):
+        if before is not None and (str(meta["first_created_at"]), str(meta["first_id"])) >= before:
+            continue
+        blob_rows = [
+            row for row in _reader.rows_of(meta)
+            if before is None or _row_key(row) < before
+        ]
+        rows = blob_rows + rows
+        if limit is not None and len(rows) >= limit:
+            return rows[-limit:]
+    return rows
+
+
+# --- archival job ---
+
+
+def _hot_row_pages(session_id: str, keep: int, page_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Rows older than the newest `keep`, oldest first, `page_size` at a time.
+
+    Keyset pages on (created_at, id), so no single response hits the
+    PostgREST row cap and memory does not grow with the session.
+    """
+
+    newest = _execute(
+        get_supabase()
+        .table("messages")
+        .select("id, created_at")
+        .eq("session_id", session_id)
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(keep + 1)
+    )
+    if len(newest) <= keep:
+        return
+    boundary = _row_key(newest[keep - 1]) if keep > 0 else None
+    cursor: Optional[RowKey] = None
+    while True:
+        query = get_supabase().table("messages").select("*").eq("session_id", session_id)
+        if boundary is not None:
+            # Rows at the boundary's own timestamp are filtered by id below.
+            query = query.lte("created_at", boundary[0])
+        if cursor is not None:
+            query = query.or_(
+                f'created_at.gt."{cursor[0]}",'
+                f'and(created_at.eq."{cursor[0]}",id.gt."{cursor[1]}")'
+            )
+        page = _execute(query.order("created_at", desc=False).order("id", desc=False).limit(page_size))
+        rows = [row for row in page if boundary is None or _row_key(row) < boundary]
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        cursor = _row_key(rows[-1])
+
+
+def archive_session(
+    session_id: str,
+    keep: int = ACTIVE_WINDOW_MESSAGES,
+    blob_max_messages: int = BLOB_MAX_MESSAGES,
+    dry_run: bool = False,
+) -> int:
+    """Move a session's messages beyond the newest `keep` into blobs; returns rows moved."""
+
+    sb = get_supabase()
+    moved = 0
+    for rows in _hot_row_pages(session_id, keep, blob_max_messages):
+        moved += len(rows)
+        if dry_run:
+            continue
+        if moved == len(rows):
+            # Flag the session before any hot row is deleted, so readers
+            # never skip an archive that holds rows missing from `messages`.
+            _execute(sb.table("chat_sessions").update({"has_archive": True}).eq("id", session_id))
+        chunk = [{key: row.get(key) for key in _ROW_KEYS} for row in rows]
+        codec, payload = _compress(chunk)
+        _execute(
+            sb.table("message_archives").upsert(
+                {
+                    "id": str(uuid.uuid5(_ARCHIVE_NAMESPACE, f"{session_id}:{chunk[0]['id']}")),
+                    "session_id": session_id,
+                    "first_created_at": chunk[0]["created_at"],
+                    "first_id": chunk[0]["id"],
+                    "last_created_at": chunk[-1]["created_at"],
+                    "last_id": chunk[-1]["id"],
+                    "message_count": len(chunk),
+                    "codec": codec,
+                    "payload": payload,
+                },
+                on_conflict="id",
+                ignore_duplicates=True,
+            )
+        )
+        # Only delete once the blob holding the rows is stored.
+        _execute(sb.table("messages").delete().in_("id", [row["id"] for row in chunk]))
+    if moved and not dry_run:
+        _reader.forget(session_id)
+    return moved
+
+
+def _latest_message_at(session_id: str) -> Optional[str]:
+    newest = _execute(
+        get_supabase()
+        .table("messages")
+        .select("created_at")
+        .eq("session_id", session_id)
+        .order("created_at", desc=True)
+        .limit(1)
+    )
+    return str(newest[0]["created_at"]) if newest else None
+
+
+def archive_inactive_sessions(
+    inactive_days: int = DEFAULT_INACTIVE_DAYS,
+    keep: int = ACTIVE_WINDOW_MESSAGES,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Archive every session with no message in the last `inactive_days`."""
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=inactive_days)).isoformat()
+    stats = {"sessions_checked": 0, "sessions_archived": 0, "messages_archived": 0}
+    cursor: Optional[RowKey] = None
+    while True:
+        # Sessions created after the cutoff cannot be inactive yet.
+        query = get_supabase().table("chat_sessions").select("id, created_at").lt("created_at", cutoff)
+        if cursor is not None:
+            query = query.or_(
+                f'created_at.gt."{cursor[0]}",'
+                f'and(created_at.eq."{cursor[0]}",id.gt."{cursor[1]}")'
+            )
+        sessions = _execute(
+            query.order("created_at", desc=False).order("id", desc=False).limit(SESSION_PAGE_SIZE)
+        )
+        for session in sessions:
+            stats["sessions_checked"] += 1
+            latest = _latest_message_at(session["id"])
+            if latest is None or latest >= cutoff:
+                continue
+            moved = archive_session(session["id"], keep=keep, dry_run=dry_run)
+            if moved:
+                stats["sessions_archived"] += 1
+                stats["messages_archived"] += moved
+        if len(sessions) < SESSION_PAGE_SIZE:
+            return stats
+        cursor = _row_key(sessions[-1])
+
+
+def main(argv: List[str] | None = None) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inactive-days", type=int, default=DEFAULT_INACTIVE_DAYS)
+    parser.add_argument("--keep", type=int, default=ACTIVE_WINDOW_MESSAGES, help="Newest messages left hot per session.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived.")
+    args = parser.parse_args(argv)
+    stats = archive_inactive_sessions(args.inactive_days, args.keep, args.dry_run)
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Per-agent model tiering and the runtime policy that picks a model per call.
+
+Every agent has a default model and token cap (AGENT_MODEL_CONFIG). At run
+time `choose_model()` adjusts that default:
+
+- classification-style agents (router, profile updater) always use the
+  light model;
+- simple, short queries move generation agents to the light model;
+- max_tokens scales with query complexity and is capped by the output
+  tokens left in the turn's budget (see `token_budget` in response_modes).
+
+Response-mode node settings, when present, override the agent defaults
+before the policy is applied.
+
+`ModelUsageCallback` is attached to every Gemini client built by
+`graph.get_chat_model` and records the latency, token usage and estimated
+cost observed per model (and per agent / graph node), so the thresholds
+here can be tuned with data: see `model_stats()`.
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+STANDARD_MODEL = "gemini-2.5-flash"
+LIGHT_MODEL = "gemini-2.5-flash-lite"
+
+# USD per 1M tokens (input, output); used for estimates only.
+MODEL_PRICING: Dict[str, Dict[str, float]] = {
+    STANDARD_MODEL: {"input": 0.30, "output": 2.50},
+    LIGHT_MODEL: {"input": 0.10, "output": 0.40},
+}
+
+# kind: "classification" agents return short structured output;
+# "generation" agents write prose for the user (directly or via synthesis).
+AGENT_MODEL_CONFIG: Dict[str, Dict[str, Any]] = {
+    "router": {"model": LIGHT_MODEL, "max_tokens": 256, "kind": "classification"},
+    "profile_updater": {"model": LIGHT_MODEL, "max_tokens": 256, "kind": "classification"},
+    "web_searcher": {"model": STANDARD_MODEL, "max_tokens": 256, "kind": "generation"},
+    "synthesizer": {"model": STANDARD_MODEL, "max_tokens": 512, "kind": "generation"},
+    "specialist": {"model": STANDARD_MODEL, "max_tokens": 512, "kind": "generation"},
+}
+
+# Below this complexity score a generation agent may use the light model.
+SIMPLE_QUERY_THRESHOLD = 0.15
+MIN_MAX_TOKENS = 128
+# Caps are rounded to this step so only a handful of clients get built.
+MAX_TOKENS_STEP = 64
+
+_CLAUSE_RE = re.compile(r"\b(and|but|while|whereas|although|however|because|or)\b", re.IGNORECASE)
+
+
+def estimate_complexity(query: str) -> float:
+    """Cheap 0..1 score from length, questions and clause structure."""
+
+    words = len((query or "").split())
+    length_score = min(words / 40.0, 1.0)
+    question_score = min(query.count("?") / 3.0, 1.0) if query else 0.0
+    clause_score = min(len(_CLAUSE_RE.findall(query or "")) / 4.0, 1.0)
+    return round(0.6 * length_score + 0.2 * question_score + 0.2 * clause_score, 3)
+
+
+def _round_tokens(value: float) -> int:
+    return max(MIN_MAX_TOKENS, int(round(value / MAX_TOKENS_STEP)) * MAX_TOKENS_STEP)
+
+
+def choose_model(
+    node: str,
+    query: str,
+    mode_settings: Optional[Dict[str, Any]] = None,
+    tokens_remaining: Optional[int] = None,
+    pending_calls: int = 1,
+) -> Dict[str, Any]:
+    """Pick model and max_tokens for one call of `node`.
+
+    `tokens_remaining` is the output-token budget left for the turn and
+    `pending_calls` how many generation calls still have to share it
+    (including this one).
+    """
+
+    config = dict(AGENT_MODEL_CONFIG.get(node, AGENT_MODEL_CONFIG["specialist"]))
+    config.update(mode_settings or {})
+    model = config["model"]
+    base_tokens = config["max_tokens"]
+
+    if config.get("kind") == "classification":
+        return {"model": LIGHT_MODEL, "max_tokens": base_tokens}
+
+    complexity = estimate_complexity(query)
+    # A mode that pins a model (e.g. fast mode's specialist) is respected.
+    if complexity < SIMPLE_QUERY_THRESHOLD and "model" not in (mode_settings or {}):
+        model = LIGHT_MODEL
+
+    max_tokens = base_tokens * (0.6 + 0.8 * complexity)
+    max_tokens = min(max_tokens, base_tokens * 1.5)
+    if tokens_remaining is not None:
+        share = max(tokens_remaining, 0) / max(pending_calls, 1)
+        max_tokens = min(max_tokens, share)
+
+    return {"model": model, "max_tokens": _round_tokens(max_tokens)}
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of one call."""
+
+    pricing = MODEL_PRICING.get(model.split("/")[-1], MODEL_PRICING[STANDARD_MODEL])
+    return (input_tokens * pricing["input"] + output_tokens * pricing["output"]) / 1_000_000
+
+
+class _ModelStats:
+    """Thread-safe aggregates of observed calls, keyed by (model, agent)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[tuple, Dict[str, float]] = {}
+
+    def record(
+        self,
+        model: str,
+        agent: str,
+        latency_s: float,
+        input_tokens: int,
+        output_tokens: int,
+        error: bool = False,
+    ) -> None:
+        with self._lock:
+            entry = self._stats.setdefault(
+                (model, agent),
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "latency_s": 0.0,
+                    "max_latency_s": 0.0,
+                    "input_tokens": 0,
+                    "output_tokens": 0,
+                    "cost_usd": 0.0,
+                },
+            )
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["latency_s"] += latency_s
+            entry["max_latency_s"] = max(entry["max_latency_s"], latency_s)
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["cost_usd"] += estimate_cost(model, input_tokens, output_tokens)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result: Dict[str, Dict[str, Any]] = {}
+            for (model, agent), entry in self._stats.items():
+                calls = entry["calls"] or 1
+                result[f"{model}:{agent}"] = {
+                    **entry,
+                    "model": model,
+                    "agent": agent,
+                    "avg_latency_s": entry["latency_s"] / calls,
+                    "avg_output_tokens": entry["output_tokens"] / calls,
+                }
+            return result
+
+
+_model_stats = _ModelStats()
+
+
+def model_stats() -> Dict[str, Dict[str, Any]]:
+    """Observed per-(model, agent) calls, latency, tokens and estimated cost."""
+
+    return _model_stats.snapshot()
+
+
+class ModelUsageCallback(BaseCallbackHandler):
+    """Callback bound to one chat client that records every call it makes."""
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self._starts: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        agent = metadata.get("agent") or metadata.get("langgraph_node") or "unknown"
+        with self._lock:
+            self._starts[run_id] = (time.perf_counter(), agent)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started, agent = self._starts.pop(run_id, (time.perf_counter(), "unknown"))
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += int(usage.get("input_tokens", 0))
+                output_tokens += int(usage.get("output_tokens", 0))
+        _model_stats.record(self.model, agent, time.perf_counter() - started, input_tokens, output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            started, agent = self._starts.pop(run_id, (time.perf_counter(), "unknown"))
+        _model_stats.record(self.model, agent, time.perf_counter() - started, 0, 0, error=True)
@@ -0,0 +1,186 @@
+"""Local compression of specialist outputs before synthesis.
+
+The synthesizer used to receive every agent output joined together and cut
+at 4000 characters: overlapping advice from several specialists was paid
+for twice, and whichever agent came last was truncated away.
+`compress_agent_outputs()` replaces that cut:
+
+1. split each output into units (bullets, numbered items, sentences);
+   markdown headings and empty lines are dropped;
+2. score each unit by relevance to the user query (cosine over
+   embeddings.HashingEmbedder vectors) plus a small bonus for units early
+   in their output, where agents put their main points;
+3. walk units from best to worst and drop near-duplicates of a unit
+   already kept (from any agent), using MinHash signatures over character
+   shingles of the normalized words (robust to "behavior"/"behaviour"
+   style variants); the better-scored copy survives;
+4. fill the token budget round-robin across agents, each taking its next
+   best unit, so every specialist keeps its distinct points; an agent's
+   first unit is clipped rather than skipped when it does not fit;
+5. render the kept units per agent, in their original order.
+
+The budget is the response mode's "synthesis_input_tokens"; see
+`compression_stats()` for how much is saved.
+"""
+
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from embeddings import HashingEmbedder, tokenize
+
+DEFAULT_BUDGET_TOKENS = 1000
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+# Estimated Jaccard similarity of shingle sets above which two units are
+# considered the same point.
+DUPLICATE_THRESHOLD = 0.5
+POSITION_WEIGHT = 0.1
+MIN_CLIP_CHARS = 80
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240601)
+# a < 2^31 and crc32 hashes < 2^32 keep a * h + b within uint64.
+_PERM_A = _rng.integers(1, 1 << 31, NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_HEADING_RE = re.compile(r"^\s*(?:#{1,6}\s|\*\*[^*]+\*\*:?\s*$|[^.!?]{1,60}:\s*$)")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+_embedder = HashingEmbedder()
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {
+    "calls": 0,
+    "units_in": 0,
+    "units_out": 0,
+    "duplicates": 0,
+    "tokens_in": 0,
+    "tokens_out": 0,
+}
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def split_units(text: str) -> List[str]:
+    """Bullets, numbered items and sentences of an agent output."""
+
+    units: List[str] = []
+    for line in (text or "").splitlines():
+        if not line.strip() or _HEADING_RE.match(line):
+            continue
+        if _BULLET_RE.match(line):
+            units.append(_BULLET_RE.sub("", line).strip())
+            continue
+        units.extend(s.strip() for s in _SENTENCE_RE.split(line.strip()) if s.strip())
+    return units
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """MinHash signature over character shingles of the content words."""
+
+    normalized = " ".join(tokenize(text))
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(max(len(normalized) - SHINGLE_SIZE + 1, 1))}
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+    # (a * h + b) mod p for every permutation.
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % np.uint64(_MERSENNE_PRIME)
+    return permuted.min(axis=1)
+
+
+def estimated_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+
+    return float(np.mean(a == b))
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    max_chars = max(max_tokens * 4, MIN_CLIP_CHARS)
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+def compress_agent_outputs(
+    agent_outputs: Dict[str, str],
+    user_query: str,
+    budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+) -> str:
+    """Deduplicated, query-ranked, budgeted rendering of agent outputs."""
+
+    query_vector = _embedder.embed(user_query or "")
+    # (agent, position, text, score)
+    units: List[Tuple[str, int, str, float]] = []
+    for agent, output in agent_outputs.items():
+        parts = split_units(output)
+        for position, text in enumerate(parts):
+            relevance = float(_embedder.embed(text) @ query_vector)
+            bonus = POSITION_WEIGHT * (1.0 - position / len(parts))
+            units.append((agent, position, text, relevance + bonus))
+
+    # Near-duplicate removal, best-scored copy first.
+    kept: List[Tuple[str, int, str, float]] = []
+    signatures: List[np.ndarray] = []
+    duplicates = 0
+    for unit in sorted(units, key=lambda u: u[3], reverse=True):
+        signature = minhash_signature(unit[2])
+        if any(estimated_similarity(signature, other) >= DUPLICATE_THRESHOLD for other in signatures):
+            duplicates += 1
+            continue
+        kept.append(unit)
+        signatures.append(signature)
+
+    # Fair, round-robin fill of the budget.
+    queues: Dict[str, List[Tuple[str, int, str, float]]] = {agent: [] for agent in agent_outputs}
+    for unit in kept:
+        queues[unit[0]].append(unit)
+    fair_share = budget_tokens // max(len(queues), 1)
+    remaining = budget_tokens
+    selected: Dict[str, List[Tuple[int, str]]] = {agent: [] for agent in agent_outputs}
+    progress = True
+    while progress:
+        progress = False
+        for agent, queue in queues.items():
+            while queue:
+                _, position, text, _ = queue.pop(0)
+                cost = _tokens(text) + 1
+                if cost <= remaining:
+                    selected[agent].append((position, text))
+                    remaining -= cost
+                    progress = True
+                    break
+                if not selected[agent] and remaining > 0:
+                    clipped = _clip(text, min(remaining, fair_share))
+                    selected[agent].append((position, clipped))
+                    remaining -= min(_tokens(clipped) + 1, remaining)
+                    progress = True
+                    break
+
+    sections = []
+    for agent, items in selected.items():
+        if items:
+            body = "\n".join(f"- {text}" for _, text in sorted(items))
+            sections.append(f"--- {agent} ---\n{body}")
+    compressed = "\n\n".join(sections)
+
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["units_in"] += len(units)
+        _stats["units_out"] += sum(len(items) for items in selected.values())
+        _stats["duplicates"] += duplicates
+        _stats["tokens_in"] += sum(_tokens(o) for o in agent_outputs.values())
+        _stats["tokens_out"] += _tokens(compressed)
+    return compressed
+
+
+def compression_stats() -> Dict[str, Any]:
+    """Units/tokens in and out of compression since process start."""
+
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    stats["token_ratio"] = stats["tokens_out"] / stats["tokens_in"] if stats["tokens_in"] else 1.0
+    return stats
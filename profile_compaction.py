@@ -0,0 +1,232 @@
+"""Bounded, compacted storage for the long-term user profile.
+
+The ProfileUpdater returns free-form keys ("Job Title", "current_role",
+"years_experience", ...) that used to be merged into `profiles.data`
+forever. This module keeps the stored profile bounded:
+
+- keys are normalized to snake_case and folded through KEY_ALIASES, so
+  the same fact is stored once;
+- values are trimmed (long strings cut, lists deduped and capped);
+- every field carries metadata in `_meta` (`updated_at`, `hits`: how often
+  the updater has re-asserted it); fields not confirmed for
+  STALE_AFTER_DAYS and asserted fewer than KEEP_HITS times age out;
+- the serialized fields and their metadata must fit MAX_PROFILE_BYTES;
+  the least valuable fields (fewest hits, then oldest) are evicted until
+  they do;
+- `_summary` holds a compact one-line rendering for prompts, capped at
+  SUMMARY_MAX_CHARS (on top of the byte budget), so specialists no
+  longer receive a blindly truncated `str(profile)`.
+
+Keys starting with "_" are reserved for this bookkeeping.
+"""
+
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+MAX_PROFILE_BYTES = 4096
+MAX_FIELDS = 40
+MAX_VALUE_CHARS = 300
+MAX_LIST_ITEMS = 10
+STALE_AFTER_DAYS = 540
+KEEP_HITS = 3
+SUMMARY_MAX_CHARS = 1000
+
+META_KEY = "_meta"
+SUMMARY_KEY = "_summary"
+
+# Variants the updater tends to produce -> canonical key.
+KEY_ALIASES: Dict[str, str] = {
+    "role": "current_role",
+    "job": "current_role",
+    "job_title": "current_role",
+    "title": "current_role",
+    "current_job": "current_role",
+    "current_position": "current_role",
+    "position": "current_role",
+    "occupation": "current_role",
+    "years_of_experience": "experience_years",
+    "years_experience": "experience_years",
+    "experience": "experience_years",
+    "total_experience": "experience_years",
+    "city": "location",
+    "current_location": "location",
+    "based_in": "location",
+    "country": "location",
+    "employer": "current_company",
+    "company": "current_company",
+    "skill": "skills",
+    "key_skills": "skills",
+    "technical_skills": "skills",
+    "goal": "career_goals",
+    "goals": "career_goals",
+    "career_goal": "career_goals",
+    "value": "values",
+    "core_values": "values",
+    "work_preference": "work_preferences",
+    "preferences": "work_preferences",
+    "constraint": "constraints",
+    "hard_constraints": "constraints",
+    "education_level": "education",
+    "degree": "education",
+    "personality": "personality_traits",
+    "traits": "personality_traits",
+}
+
+
+def normalize_key(key: Any) -> str:
+    """Canonical snake_case key ("Job Title" -> "current_role")."""
+
+    normalized = re.sub(r"[^a-z0-9]+", "_", str(key).strip().lower()).strip("_")
+    return KEY_ALIASES.get(normalized, normalized)
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value[:MAX_VALUE_CHARS]
+    if isinstance(value, (list, tuple, set)):
+        items: List[Any] = []
+        seen = set()
+        for item in value:
+            item = _normalize_value(item)
+            marker = json.dumps(item, sort_keys=True, default=str).lower()
+            if item in ("", None, [], {}) or marker in seen:
+                continue
+            seen.add(marker)
+            items.append(item)
+        return items[:MAX_LIST_ITEMS]
+    if isinstance(value, dict):
+        return {normalize_key(k): _normalize_value(v) for k, v in list(value.items())[:MAX_LIST_ITEMS]}
+    return value
+
+
+def _merge_values(old: Any, new: Any) -> Any:
+    """Lists accumulate (newest first); anything else is replaced."""
+
+    if isinstance(old, list) and isinstance(new, list):
+        return _normalize_value(new + old)
+    return new
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _field_rank(meta: Dict[str, Any]) -> Tuple[int, str]:
+    return (int(meta.get("hits", 0)), str(meta.get("updated_at", "")))
+
+
+def _render_value(value: Any) -> str:
+    if isinstance(value, list):
+        return ", ".join(_render_value(v) for v in value)
+    if isinstance(value, dict):
+        return "; ".join(f"{k}={_render_value(v)}" for k, v in value.items())
+    return str(value)
+
+
+def profile_fields(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """The user-facing fields, without bookkeeping keys."""
+
+    return {k: v for k, v in (profile or {}).items() if not str(k).startswith("_")}
+
+
+def render_profile_summary(profile: Dict[str, Any], max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Compact "key: value | ..." rendering, most established fields first."""
+
+    meta = (profile or {}).get(META_KEY, {})
+    fields = profile_fields(profile)
+    ordered = sorted(fields, key=lambda k: _field_rank(meta.get(k, {})), reverse=True)
+    parts: List[str] = []
+    used = 0
+    for key in ordered:
+        part = f"{key}: {_render_value(fields[key])}"
+        if used + len(part) + 3 > max_chars:
+            continue
+        parts.append(part)
+        used += len(part) + 3
+    return " | ".join(parts)
+
+
+def compact_profile(profile: Dict[str, Any], now: datetime | None = None) -> Dict[str, Any]:
+    """Normalize, age out and size-bound a stored profile.
+
+    Idempotent; also upgrades legacy profiles without `_meta`.
+    """
+
+    now = now or _now()
+    old_meta: Dict[str, Dict[str, Any]] = dict((profile or {}).get(META_KEY) or {})
+    fields: Dict[str, Any] = {}
+    meta: Dict[str, Dict[str, Any]] = {}
+
+    for raw_key, value in profile_fields(profile).items():
+        key = normalize_key(raw_key)
+        if not key:
+            continue
+        value = _normalize_value(value)
+        if value in ("", None, [], {}):
+            continue
+        field_meta = old_meta.get(raw_key) or old_meta.get(key) or {
+            "updated_at": now.isoformat(),
+            "hits": 1,
+        }
+        if key in fields:
+            fields[key] = _merge_values(fields[key], value)
+            meta[key] = {
+                "updated_at": max(meta[key]["updated_at"], field_meta["updated_at"]),
+                "hits": meta[key]["hits"] + int(field_meta.get("hits", 1)),
+            }
+        else:
+            fields[key] = value
+            meta[key] = dict(field_meta)
+
+    # Age out fields that were never re-confirmed.
+    cutoff = (now - timedelta(days=STALE_AFTER_DAYS)).isoformat()
+    for key in list(fields):
+        if meta[key].get("updated_at", "") < cutoff and int(meta[key].get("hits", 0)) < KEEP_HITS:
+            del fields[key]
+            del meta[key]
+
+    # Enforce the field count and byte budget, evicting the weakest fields.
+    by_value = sorted(fields, key=lambda k: _field_rank(meta[k]))
+    while by_value and (
+        len(fields) > MAX_FIELDS
+        or len(json.dumps({**fields, META_KEY: meta}, default=str).encode("utf-8")) > MAX_PROFILE_BYTES
+    ):
+        victim = by_value.pop(0)
+        del fields[victim]
+        del meta[victim]
+
+    compacted: Dict[str, Any] = {**fields, META_KEY: meta}
+    compacted[SUMMARY_KEY] = render_profile_summary(compacted)
+    return compacted
+
+
+def merge_profile_update(
+    profile: Dict[str, Any],
+    updates: Dict[str, Any],
+    now: datetime | None = None,
+) -> Dict[str, Any]:
+    """Merge ProfileUpdater output into a stored profile and compact it."""
+
+    now = now or _now()
+    merged = compact_profile(profile, now)
+    meta = merged[META_KEY]
+    for raw_key, value in (updates or {}).items():
+        key = normalize_key(raw_key)
+        value = _normalize_value(value)
+        if not key or key.startswith("_") or value in ("", None, [], {}):
+            continue
+        merged[key] = _merge_values(merged[key], value) if key in merged else value
+        previous = meta.get(key, {})
+        meta[key] = {"updated_at": now.isoformat(), "hits": int(previous.get("hits", 0)) + 1}
+    return compact_profile(merged, now)
+
+
+def profile_for_prompt(profile: Dict[str, Any]) -> str:
+    """The compact summary to put in prompts (rendered on the fly if missing)."""
+
+    if not profile:
+        return ""
+    return profile.get(SUMMARY_KEY) or render_profile_summary(profile)
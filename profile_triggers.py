@@ -0,0 +1,96 @@
+"""Cheap local detector deciding when the ProfileUpdater is worth calling.
+
+The profile only stores stable facts: roles, experience, education,
+locations, hard constraints, preferences and traits. Most turns ("can you
+expand on point 3?") contain none, so `profile_updater_node` first runs
+`detect_profile_signals()` over the user's unseen messages and only calls
+the LLM when one of the lexicon patterns below matches. As a safety net
+against detector misses, an update is also forced once
+`FORCE_UPDATE_AFTER` user messages have gone unprocessed.
+"""
+
+import re
+import threading
+from typing import Dict, List
+
+# category -> pattern over the user's own words
+PROFILE_SIGNAL_PATTERNS: Dict[str, re.Pattern] = {
+    "role": re.compile(
+        r"\b(i am|i'm|im|i work|i've been working|i have been working|i used to be|i was)\s+"
+        r"(a|an|as|at|in|for)\b|\b(my (current )?(role|job|title|position|company|employer|team)|"
+        r"job title|promoted to|hired as|laid off|unemployed|self-employed|freelancer)\b",
+        re.IGNORECASE,
+    ),
+    "experience": re.compile(
+        r"\b\d+\+?\s*(years?|yrs?|months?)\b|\b(senior|junior|mid-level|entry-level|intern)\b",
+        re.IGNORECASE,
+    ),
+    "education": re.compile(
+        r"\b(degree in|bachelor'?s?|master'?s?|phd|mba|graduated|studying|majored|bootcamp|"
+        r"certified|certification in)\b",
+        re.IGNORECASE,
+    ),
+    "location": re.compile(
+        r"\b(i live|i'm based|i am based|based in|living in|moved to|moving to|relocat\w*|"
+        r"visa|work permit|time ?zone)\b",
+        re.IGNORECASE,
+    ),
+    "constraint": re.compile(
+        r"\b(i can't|i cannot|i can not|i must|i need to earn|at least|no more than|budget|"
+        r"mortgage|debt|loan|kids|children|family|caregiver|part-time|full-time|health)\b|"
+        r"[$€£₹]\s?\d|\b\d+\s?k\b",
+        re.IGNORECASE,
+    ),
+    "preference": re.compile(
+        r"\b(i prefer|i'd prefer|i would prefer|i'd rather|i would rather|i love|i enjoy|"
+        r"i like|i hate|i dislike|i don't like|i value|i care about|i want to (be|become|work|move)|"
+        r"my goal|my dream|remote|hybrid|on-site|onsite|work-life balance)\b",
+        re.IGNORECASE,
+    ),
+    "trait": re.compile(
+        r"\b(introvert\w*|extrovert\w*|ambivert|perfectionist|adhd|anxious person|"
+        r"i tend to|i'm good at|i am good at|i'm bad at|i am bad at|i struggle with|"
+        r"my strengths?|my weakness\w*|personality)\b",
+        re.IGNORECASE,
+    ),
+}
+
+# Unprocessed user messages after which the updater runs even without a
+# detected signal.
+FORCE_UPDATE_AFTER = 6
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"checked": 0, "triggered": 0, "forced": 0, "deferred": 0}
+
+
+def detect_profile_signals(text: str) -> List[str]:
+    """Categories of stable profile facts the text probably contains."""
+
+    return [name for name, pattern in PROFILE_SIGNAL_PATTERNS.items() if pattern.search(text or "")]
+
+
+def should_update_profile(user_texts: List[str]) -> str | None:
+    """Return "signal" or "forced" when an update should run, else None."""
+
+    outcome: str | None = None
+    if any(detect_profile_signals(text) for text in user_texts):
+        outcome = "signal"
+    elif len(user_texts) >= FORCE_UPDATE_AFTER:
+        outcome = "forced"
+
+    with _stats_lock:
+        _stats["checked"] += 1
+        if outcome == "signal":
+            _stats["triggered"] += 1
+        elif outcome == "forced":
+            _stats["forced"] += 1
+        else:
+            _stats["deferred"] += 1
+    return outcome
+
+
+def profile_update_stats() -> Dict[str, int]:
+    """How often the updater was triggered, forced or deferred."""
+
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,78 @@
+"""Pipeline profiles selectable per turn via `run_session(response_mode=...)`.
+
+- "fast": one specialist, no web search, and the specialist's answer is
+  returned directly (no synthesizer call) with smaller token caps.
+- "balanced": the default pipeline (up to 3 specialists, keyword-gated web
+  search, synthesizer).
+- "thorough": more specialists, web search whenever the router asks for
+  it, and larger token caps for deeper analysis.
+
+Each profile sets the agent limits, a per-turn budget of output tokens, the
+token budget for the compressed specialist outputs the synthesizer reads
+(see output_compression.py) and, per node, the model and max_tokens. Node keys are "router",
+"web_searcher", "specialist", "synthesizer" and "profile_updater"; a node
+without settings uses the defaults in model_policy.AGENT_MODEL_CONFIG. The
+model policy may still lower max_tokens (or switch to the light model) for
+simple queries and as the turn's budget runs out.
+"""
+
+from typing import Any, Dict
+
+DEFAULT_RESPONSE_MODE = "balanced"
+
+RESPONSE_MODES: Dict[str, Dict[str, Any]] = {
+    "fast": {
+        "max_specialists": 1,
+        # "off": never search; "selective": only when the query clearly
+        # needs fresh data; "router": whenever the router selects it.
+        "web_search": "off",
+        # Return a lone specialist's output as the final answer.
+        "single_agent_passthrough": True,
+        # Output tokens shared by all generation calls of one turn.
+        "token_budget": 800,
+        # Input tokens of compressed specialist outputs given to the synthesizer.
+        "synthesis_input_tokens": 600,
+        "nodes": {
+            "router": {"model": "gemini-2.5-flash-lite", "max_tokens": 128},
+            "specialist": {"model": "gemini-2.5-flash", "max_tokens": 384},
+            "synthesizer": {"model": "gemini-2.5-flash", "max_tokens": 384},
+        },
+    },
+    "balanced": {
+        "max_specialists": 3,
+        "web_search": "selective",
+        "single_agent_passthrough": False,
+        "token_budget": 2500,
+        "synthesis_input_tokens": 1000,
+        "nodes": {},
+    },
+    "thorough": {
+        "max_specialists": 5,
+        "web_search": "router",
+        "single_agent_passthrough": False,
+        "token_budget": 6000,
+        "synthesis_input_tokens": 1800,
+        "nodes": {
+            "web_searcher": {"max_tokens": 512},
+            "specialist": {"max_tokens": 768},
+            "synthesizer": {"max_tokens": 1024},
+        },
+    },
+}
+
+
+def get_response_mode(name: str | None) -> Dict[str, Any]:
+    """Return the profile for a mode name (None means the default)."""
+
+    mode = RESPONSE_MODES.get(name or DEFAULT_RESPONSE_MODE)
+    if mode is None:
+        raise ValueError(
+            f"Unknown response_mode {name!r}; expected one of {', '.join(RESPONSE_MODES)}."
+        )
+    return mode
+
+
+def node_settings(mode_name: str | None, node: str) -> Dict[str, Any]:
+    """Model/max_tokens overrides for one node under a mode."""
+
+    return dict(get_response_mode(mode_name)["nodes"].get(node, {}))
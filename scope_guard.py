@@ -0,0 +1,272 @@
+"""Local out-of-scope guard run at the graph entry.
+
+Remiro only answers career questions. Without this guard an off-topic
+question ("what's the AAPL stock price?") goes through the router, the
+specialists and the synthesizer before the synthesizer's system prompt
+refuses it, so a refusal costs 3-5 LLM calls. `classify_scope()` decides
+locally, in well under a millisecond, using:
+
+- keyword rules: career vocabulary and career-intent phrases ("how do I
+  become a meteorologist") are never refused on keywords, clearly
+  off-topic patterns (stock prices, sports scores, trivia, ...) without
+  any career signal are candidates for refusal;
+- a small logistic-regression model over hashed unigram/bigram features
+  (embeddings.HashingEmbedder), trained on first use from the labelled
+  seed examples below.
+
+Only confident off-topic decisions are short-circuited; anything unsure
+goes through the normal pipeline, where the synthesizer still enforces
+the domain boundary. The thresholds trade recall for precision:
+
+- REMIRO_SCOPE_THRESHOLD (default 0.9): model probability needed to refuse
+  a query that matches no off-topic rule.
+- REMIRO_SCOPE_RULE_THRESHOLD (default 0.5): model probability needed to
+  refuse a query that does match an off-topic rule.
+- REMIRO_SCOPE_GUARD=0 disables the guard.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from embeddings import HashingEmbedder, tokenize
+
+OUT_OF_SCOPE_REPLY = (
+    "I'm Remiro AI, and I can only help with career-related topics: your work, "
+    "skills, learning, job search, workplace situations and long-term career "
+    "direction. I can't help with that question, but if there's something about "
+    "your career on your mind, I'd be glad to dig into it with you."
+)
+
+# Any of these means the query may well be in scope: it is never refused on
+# an off-topic keyword, only when the model alone is confident. Career-intent
+# phrases ("become a meteorologist", "work as a sports journalist") name
+# jobs whose subject matter is often off-topic vocabulary.
+_CAREER_RE = re.compile(
+    r"\b(becom(e|es|ing) an?|get(ting)? into|break(ing)? into|work(ing)? as|job as|"
+    r"career (as|in)|train(ing)? as|qualif(y|ied) as|"
+    r"career|careers|job|jobs|resume|résumé|cv|cover letter|interview\w*|linkedin|"
+    r"promotion|promoted|boss|manager|coworkers?|colleagues?|salary|salaries|pay raise|raise|"
+    r"hiring|hired|recruiter\w*|employer|employee|internship\w*|workplace|office|remote|"
+    r"burnout|burned out|freelanc\w*|profession\w*|portfolio|negotiat\w*|quit|fired|"
+    r"layoffs?|laid off|mentor\w*|networking|skills?|learn\w*|course\w*|certification\w*|"
+    r"degree|study|studying|work|working|team|role|position|company|startup|business|"
+    r"purpose|strengths?|weakness\w*|personality|motivation|goals?|department|paths?)\b",
+    re.IGNORECASE,
+)
+
+# Clearly outside the career domain. Words that are just as common in
+# career questions ("office politics", "how old is too old to switch",
+# "president of the company", "symptoms of burnout") are left to the model.
+_OFF_TOPIC_RE = re.compile(
+    r"\b(stock price|share price|ticker|crypto\w*|bitcoin|ethereum|dow jones|nasdaq|s&p 500|"
+    r"score|scores|who won|match result|football|soccer|nba|nfl|cricket|world cup|"
+    r"weather|forecast|recipe|recipes|cook|bake a|"
+    r"capital of|population of|how tall|trivia|riddle|joke|jokes|"
+    r"movie|movies|song|lyrics|celebrity|celebrities|horoscope|zodiac|"
+    r"election|prime minister|political party|"
+    r"diagnos\w*|medication|dosage|lottery|"
+    r"planet|planets|galaxy|dinosaur\w*)\b",
+    re.IGNORECASE,
+)
+
+# Labelled seed examples for the linear model (1 = off-topic).
+_OFF_TOPIC_EXAMPLES = [
+    "what is the stock price of apple today",
+    "current bitcoin price in usd",
+    "should i buy tesla shares now",
+    "who won the football match last night",
+    "what was the score of the lakers game",
+    "when is the next world cup final",
+    "what's the weather in london tomorrow",
+    "will it rain this weekend",
+    "give me a recipe for chocolate cake",
+    "how do i cook basmati rice",
+    "what is the capital of australia",
+    "what is the population of japan",
+    "how tall is the eiffel tower",
+    "tell me a joke",
+    "tell me a fun trivia fact",
+    "recommend a good movie to watch tonight",
+    "what are the lyrics of bohemian rhapsody",
+    "who is taylor swift dating",
+    "what is my horoscope for today",
+    "who will win the next presidential election",
+    "what do you think of the prime minister",
+    "i have a headache and fever what medication should i take",
+    "what are the symptoms of diabetes",
+    "what are the winning lottery numbers",
+    "how many planets are in the solar system",
+    "why did the dinosaurs go extinct",
+    "translate this sentence into french",
+    "write me a poem about the ocean",
+    "what is the best pizza topping",
+    "how far is the moon from earth",
+    "solve this math equation for x",
+    "what time is it in tokyo",
+    "best places to visit in italy for vacation",
+    "how do i fix my car engine noise",
+    "what breed of dog should i get",
+]
+
+_IN_SCOPE_EXAMPLES = [
+    "how do i write a good resume",
+    "help me prepare for a job interview",
+    "i want to switch careers into data science",
+    "how do i ask my boss for a raise",
+    "i feel burned out at work",
+    "what skills do i need to become a product manager",
+    "how should i improve my linkedin profile",
+    "i don't know what i'm good at",
+    "how can i find more meaning in my work",
+    "should i take the job offer or stay",
+    "how do i deal with a difficult coworker",
+    "what is a realistic five year career plan",
+    "how do i learn python while working full time",
+    "how do i negotiate my salary",
+    "i was laid off what should i do next",
+    "is remote work a good fit for me",
+    "help me write a cover letter",
+    "how do i build a portfolio as a designer",
+    "what are my strengths and weaknesses",
+    "i feel stuck in my current role",
+    "should i go back to school for a masters degree",
+    "how do i network with people in my industry",
+    "what certifications help a cloud engineer",
+    "how do i become a better leader for my team",
+    "i want to start my own business",
+    "how do i explain a gap in my employment history",
+    "what jobs suit an introverted personality",
+    "help me craft an elevator pitch",
+    "how do i get promoted faster",
+    "what should i study to work in ai",
+    "my manager micromanages me",
+    "how do i stay motivated when job hunting",
+    "which career path fits my values",
+    "how do i transition from teaching to ux design",
+    "is it a good time to change industries",
+    "how do i handle the politics in my department",
+    "office politics are wearing me down",
+    "i am 45 how old is too late to change paths",
+    "am i too old to start over in a new field",
+    "our company president ignores my ideas",
+    "what are the symptoms of burnout at work",
+]
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_RULE_THRESHOLD = 0.5
+
+
+@dataclass
+class ScopeDecision:
+    """Outcome of `classify_scope`.
+
+    label is "off_topic" (refuse locally), "in_scope" or "unsure" (both go
+    through the normal pipeline); score is the model's off-topic probability.
+    """
+
+    label: str
+    score: float
+    reason: str
+
+
+class ScopeClassifier:
+    """Logistic regression over hashed features, trained with plain NumPy."""
+
+    def __init__(self, dim: int = 1024, epochs: int = 500, learning_rate: float = 2.0, l2: float = 1e-3) -> None:
+        self.embedder = HashingEmbedder(dim=dim)
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights = np.zeros(dim, dtype=np.float32)
+        self.bias = 0.0
+
+    def fit(self, texts: List[str], labels: List[int]) -> "ScopeClassifier":
+        x = self.embedder.embed_many(texts)
+        y = np.asarray(labels, dtype=np.float32)
+        for _ in range(self.epochs):
+            p = 1.0 / (1.0 + np.exp(-(x @ self.weights + self.bias)))
+            error = p - y
+            self.weights -= self.learning_rate * (x.T @ error / len(y) + self.l2 * self.weights)
+            self.bias -= self.learning_rate * float(error.mean())
+        return self
+
+    def predict_proba(self, text: str) -> float:
+        z = float(self.embedder.embed(text) @ self.weights + self.bias)
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+
+_classifier: Optional[ScopeClassifier] = None
+_classifier_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"checked": 0, "off_topic": 0, "in_scope": 0, "unsure": 0}
+
+
+def get_scope_classifier() -> ScopeClassifier:
+    """Return the process-wide classifier, training it on first use (~ms)."""
+
+    global _classifier
+
+    with _classifier_lock:
+        if _classifier is None:
+            texts = _OFF_TOPIC_EXAMPLES + _IN_SCOPE_EXAMPLES
+            labels = [1] * len(_OFF_TOPIC_EXAMPLES) + [0] * len(_IN_SCOPE_EXAMPLES)
+            _classifier = ScopeClassifier().fit(texts, labels)
+        return _classifier
+
+
+def scope_guard_enabled() -> bool:
+    return os.getenv("REMIRO_SCOPE_GUARD", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def classify_scope(
+    query: str,
+    threshold: float | None = None,
+    rule_threshold: float | None = None,
+) -> ScopeDecision:
+    """Decide whether a query is clearly outside the career domain."""
+
+    if threshold is None:
+        threshold = float(os.getenv("REMIRO_SCOPE_THRESHOLD", str(DEFAULT_THRESHOLD)))
+    if rule_threshold is None:
+        rule_threshold = float(os.getenv("REMIRO_SCOPE_RULE_THRESHOLD", str(DEFAULT_RULE_THRESHOLD)))
+
+    if len(tokenize(query or "")) < 2:
+        # Greetings and one-word messages: let the assistant respond.
+        decision = ScopeDecision("unsure", 0.0, "too_short")
+    elif _CAREER_RE.search(query):
+        # A career signal outweighs off-topic keywords: only the model, at
+        # its own threshold, may still refuse.
+        score = get_scope_classifier().predict_proba(query)
+        if score >= threshold:
+            decision = ScopeDecision("off_topic", score, "model")
+        else:
+            decision = ScopeDecision("in_scope", score, "career_keyword")
+    else:
+        score = get_scope_classifier().predict_proba(query)
+        if _OFF_TOPIC_RE.search(query) and score >= rule_threshold:
+            decision = ScopeDecision("off_topic", score, "off_topic_keyword")
+        elif score >= threshold:
+            decision = ScopeDecision("off_topic", score, "model")
+        elif score <= 1.0 - threshold:
+            decision = ScopeDecision("in_scope", score, "model")
+        else:
+            decision = ScopeDecision("unsure", score, "model")
+
+    with _stats_lock:
+        _stats["checked"] += 1
+        _stats[decision.label] += 1
+    return decision
+
+
+def scope_guard_stats() -> Dict[str, Any]:
+    """Counters of guard decisions since process start."""
+
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    stats["refusal_rate"] = stats["off_topic"] / stats["checked"] if stats["checked"] else 0.0
+    return stats
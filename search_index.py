@@ -0,0 +1,281 @@
+"""Per-user full-text search over past conversations.
+
+The sidebar used to offer nothing but session titles, so finding an old
+conversation meant opening sessions one by one. This module keeps an
+inverted index per user over every stored message, maintained
+incrementally by `graph.append_session_messages`, and ranks matches with
+BM25 without touching the messages table.
+
+Layout on disk (one directory per user under REMIRO_SEARCH_DIR):
+
+- `docs.jsonl` – one JSON line per indexed message (id, session, role,
+  created_at, content); append-only, so a replaced message (a regenerated
+  reply) appears again and its last line wins. A torn last line from a
+  crash is truncated on load.
+- `meta.json` – {"backfilled": true} once the user's older messages have
+  been indexed (see graph.search_conversations).
+
+Postings (term -> {doc: term frequency}) are rebuilt in memory when an
+index is opened and updated in place on every add. Terms come from
+`embeddings.tokenize` (lowercased, stopwords removed, plurals folded), so
+"interviews" finds "interview". A search touches only the postings of the
+query's terms: a few milliseconds for users with thousands of messages.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from embeddings import tokenize
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 160
+SNIPPET_LEAD_CHARS = 50
+
+_WORD_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9+#'’.\-]*[A-Za-z0-9+#]|[A-Za-z0-9]")
+_MARKDOWN_RE = re.compile(r"([\\`*_\[\]#])")
+
+
+def _escape_markdown(text: str) -> str:
+    return _MARKDOWN_RE.sub(r"\\\1", text)
+
+
+def highlight_snippet(text: str, terms: Set[str], max_chars: int = SNIPPET_CHARS) -> str:
+    """A window of `text` around the first match, matches in **bold** (markdown)."""
+
+    text = " ".join((text or "").split())
+    matches = [m for m in _WORD_RE.finditer(text) if set(tokenize(m.group(0))) & terms]
+    start = 0
+    if matches and matches[0].start() > SNIPPET_LEAD_CHARS:
+        start = text.rfind(" ", 0, matches[0].start() - SNIPPET_LEAD_CHARS) + 1
+    end = min(len(text), start + max_chars)
+    if end < len(text):
+        end = max(text.rfind(" ", start, end), start + 1)
+
+    parts: List[str] = ["…" if start > 0 else ""]
+    cursor = start
+    for match in matches:
+        if match.start() < start:
+            continue
+        if match.end() > end:
+            break
+        parts.append(_escape_markdown(text[cursor:match.start()]))
+        parts.append(f"**{_escape_markdown(match.group(0))}**")
+        cursor = match.end()
+    parts.append(_escape_markdown(text[cursor:end]))
+    parts.append("…" if end < len(text) else "")
+    return "".join(parts)
+
+
+class UserSearchIndex:
+    """BM25 inverted index of one user's messages."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._docs_path = os.path.join(directory, "docs.jsonl")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock = threading.Lock()
+
+        self._docs: List[Dict[str, Any]] = []
+        self._lengths: List[int] = []
+        self._total_length = 0
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # message id -> position in _docs
+        self._doc_ids: Dict[str, int] = {}
+        # session id -> position of its earliest user message (for titles)
+        self._first_user_docs: Dict[str, int] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._docs_path):
+            return
+        good_end = 0
+        with open(self._docs_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    doc = json.loads(line)
+                except ValueError:
+                    break
+                good_end += len(line)
+                self._index_doc(doc)
+        if good_end < os.path.getsize(self._docs_path):
+            # Torn write from a crash: drop the incomplete tail.
+            with open(self._docs_path, "ab") as f:
+                f.truncate(good_end)
+
+    def _index_doc(self, doc: Dict[str, Any]) -> None:
+        """Index a doc; one whose message id is already indexed replaces it in place."""
+
+        doc_id = self._doc_ids.get(doc["message_id"])
+        if doc_id is None:
+            doc_id = len(self._docs)
+            self._docs.append(doc)
+            self._lengths.append(0)
+            self._doc_ids[doc["message_id"]] = doc_id
+        else:
+            for term in set(tokenize(self._docs[doc_id].get("content") or "")):
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= self._lengths[doc_id]
+            self._docs[doc_id] = doc
+        terms = tokenize(doc.get("content") or "")
+        for term in terms:
+            postings = self._postings.setdefault(term, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+        self._lengths[doc_id] = len(terms)
+        self._total_length += len(terms)
+
+        if doc.get("role") == "user":
+            first = self._first_user_docs.get(doc["session_id"])
+            if first is None or str(doc.get("created_at") or "") < str(self._docs[first].get("created_at") or ""):
+                self._first_user_docs[doc["session_id"]] = doc_id
+
+    @property
+    def backfilled(self) -> bool:
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                return bool(json.load(f).get("backfilled"))
+        except (OSError, ValueError):
+            return False
+
+    def mark_backfilled(self) -> None:
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"backfilled": True}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def add(self, items: Iterable[Dict[str, Any]], replace: bool = False) -> int:
+        """Index messages given as dicts with message_id, session_id, role, content, created_at.
+
+        Already indexed message ids are skipped, or with `replace` indexed
+        again with their new content (a regenerated reply). Returns the
+        number added or replaced.
+        """
+
+        added = 0
+        with self._lock:
+            lines: List[str] = []
+            for item in items:
+                message_id = str(item.get("message_id") or "")
+                if not message_id or not item.get("content"):
+                    continue
+                if message_id in self._doc_ids and not replace:
+                    continue
+                doc = {
+                    "message_id": message_id,
+                    "session_id": item.get("session_id"),
+                    "role": item.get("role"),
+                    "created_at": item.get("created_at"),
+                    "content": item.get("content"),
+                }
+                self._index_doc(doc)
+                lines.append(json.dumps(doc) + "\n")
+                added += 1
+            if lines:
+                with open(self._docs_path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+        return added
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Best-matching message per session, best sessions first.
+
+        Each hit has session_id, message_id, role, created_at, score, the
+        number of matching messages in the session (`matches`), a
+        highlighted `snippet` and the session's first user message
+        (`first_message`, for a title).
+        """
+
+        terms = set(tokenize(query or ""))
+        with self._lock:
+            count = len(self._docs)
+            if not terms or count == 0:
+                return []
+            avg_length = self._total_length / count or 1.0
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+            best: Dict[str, int] = {}
+            matches: Dict[str, int] = {}
+            for doc_id, score in scores.items():
+                session_id = self._docs[doc_id]["session_id"]
+                matches[session_id] = matches.get(session_id, 0) + 1
+                if session_id not in best or score > scores[best[session_id]]:
+                    best[session_id] = doc_id
+            ranked = sorted(best.values(), key=lambda doc_id: scores[doc_id], reverse=True)[:limit]
+            docs = [(self._docs[doc_id], scores[doc_id]) for doc_id in ranked]
+            first_messages = self._first_user_messages({doc["session_id"] for doc, _ in docs})
+
+        return [
+            {
+                "session_id": doc["session_id"],
+                "message_id": doc["message_id"],
+                "role": doc["role"],
+                "created_at": doc["created_at"],
+                "score": score,
+                "matches": matches[doc["session_id"]],
+                "snippet": highlight_snippet(doc["content"], terms),
+                "first_message": first_messages.get(doc["session_id"], ""),
+            }
+            for doc, score in docs
+        ]
+
+    def _first_user_messages(self, session_ids: Set[str]) -> Dict[str, str]:
+        return {
+            session_id: self._docs[self._first_user_docs[session_id]]["content"]
+            for session_id in session_ids
+            if session_id in self._first_user_docs
+        }
+
+
+_indexes: "OrderedDict[str, UserSearchIndex]" = OrderedDict()
+# Open indexes by directory, including evicted ones still in use, so
+# docs.jsonl never has two writers (see conversation_memory.py).
+_live_indexes: "weakref.WeakValueDictionary[str, UserSearchIndex]" = weakref.WeakValueDictionary()
+_indexes_lock = threading.Lock()
+MAX_OPEN_INDEXES = 64
+
+
+def search_enabled() -> bool:
+    return os.getenv("REMIRO_SEARCH", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_search_index(user_id: str) -> UserSearchIndex:
+    """Return the (cached) search index for a user."""
+
+    with _indexes_lock:
+        index: Optional[UserSearchIndex] = _indexes.get(user_id)
+        if index is None:
+            root = os.getenv("REMIRO_SEARCH_DIR", os.path.join(".remiro", "search"))
+            safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)
+            directory = os.path.abspath(os.path.join(root, safe_id))
+            index = _live_indexes.get(directory)
+            if index is None:
+                index = UserSearchIndex(directory)
+                _live_indexes[directory] = index
+            _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+        return index
@@ -0,0 +1,222 @@
+"""Opt-in semantic cache for whole-turn responses.
+
+Many users ask near-identical generic questions ("how do I write a good
+LinkedIn headline?"). For those, the full pipeline (router, specialists,
+synthesizer) produces an answer that does not depend on who is asking, so
+`run_session` can serve a previous answer instead of spending 3-5 LLM
+calls.
+
+Only profile-independent queries are cached or served: anything that
+refers to the user's own situation, to earlier messages, or to
+time-sensitive market data always goes through the graph. The answers
+stored here must not depend on the user either: run_session generates
+them without the asking user's profile, history or memory (see
+graph._run_turn), so no one's personal details reach another user.
+
+Entries only match queries of the same response mode (a `fast` answer is
+not served to a `thorough` request) and the same polarity: negations are
+embedded and a negated query never matches a plain one ("should I accept
+a counteroffer?" vs "should I not accept a counteroffer?").
+
+Vectors come from `embeddings.HashingEmbedder` and are kept in a
+preallocated NumPy matrix, so a lookup is a single matrix-vector product.
+Entries expire after a TTL and the least recently used entry is evicted
+when the cache is full.
+
+Enable with REMIRO_SEMANTIC_CACHE=1; see `get_semantic_cache()` for the
+tuning variables.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from embeddings import NEGATIONS, HashingEmbedder, tokenize
+from response_modes import DEFAULT_RESPONSE_MODE
+
+# References to the user's own situation: answers depend on the profile.
+_PERSONAL_RE = re.compile(
+    r"\b(my|mine|myself|me|i'm|im|i am|i've|i have|i had|i was|i feel|i want|i need|"
+    r"i work|i live|i got|i earn|i make|we|our|us)\b|\b\d+\s*(years?|yrs?)\b",
+    re.IGNORECASE,
+)
+
+# Follow-ups ("expand on that") depend on the conversation history.
+_CONTEXTUAL_RE = re.compile(
+    r"\b(that|this|it|above|previous|earlier|again|you said|those|these|more detail)\b",
+    re.IGNORECASE,
+)
+
+# Answers to these would go stale or need web search.
+_TIME_SENSITIVE_RE = re.compile(
+    r"\b(latest|current|currently|today|now|news|trend|trends|trending|this year|20\d\d|salary|salaries)\b",
+    re.IGNORECASE,
+)
+
+MAX_CACHEABLE_WORDS = 30
+
+
+def is_profile_independent(query: str) -> bool:
+    """Heuristic: would any user get the same answer to this query?"""
+
+    if not query or len(query.split()) > MAX_CACHEABLE_WORDS:
+        return False
+    if _PERSONAL_RE.search(query) or _CONTEXTUAL_RE.search(query):
+        return False
+    if _TIME_SENSITIVE_RE.search(query):
+        return False
+    # Require at least two content words; "hi" or "help?" is not a question
+    # worth matching semantically.
+    return len(tokenize(query)) >= 2
+
+
+def cache_partition(query: str, response_mode: str = DEFAULT_RESPONSE_MODE) -> str:
+    """Entries only match queries with the same partition: mode and polarity."""
+
+    negated = any(t in NEGATIONS for t in tokenize(query, keep_negations=True))
+    return f"{response_mode}:{'negated' if negated else 'plain'}"
+
+
+class SemanticResponseCache:
+    """Thread-safe cosine-similarity cache with TTL and LRU eviction."""
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        threshold: float = 0.9,
+        ttl_seconds: float = 24 * 3600,
+        embedder: Optional[HashingEmbedder] = None,
+    ) -> None:
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder or HashingEmbedder(keep_negations=True)
+
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        # Parallel per-slot arrays; an unused slot has expires_at == 0.
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._partitions = np.full(capacity, "", dtype=object)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+
+        self.metrics: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    def lookup(self, query: str, response_mode: str = DEFAULT_RESPONSE_MODE) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a similar query in the same mode, or None."""
+
+        if not is_profile_independent(query):
+            with self._lock:
+                self.metrics["bypassed"] += 1
+            return None
+
+        vector = self.embedder.embed(query)
+        partition = cache_partition(query, response_mode)
+        now = time.time()
+        with self._lock:
+            live = self._expires_at > now
+            expired = (self._expires_at > 0) & ~live
+            if expired.any():
+                self._drop(np.flatnonzero(expired), "expired")
+            live &= self._partitions == partition
+
+            if not live.any():
+                self.metrics["misses"] += 1
+                return None
+
+            scores = self._vectors @ vector
+            scores[~live] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.metrics["misses"] += 1
+                return None
+
+            self._last_used[best] = now
+            self.metrics["hits"] += 1
+            return {**self._entries[best], "similarity": float(scores[best])}
+
+    def store(self, query: str, entry: Dict[str, Any], response_mode: str = DEFAULT_RESPONSE_MODE) -> bool:
+        """Cache an answer for a profile-independent query.
+
+        The answer must have been generated without any user's profile,
+        history or memory context.
+        """
+
+        if not is_profile_independent(query):
+            return False
+
+        vector = self.embedder.embed(query)
+        partition = cache_partition(query, response_mode)
+        now = time.time()
+        with self._lock:
+            free = np.flatnonzero(self._expires_at <= now)
+            if free.size:
+                slot = int(free[0])
+                if self._entries[slot] is not None:
+                    self._drop(np.array([slot]), "expired")
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._drop(np.array([slot]), "evictions")
+
+            self._vectors[slot] = vector
+            self._expires_at[slot] = now + self.ttl_seconds
+            self._last_used[slot] = now
+            self._partitions[slot] = partition
+            self._entries[slot] = {**entry, "query": query, "response_mode": response_mode}
+            self.metrics["stores"] += 1
+            return True
+
+    def _drop(self, slots: np.ndarray, reason: str) -> None:
+        for slot in slots:
+            self._entries[int(slot)] = None
+        self._expires_at[slots] = 0.0
+        self._last_used[slots] = 0.0
+        self._partitions[slots] = ""
+        self.metrics[reason] += int(slots.size)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus derived hit rate and current size."""
+
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.metrics)
+            stats["size"] = int((self._expires_at > time.time()).sum())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache: Optional[SemanticResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticResponseCache]:
+    """Return the process-wide cache, or None unless REMIRO_SEMANTIC_CACHE=1.
+
+    Tuning: REMIRO_SEMANTIC_CACHE_THRESHOLD (cosine, default 0.9),
+    REMIRO_SEMANTIC_CACHE_TTL (seconds, default 86400) and
+    REMIRO_SEMANTIC_CACHE_SIZE (entries, default 1024).
+    """
+
+    global _cache
+
+    if os.getenv("REMIRO_SEMANTIC_CACHE", "0").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticResponseCache(
+                capacity=int(os.getenv("REMIRO_SEMANTIC_CACHE_SIZE", "1024")),
+                threshold=float(os.getenv("REMIRO_SEMANTIC_CACHE_THRESHOLD", "0.9")),
+                ttl_seconds=float(os.getenv("REMIRO_SEMANTIC_CACHE_TTL", str(24 * 3600))),
+            )
+        return _cache
@@ -1,16 +1,42 @@
+import asyncio
 import os
-from typing import Optional, Dict, Any
+import threading
+import weakref
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
 
-from supabase import Client, create_client
+if TYPE_CHECKING:
+    from supabase import AsyncClient, Client
 
-_supabase_client: Optional[Client] = None
+_supabase_client: Optional["Client"] = None
+_supabase_lock = threading.Lock()
+_async_supabase_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_supabase_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = (
+    weakref.WeakKeyDictionary()
+)
 
 
-def get_supabase() -> Client:
+def _supabase_settings() -> Tuple[str, str]:
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_ANON_KEY")
+
+    if not url or not key:
+        raise RuntimeError(
+            "SUPABASE_URL and SUPABASE_ANON_KEY must be set in the environment "
+            "to use Supabase-backed persistence."
+        )
+    return url, key
+
+
+def get_supabase() -> "Client":
     """Return a singleton Supabase client configured from environment variables.
 
     Requires SUPABASE_URL and SUPABASE_ANON_KEY to be set in the environment
-    (for example via a .env file loaded by dotenv in graph.py).
+    (for example via a .env file loaded by dotenv in graph.py). The client
+    is built once even when several threads ask for it at the same time,
+    and sends its requests over the shared keep-alive pool from
+    connections.py.
     """
 
     global _supabase_client
@@ -18,19 +44,50 @@ def get_supabase() -> Client:
     if _supabase_client is not None:
         return _supabase_client
 
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_ANON_KEY")
+    with _supabase_lock:
+        if _supabase_client is None:
+            url, key = _supabase_settings()
 
-    if not url or not key:
-        raise RuntimeError(
-            "SUPABASE_URL and SUPABASE_ANON_KEY must be set in the environment "
-            "to use Supabase-backed persistence."
-        )
+            # Imported here so modules that only reference this helper do not
+            # pay for the supabase SDK at import time.
+            from supabase import ClientOptions, create_client
 
-    _supabase_client = create_client(url, key)
+            from connections import http_client
+
+            _supabase_client = create_client(url, key, options=ClientOptions(httpx_client=http_client("supabase")))
     return _supabase_client
 
 
+async def get_async_supabase() -> "AsyncClient":
+    """Async counterpart of get_supabase(): one client per event loop.
+
+    Concurrent tasks of a loop wait for the same construction instead of
+    each building a client.
+    """
+
+    loop = asyncio.get_running_loop()
+    client = _async_supabase_clients.get(loop)
+    if client is not None:
+        return client
+
+    with _supabase_lock:
+        lock = _async_supabase_locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        client = _async_supabase_clients.get(loop)
+        if client is None:
+            url, key = _supabase_settings()
+
+            from supabase import AsyncClientOptions, acreate_client
+
+            from connections import async_http_client
+
+            client = await acreate_client(
+                url, key, options=AsyncClientOptions(httpx_client=async_http_client("supabase"))
+            )
+            _async_supabase_clients[loop] = client
+    return client
+
+
 def _extract_user_id_from_auth_response(resp: Any) -> str:
     """Best-effort helper to extract a user ID from a Supabase auth response."""
 
@@ -53,6 +110,33 @@ def _extract_user_id_from_auth_response(resp: Any) -> str:
     return str(user_id)
 
 
+def _auth_client() -> "Client":
+    """A throwaway client for one sign-in or sign-up.
+
+    The tokens it returns are owned by the caller (auth_tokens.AuthSession
+    refreshes them), so this client neither refreshes nor keeps the
+    session. Signing in on the shared get_supabase() client would start
+    GoTrue's own refresh timer, rotating the refresh token behind the
+    caller's back, and would switch the shared client to that user's
+    token for everyone in the process.
+    """
+
+    from supabase import ClientOptions, create_client
+
+    from connections import http_client
+
+    url, key = _supabase_settings()
+    return create_client(
+        url,
+        key,
+        options=ClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            httpx_client=http_client("supabase"),
+        ),
+    )
+
+
 def sign_up_user(email: str, password: str) -> Dict[str, Any]:
     """Create a new Supabase auth user and return its ID.
 
@@ -61,8 +145,7 @@ def sign_up_user(email: str, password: str) -> Dict[str, Any]:
     chat_sessions, messages).
     """
 
-    sb = get_supabase()
-    resp = sb.auth.sign_up({"email": email, "password": password})
+    resp = _auth_client().auth.sign_up({"email": email, "password": password})
     user_id = _extract_user_id_from_auth_response(resp)
     return {"user_id": user_id, "raw": resp}
 
@@ -71,11 +154,10 @@ def sign_in_user(email: str, password: str) -> Dict[str, Any]:
     """Sign in an existing Supabase auth user and return its ID.
 
     On success, returns a dict with `user_id` and the raw auth response.
-    Frontends can store any access/refresh tokens contained in the raw
-    response if they need to call Supabase directly.
+    Its access/refresh tokens belong to the caller: wrap them in
+    auth_tokens.AuthSession, which refreshes them (nothing else does).
     """
 
-    sb = get_supabase()
-    resp = sb.auth.sign_in_with_password({"email": email, "password": password})
+    resp = _auth_client().auth.sign_in_with_password({"email": email, "password": password})
     user_id = _extract_user_id_from_auth_response(resp)
     return {"user_id": user_id, "raw": resp}
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from jwt.algorithms import ECAlgorithm
+
+import auth_tokens
+from auth_tokens import AuthError, AuthSession, SigningKeys, TokenVerifier
+
+ISSUER = "https://proj.supabase.co/auth/v1"
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeHTTP:
+    """Stands in for the pooled "supabase" client of connections.py."""
+
+    def __init__(self, get=None, post=None):
+        self.get, self.post = get, post
+
+
+@pytest.fixture(autouse=True)
+def supabase_env(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://proj.supabase.co")
+    monkeypatch.setenv("SUPABASE_ANON_KEY", "anon")
+
+
+@pytest.fixture
+def signing_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+@pytest.fixture
+def verifier(monkeypatch, signing_key):
+    jwk = json.loads(ECAlgorithm.to_jwk(signing_key.public_key()))
+    jwk.update(kid="k1", alg="ES256")
+    fetches = []
+
+    def fake_get(url, **kwargs):
+        fetches.append(url)
+        return Response({"keys": [jwk]})
+
+    monkeypatch.setattr(auth_tokens, "http_client", lambda name: FakeHTTP(get=fake_get))
+    verifier = TokenVerifier(ISSUER, SigningKeys(ISSUER + "/.well-known/jwks.json"))
+    verifier.fetches = fetches
+    return verifier
+
+
+def make_token(key, exp_in=3600, kid="k1", issuer=ISSUER):
+    claims = {"sub": "u1", "aud": "authenticated", "iss": issuer, "exp": int(time.time()) + exp_in}
+    return jwt.encode(claims, key, algorithm="ES256", headers={"kid": kid})
+
+
+def test_valid_token_is_verified_once_and_then_cached(verifier, signing_key):
+    token = make_token(signing_key)
+    assert verifier.verify(token)["sub"] == "u1"
+    assert verifier.verify(token)["sub"] == "u1"
+    assert len(verifier.fetches) == 1
+
+
+@pytest.mark.parametrize(
+    "make",
+    [
+        lambda key: make_token(key, exp_in=-3600),
+        lambda key: make_token(key, issuer="https://other.supabase.co/auth/v1"),
+        lambda key: make_token(ec.generate_private_key(ec.SECP256R1())),
+        lambda key: "not-a-jwt",
+    ],
+    ids=["expired", "wrong-issuer", "bad-signature", "garbage"],
+)
+def test_invalid_tokens_are_rejected(verifier, signing_key, make):
+    with pytest.raises(AuthError):
+        verifier.verify(make(signing_key))
+
+
+def test_concurrent_refreshes_send_the_refresh_token_once(monkeypatch, signing_key):
+    posts = []
+    in_flight = threading.Event()
+
+    def fake_post(url, json=None, **kwargs):
+        posts.append(json["refresh_token"])
+        in_flight.set()
+        time.sleep(0.2)
+        return Response(
+            {"access_token": make_token(signing_key), "refresh_token": f"r{len(posts) + 1}", "expires_in": 3600}
+        )
+
+    monkeypatch.setattr(auth_tokens, "http_client", lambda name: FakeHTTP(post=fake_post))
+    session = AuthSession(make_token(signing_key, exp_in=60), "r1", time.time() + 60)
+
+    session.access_token()  # inside the margin: refresh starts in the background
+    assert in_flight.wait(2.0)
+    session.expires_at = time.time()  # and the token expires meanwhile
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(session.access_token())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert posts == ["r1"]
+    assert session.expires_at > time.time() + auth_tokens.REFRESH_MARGIN_SECONDS
+    assert len(set(tokens)) == 1
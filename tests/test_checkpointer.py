@@ -0,0 +1,27 @@
+import pytest
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from checkpointer import SqliteCheckpointSaver, _CompactingCheckpointSaver
+
+
+def _put(saver, config, step, source="loop"):
+    checkpoint = create_checkpoint(empty_checkpoint(), None, step)
+    return saver.put(config, checkpoint, {"source": source, "step": step}, {})
+
+
+def test_base_saver_is_abstract():
+    with pytest.raises(TypeError):
+        _CompactingCheckpointSaver()
+
+
+def test_sqlite_saver_round_trips_and_prunes_on_input(tmp_path):
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), keep_last=2)
+    config = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+    for step in range(4):
+        config = _put(saver, config, step)
+    assert len(list(saver.list({"configurable": {"thread_id": "t1"}}))) == 4
+
+    latest = _put(saver, config, 4, source="input")
+    kept = list(saver.list({"configurable": {"thread_id": "t1"}}))
+    assert [item.metadata["step"] for item in kept] == [4, 3]
+    assert saver.get_tuple(latest).checkpoint["id"] == latest["configurable"]["checkpoint_id"]
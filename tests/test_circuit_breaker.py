@@ -0,0 +1,95 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def test_successes_are_pruned_from_the_window(clock):
+    breaker = CircuitBreaker("test", window_seconds=10.0)
+    for _ in range(1000):
+        breaker.record_success()
+        clock.now += 1.0
+    assert len(breaker._calls) <= 11
+    assert breaker.stats()["window_calls"] <= 11
+
+
+def test_failure_rate_only_counts_the_window(clock):
+    breaker = CircuitBreaker("test", window_seconds=10.0, min_calls=4, failure_rate=0.5)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 11.0
+    # The old failures left the window: 1 failure out of 4 calls.
+    for _ in range(3):
+        breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_open_breaker_fails_fast_then_probes(clock):
+    breaker = CircuitBreaker("test", min_calls=2, failure_rate=0.5, open_seconds=5.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "unreachable")
+    clock.now += 5.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_supabase_breaker_ignores_permanent_errors(clock):
+    from postgrest.exceptions import APIError
+
+    breaker = CircuitBreaker("supabase", **circuit_breaker.BREAKER_SETTINGS["supabase"])
+
+    def rls_violation():
+        raise APIError({"code": "42501", "message": "new row violates row-level security policy"})
+
+    for _ in range(20):
+        with pytest.raises(APIError):
+            breaker.call(rls_violation)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+    assert breaker.metrics["ignored_errors"] == 20
+
+    def timeout():
+        raise TimeoutError("read timed out")
+
+    for _ in range(5):
+        with pytest.raises(TimeoutError):
+            breaker.call(timeout)
+    assert breaker.state == OPEN
+
+
+def test_ignored_error_hands_back_the_half_open_probe(clock):
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=5.0, is_failure=lambda exc: False)
+    breaker.record_failure()
+    clock.now += 5.0
+
+    def bad_request():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        breaker.call(bad_request)
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
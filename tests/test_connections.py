@@ -0,0 +1,62 @@
+import asyncio
+import gc
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import connections
+
+
+class FakeGemini(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({
+            "candidates": [{"content": {"parts": [{"text": "hi"}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 1, "totalTokenCount": 4},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def gemini_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGemini)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    connections.close_connections()
+
+
+def test_collected_models_do_not_close_the_shared_pool(gemini_url):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    def build():
+        return ChatGoogleGenerativeAI(
+            model="gemini-2.5-flash",
+            api_key="test",
+            base_url=gemini_url,
+            client_args=connections.gemini_client_args(),
+        )
+
+    model = build()
+    before = connections.connection_stats()["gemini"]["requests"]
+    assert model.invoke("hello").content == "hi"
+
+    discarded = build()
+    del discarded
+    gc.collect()
+
+    assert not connections.http_client("gemini").is_closed
+    assert model.invoke("again").content == "hi"
+    assert asyncio.run(model.ainvoke("async")).content == "hi"
+    assert connections.connection_stats()["gemini"]["requests"] - before == 3
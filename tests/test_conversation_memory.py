@@ -0,0 +1,47 @@
+import gc
+import weakref
+
+import pytest
+
+import conversation_memory
+from conversation_memory import chunk_text, get_user_memory
+
+
+@pytest.fixture
+def memory_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("REMIRO_MEMORY_DIR", str(tmp_path))
+    monkeypatch.setattr(conversation_memory, "_indexes", conversation_memory.OrderedDict())
+    monkeypatch.setattr(conversation_memory, "_live_indexes", weakref.WeakValueDictionary())
+    monkeypatch.setattr(conversation_memory, "MAX_OPEN_INDEXES", 2)
+    return tmp_path
+
+
+def test_chunks_keep_whole_sentences():
+    text = "One two three. Four five six. Seven eight."
+    assert chunk_text(text, max_words=6) == ["One two three. Four five six.", "Seven eight."]
+
+
+def test_an_evicted_index_in_use_is_not_opened_twice(memory_dir):
+    in_use = get_user_memory("alice")
+    get_user_memory("bob")
+    get_user_memory("carol")
+    assert "alice" not in conversation_memory._indexes
+
+    assert get_user_memory("alice") is in_use
+    in_use.add([{"message_id": "m1", "role": "user", "content": "I want to become a data analyst."}])
+    assert len(get_user_memory("alice")) == 1
+
+
+def test_unused_evicted_indexes_are_released(memory_dir):
+    index = get_user_memory("dave")
+    index.add([{"message_id": "m1", "role": "user", "content": "Nursing to UX design."}])
+    directory = index.directory
+    del index
+    for user_id in ("e", "f"):
+        get_user_memory(user_id)
+    gc.collect()
+    assert directory not in conversation_memory._live_indexes
+
+    reopened = get_user_memory("dave")
+    assert len(reopened) == 1
+    assert reopened.search("UX design")[0]["message_id"] == "m1"
@@ -0,0 +1,71 @@
+import re
+import types
+
+import pytest
+
+import data_portability
+from data_portability import ARCHIVE_ORDER, _paged
+
+_AFTER_RE = re.compile(r'(\w+)\.gt\."([^"]*)",and\(\w+\.eq\."[^"]*",(\w+)\.gt\."([^"]*)"\)')
+
+
+class FakeQuery:
+    """The PostgREST calls _paged makes, over a list of rows."""
+
+    def __init__(self, rows, log):
+        self.rows, self.log = rows, log
+        self.filters, self.orders, self.page = [], [], None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def or_(self, expression):
+        time_column, time_value, id_column, id_value = _AFTER_RE.fullmatch(expression).groups()
+        self.filters.append(lambda row: (row[time_column], row[id_column]) > (time_value, id_value))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append(column)
+        return self
+
+    def limit(self, count):
+        self.page = count
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(f(row) for f in self.filters)]
+        rows.sort(key=lambda row: tuple(row[column] for column in self.orders))
+        self.log.append(len(rows[: self.page]))
+        return types.SimpleNamespace(data=rows[: self.page])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = types.SimpleNamespace(tables={}, pages=[])
+    client = types.SimpleNamespace(table=lambda name: FakeQuery(db.tables[name], db.pages))
+    monkeypatch.setattr(data_portability, "get_supabase", lambda: client)
+    return db
+
+
+def test_rows_sharing_a_timestamp_are_neither_skipped_nor_repeated(db):
+    db.tables["messages"] = [
+        {"id": f"m{i:02d}", "session_id": "s1", "created_at": f"2026-01-01T00:00:0{i // 4}"}
+        for i in range(10)
+    ] + [{"id": "x", "session_id": "s2", "created_at": "2026-01-01T00:00:00"}]
+
+    ids = [row["id"] for row in _paged("messages", "session_id", "s1", page_size=3)]
+    assert ids == [f"m{i:02d}" for i in range(10)]
+    assert db.pages == [3, 3, 3, 1]
+
+
+def test_archives_page_by_their_first_message(db):
+    db.tables["message_archives"] = [
+        {"id": f"a{i}", "session_id": "s1", "first_created_at": "2026-01-01", "first_id": f"m{9 - i}"}
+        for i in range(5)
+    ]
+    rows = list(_paged("message_archives", "session_id", "s1", page_size=2, order=ARCHIVE_ORDER))
+    assert [row["first_id"] for row in rows] == [f"m{i}" for i in range(5, 10)]
@@ -0,0 +1,12 @@
+from graph import merge_agent_outputs
+
+
+def test_nodes_add_their_outputs_to_the_turns():
+    outputs = merge_agent_outputs({}, {"web_searcher": "news"})
+    outputs = merge_agent_outputs(outputs, {"Strategy Director": "plan"})
+    assert outputs == {"web_searcher": "news", "Strategy Director": "plan"}
+
+
+def test_a_new_turn_clears_the_previous_outputs():
+    assert merge_agent_outputs({"Strategy Director": "plan"}, {}) == {}
+    assert merge_agent_outputs(None, {"web_searcher": "news"}) == {"web_searcher": "news"}
@@ -0,0 +1,42 @@
+from output_compression import (
+    DUPLICATE_THRESHOLD,
+    compress_agent_outputs,
+    estimated_similarity,
+    minhash_signature,
+    split_units,
+)
+
+
+def test_units_are_bullets_and_sentences_without_headings():
+    text = "## Plan\n- Learn SQL first.\n2) Build a portfolio.\nNetwork weekly. Apply monthly."
+    assert split_units(text) == ["Learn SQL first.", "Build a portfolio.", "Network weekly.", "Apply monthly."]
+
+
+def test_spelling_variants_are_near_duplicates():
+    a = minhash_signature("Practice behavioral interview questions with the STAR method.")
+    b = minhash_signature("Practice behavioural interview questions with the STAR method.")
+    c = minhash_signature("Negotiate your salary after you receive a written offer.")
+    assert estimated_similarity(a, a) == 1.0
+    assert estimated_similarity(a, b) >= DUPLICATE_THRESHOLD
+    assert estimated_similarity(a, c) < DUPLICATE_THRESHOLD
+
+
+def test_a_point_repeated_by_two_agents_is_kept_once():
+    outputs = {
+        "interview_coach": "- Practice behavioral interview questions with the STAR method.\n- Record mock interviews.",
+        "career_coach": "- Practice behavioural interview questions with the STAR method.\n- Update your LinkedIn.",
+    }
+    compressed = compress_agent_outputs(outputs, "How do I prepare for interviews?")
+    assert compressed.count("STAR method") == 1
+    assert "Record mock interviews." in compressed
+    assert "Update your LinkedIn." in compressed
+
+
+def test_every_agent_keeps_a_point_under_a_small_budget():
+    outputs = {
+        "skills": "Take an online statistics course. " + "Learn Python for data analysis. " * 10,
+        "jobs": "Search junior analyst roles on job boards. " + "Tailor every cover letter. " * 10,
+        "network": "Join a local data meetup group. " + "Message alumni on LinkedIn. " * 10,
+    }
+    compressed = compress_agent_outputs(outputs, "advice", budget_tokens=60)
+    assert all(f"--- {agent} ---" in compressed for agent in outputs)
@@ -0,0 +1,65 @@
+import pytest
+
+from scope_guard import classify_scope
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "How do I become a sports journalist covering football",
+        "How do I become a meteorologist and forecast weather",
+        "How do I get into sports broadcasting",
+        "I want to work as a chef, what recipes should I master",
+        "What does a career in political journalism look like",
+        "how do I ask my boss for a raise",
+    ],
+)
+def test_career_questions_are_not_refused(query):
+    assert classify_scope(query, threshold=0.9, rule_threshold=0.5).label != "off_topic"
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "who won the football match last night",
+        "what is the stock price of apple today",
+        "give me a recipe for chocolate cake",
+    ],
+)
+def test_clearly_off_topic_questions_are_refused(query):
+    decision = classify_scope(query, threshold=0.9, rule_threshold=0.5)
+    assert decision.label == "off_topic"
+    assert decision.reason == "off_topic_keyword"
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "How do I handle the politics in my department",
+        "I am 45, how old is too late to change paths?",
+    ],
+)
+def test_workplace_questions_with_ambiguous_words_pass_at_default_thresholds(query, monkeypatch):
+    monkeypatch.delenv("REMIRO_SCOPE_THRESHOLD", raising=False)
+    monkeypatch.delenv("REMIRO_SCOPE_RULE_THRESHOLD", raising=False)
+    assert classify_scope(query).label != "off_topic"
+
+
+def test_follow_ups_in_an_in_scope_session_skip_the_guard():
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    import graph
+
+    follow_up = HumanMessage(content="who won the football match last night")
+    history = [
+        HumanMessage(content="How do I handle the politics in my department"),
+        AIMessage(content="Start by mapping who influences decisions."),
+    ]
+    assert graph.scope_guard_node({"messages": history + [follow_up]}) == {}
+
+    refused = graph.scope_guard_node({"messages": [follow_up]})
+    assert refused["messages"][0].content == graph.OUT_OF_SCOPE_REPLY
+
+
+def test_short_messages_are_left_to_the_assistant():
+    assert classify_scope("hi").label == "unsure"
@@ -0,0 +1,87 @@
+import weakref
+
+import pytest
+
+import search_index
+from search_index import UserSearchIndex, get_search_index, highlight_snippet
+
+
+def _doc(message_id, session_id, content, role="user", created_at="2026-01-01T00:00:00"):
+    return {
+        "message_id": message_id,
+        "session_id": session_id,
+        "role": role,
+        "content": content,
+        "created_at": created_at,
+    }
+
+
+def test_best_session_ranks_first_and_duplicates_are_skipped(tmp_path):
+    index = UserSearchIndex(str(tmp_path))
+    assert index.add([
+        _doc("m1", "s1", "How do I prepare for product manager interviews?"),
+        _doc("m2", "s1", "Practice interviews with a friend.", role="assistant"),
+        _doc("m3", "s2", "I want to learn SQL for data analysis."),
+        _doc("m1", "s1", "How do I prepare for product manager interviews?"),
+    ]) == 3
+
+    hits = index.search("interview")
+    assert [hit["session_id"] for hit in hits] == ["s1"]
+    assert hits[0]["matches"] == 2
+    assert hits[0]["first_message"].startswith("How do I prepare")
+    assert index.search("SQL")[0]["session_id"] == "s2"
+    assert index.search("astronaut") == []
+
+
+def test_index_reloads_and_drops_a_torn_line(tmp_path):
+    UserSearchIndex(str(tmp_path)).add([_doc("m1", "s1", "Switching from nursing to UX design")])
+    with open(tmp_path / "docs.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"message_id": "m2", "session_id"')
+
+    reopened = UserSearchIndex(str(tmp_path))
+    assert len(reopened) == 1
+    assert reopened.search("nursing")[0]["message_id"] == "m1"
+
+
+def test_snippet_highlights_matching_terms():
+    snippet = highlight_snippet("Mock interviews help a lot.", {"interview"})
+    assert "**interviews**" in snippet
+
+
+def test_an_evicted_index_in_use_is_not_opened_twice(tmp_path, monkeypatch):
+    monkeypatch.setenv("REMIRO_SEARCH_DIR", str(tmp_path))
+    monkeypatch.setattr(search_index, "_indexes", search_index.OrderedDict())
+    monkeypatch.setattr(search_index, "_live_indexes", weakref.WeakValueDictionary())
+    monkeypatch.setattr(search_index, "MAX_OPEN_INDEXES", 1)
+
+    in_use = get_search_index("alice")
+    get_search_index("bob")
+    assert get_search_index("alice") is in_use
+
+
+def test_replaced_message_is_searched_by_its_new_content(tmp_path):
+    index = UserSearchIndex(str(tmp_path))
+    index.add([
+        _doc("m1", "s1", "Should I learn Rust?"),
+        _doc("m2", "s1", "Rust has a steep learning curve.", role="assistant"),
+    ])
+    assert index.add([_doc("m2", "s1", "Go is easier to pick up.", role="assistant")]) == 0
+    assert index.add([_doc("m2", "s1", "Go is easier to pick up.", role="assistant")], replace=True) == 1
+
+    assert index.search("steep curve") == []
+    assert index.search("easier")[0]["message_id"] == "m2"
+
+    reopened = UserSearchIndex(str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.search("steep curve") == []
+    assert reopened.search("easier")[0]["snippet"] == "Go is **easier** to pick up."
+
+
+def test_title_is_the_earliest_user_message_of_the_session(tmp_path):
+    index = UserSearchIndex(str(tmp_path))
+    index.add([
+        _doc("m2", "s1", "And what about salary bands?", created_at="2026-01-01T00:05:00"),
+        _doc("m1", "s1", "Help me negotiate a salary", created_at="2026-01-01T00:00:00"),
+        _doc("m0", "s1", "Sure, let's prepare.", role="assistant", created_at="2025-12-31T00:00:00"),
+    ])
+    assert index.search("salary")[0]["first_message"] == "Help me negotiate a salary"
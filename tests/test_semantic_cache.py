@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from embeddings import HashingEmbedder, tokenize
+from semantic_cache import SemanticResponseCache, cache_partition, is_profile_independent
+
+
+@pytest.fixture
+def cache():
+    return SemanticResponseCache(capacity=8, threshold=0.9)
+
+
+def test_negation_changes_the_cache_embedding():
+    embedder = HashingEmbedder(keep_negations=True)
+    plain = embedder.embed("Should you accept a counteroffer?")
+    negated = embedder.embed("Should you not accept a counteroffer?")
+    assert float(plain @ negated) < 0.9
+
+
+def test_negated_question_misses_the_plain_answer(cache):
+    assert cache.store("Should you accept a counteroffer?", {"reply": "Usually yes."})
+    assert cache.lookup("Should you not accept a counteroffer?") is None
+    assert cache.lookup("Shouldn't you accept a counteroffer?") is None
+    assert cache.lookup("Should you accept a counteroffer?")["reply"] == "Usually yes."
+
+
+def test_entries_only_match_their_response_mode(cache):
+    cache.store("How do I write a good LinkedIn headline?", {"reply": "short"}, "fast")
+    assert cache.lookup("How do I write a good LinkedIn headline?", "thorough") is None
+    assert cache.lookup("How do I write a good LinkedIn headline?", "fast")["reply"] == "short"
+
+
+def test_personal_and_contextual_queries_are_not_cached(cache):
+    assert not is_profile_independent("I'm a nurse, how do I move into UX?")
+    assert not is_profile_independent("Can you expand on that?")
+    assert not is_profile_independent("What are the latest hiring trends?")
+    assert not cache.store("My manager ignores me, what should I do?", {"reply": "x"})
+    assert is_profile_independent("How do I write a good LinkedIn headline?")
+
+
+def test_partition_and_default_tokenizer():
+    assert cache_partition("Should you not accept it?", "fast") == "fast:negated"
+    assert cache_partition("Should you accept it?", "fast") == "fast:plain"
+    # Topical matching (search, memory) still drops negations.
+    assert "not" not in tokenize("do not accept")
+    assert tokenize("don't accept", keep_negations=True) == ["not", "accept"]
+
+
+def test_expired_entries_are_not_served(cache):
+    cache.ttl_seconds = -1
+    cache.store("How do I write a good LinkedIn headline?", {"reply": "x"})
+    assert cache.lookup("How do I write a good LinkedIn headline?") is None
+    assert np.all(cache._expires_at == 0)
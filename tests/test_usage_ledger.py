@@ -0,0 +1,37 @@
+import usage_ledger
+from usage_ledger import UsageLedger
+
+
+def test_totals_of_earlier_days_are_dropped_on_a_new_day(monkeypatch):
+    today = {"day": "2026-01-01"}
+    monkeypatch.setattr(usage_ledger, "_today", lambda: today["day"])
+    loads = []
+
+    def loader(user_id, day):
+        loads.append((user_id, day))
+        return {"calls": 1, "input_tokens": 10, "output_tokens": 5, "cost_usd": 0.0}
+
+    ledger = UsageLedger(loader=loader)
+    for user_id in ("a", "b", "c"):
+        ledger.daily_usage(user_id)
+    ledger.record("a", "s1", "coach", "node", "gemini-2.5-flash", 100, 50)
+    assert ledger.daily_usage("a")["tokens"] == 165
+    assert len(ledger._baselines) == 3
+
+    today["day"] = "2026-01-02"
+    ledger.record("b", "s2", "coach", "node", "gemini-2.5-flash", 10, 10)
+    assert set(ledger._daily) == {("b", "2026-01-02")}
+    assert ledger._baselines == {}
+    # Unflushed aggregates of the previous day are still written.
+    assert {key[0] for key in ledger._pending} == {"2026-01-01", "2026-01-02"}
+
+    assert ledger.daily_usage("a")["tokens"] == 15
+    assert loads[-1] == ("a", "2026-01-02")
+
+
+def test_past_day_queries_are_not_cached(monkeypatch):
+    monkeypatch.setattr(usage_ledger, "_today", lambda: "2026-01-02")
+    ledger = UsageLedger(loader=lambda user_id, day: {"calls": 2})
+    assert ledger.daily_usage("a", day="2026-01-01")["calls"] == 2
+    assert ledger.daily_usage("a")["calls"] == 2
+    assert set(ledger._baselines) == {("a", "2026-01-02")}
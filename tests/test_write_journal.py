@@ -0,0 +1,102 @@
+import json
+import threading
+
+import pytest
+
+from write_journal import WriteBehindJournal, is_retryable_error
+
+
+class PostgrestError(Exception):
+    def __init__(self, code: str) -> None:
+        super().__init__(f"error {code}")
+        self.code = code
+
+
+class RecordingWriter:
+    """Fails rows whose "id" is in `bad` (permanently) or `flaky` (once)."""
+
+    def __init__(self, bad=(), flaky=()) -> None:
+        self.bad = set(bad)
+        self.flaky = set(flaky)
+        self.written = []
+        self.lock = threading.Lock()
+
+    def __call__(self, table, rows):
+        ids = {row["id"] for row in rows}
+        if ids & self.bad:
+            raise PostgrestError("23503")  # foreign key violation
+        if ids & self.flaky:
+            self.flaky -= ids
+            raise ConnectionError("connection reset")
+        with self.lock:
+            self.written.extend(row["id"] for row in rows)
+
+
+@pytest.fixture
+def journal_factory(tmp_path):
+    journals = []
+
+    def make(writer):
+        journal = WriteBehindJournal(str(tmp_path), writer, max_backoff_seconds=0.01)
+        journals.append(journal)
+        return journal
+
+    yield make
+    for journal in journals:
+        journal.close(timeout=1.0)
+
+
+def test_permanent_failure_is_dead_lettered_and_does_not_block(journal_factory, tmp_path):
+    writer = RecordingWriter(bad={"m2"})
+    journal = journal_factory(writer)
+    for i in range(5):
+        journal.append("messages", [{"id": f"m{i}"}])
+    assert journal.flush(timeout=5.0)
+
+    assert writer.written == ["m0", "m1", "m3", "m4"]
+    stats = journal.stats()
+    assert stats["dead_lettered"] == 1
+    assert stats["dead_lettered_rows"] == 1
+    assert stats["pending_records"] == 0
+    dead = [json.loads(line) for line in open(journal.dead_letter_path)]
+    assert [d["rows"] for d in dead] == [[{"id": "m2"}]]
+    assert "23503" in dead[0]["error"]
+
+
+def test_transient_failures_are_retried_not_dead_lettered(journal_factory):
+    writer = RecordingWriter(flaky={"m1"})
+    journal = journal_factory(writer)
+    for i in range(3):
+        journal.append("messages", [{"id": f"m{i}"}])
+    assert journal.flush(timeout=5.0)
+    assert sorted(writer.written) == ["m0", "m1", "m2"]
+    assert journal.stats()["dead_lettered"] == 0
+    assert journal.stats()["failures"] >= 1
+
+
+def test_unflushed_records_replay_after_restart(tmp_path):
+    blocked = threading.Event()
+
+    def failing_writer(table, rows):
+        blocked.set()
+        raise ConnectionError("database down")
+
+    journal = WriteBehindJournal(str(tmp_path), failing_writer, max_backoff_seconds=0.01)
+    journal.append("messages", [{"id": "m0"}])
+    blocked.wait(5.0)
+    journal.close(timeout=0.1)
+
+    writer = RecordingWriter()
+    journal = WriteBehindJournal(str(tmp_path), writer)
+    assert journal.flush(timeout=5.0)
+    journal.close()
+    assert writer.written == ["m0"]
+
+
+@pytest.mark.parametrize(
+    "code, retryable",
+    [("23503", False), ("23505", False), ("42501", False), ("PGRST204", False),
+     ("PGRST301", True), ("40001", True), ("57014", True), ("", True)],
+)
+def test_error_classification(code, retryable):
+    assert is_retryable_error(PostgrestError(code)) is retryable
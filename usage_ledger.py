@@ -0,0 +1,406 @@
+"""Per-user token and cost ledger with daily quotas.
+
+Every Gemini call made through `graph.get_chat_model` is recorded by
+`UsageLedgerCallback`: prompt and completion tokens (from the response's
+usage metadata) and the estimated cost (model_policy.estimate_cost),
+attributed to
+
+- user_id / session_id: set for the whole turn with `usage_scope()`;
+- node: the LangGraph node making the call ("outside_graph" otherwise);
+- agent: the agent set with `usage_scope(agent=...)` (e.g. each
+  specialist), else the node.
+
+A scope may also carry `turn_usage` counters (`new_turn_usage()`), which
+every call inside it adds to; run_session returns them as the turn's
+`usage`.
+
+`UsageLedger` aggregates calls in memory per (day, user, session, agent,
+node, model) and a worker thread flushes the aggregates as delta rows to
+the `usage_ledger` table every FLUSH_INTERVAL_SECONDS (or sooner once
+FLUSH_MAX_KEYS aggregates are pending). Rows that fail to flush are merged
+back and retried with the next batch.
+
+Quotas: `apply_quota()` runs before each turn. A user's usage today (UTC)
+is what was stored before this process first saw them, plus what this
+process has recorded since. Once usage reaches a fraction of the daily
+quota the turn is degraded to a cheaper response mode (QUOTA_DEGRADE_STEPS);
+at 100% QuotaExceededError is raised.
+
+- REMIRO_DAILY_TOKEN_QUOTA (default 300000; 0 disables): prompt plus
+  completion tokens per user per day.
+- REMIRO_DAILY_COST_QUOTA_USD (default 0, disabled): estimated cost per user
+  per day.
+"""
+
+import atexit
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from model_policy import estimate_cost
+from response_modes import RESPONSE_MODES
+
+FLUSH_INTERVAL_SECONDS = 30.0
+FLUSH_MAX_KEYS = 500
+
+DEFAULT_DAILY_TOKEN_QUOTA = 300_000
+DEFAULT_DAILY_COST_QUOTA_USD = 0.0
+
+# (fraction of the daily quota used, most expensive mode allowed from then on)
+QUOTA_DEGRADE_STEPS: Tuple[Tuple[float, str], ...] = ((0.6, "balanced"), (0.8, "fast"))
+
+# Response modes from cheapest to most expensive.
+MODES_BY_COST = sorted(RESPONSE_MODES, key=lambda name: RESPONSE_MODES[name]["token_budget"])
+
+# (rows) -> None; rows carry a unique id, so re-sending is harmless.
+Writer = Callable[[List[Dict[str, Any]]], None]
+# (user_id, day) -> {"calls", "input_tokens", "output_tokens", "cost_usd"} already stored.
+Loader = Callable[[str, str], Dict[str, float]]
+
+_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar("remiro_usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(**attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Attribute LLM calls made inside the block (user_id, session_id, agent).
+
+    Scopes nest; inner values override outer ones. The scope follows the
+    context into LangGraph's node threads.
+    """
+
+    scope = {**(_scope.get() or {}), **{k: v for k, v in attributes.items() if v is not None}}
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def annotate_usage(**attributes: Any) -> None:
+    """Add attributes to the enclosing usage_scope (no-op outside one)."""
+
+    scope = _scope.get()
+    if scope is not None:
+        scope.update({k: v for k, v in attributes.items() if v is not None})
+
+
+def current_usage_scope() -> Dict[str, Any]:
+    return dict(_scope.get() or {})
+
+
+_turn_usage_lock = threading.Lock()
+
+
+def new_turn_usage() -> Dict[str, float]:
+    """Counters for one turn; pass as usage_scope(turn_usage=...) to fill them."""
+
+    return _empty_counters()
+
+
+def add_turn_usage(counters: Dict[str, float], model: str, input_tokens: int, output_tokens: int) -> None:
+    with _turn_usage_lock:
+        counters["calls"] += 1
+        counters["input_tokens"] += input_tokens
+        counters["output_tokens"] += output_tokens
+        counters["cost_usd"] += estimate_cost(model, input_tokens, output_tokens)
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised instead of running a turn for a user over their daily quota."""
+
+    def __init__(self, user_id: str, usage: Dict[str, float]) -> None:
+        super().__init__(
+            "You have reached today's usage limit for Remiro AI. "
+            "It resets at midnight UTC."
+        )
+        self.user_id = user_id
+        self.usage = usage
+
+
+class UsageLedger:
+    """In-memory usage aggregates, flushed to storage in batches."""
+
+    def __init__(
+        self,
+        writer: Writer | None = None,
+        loader: Loader | None = None,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        flush_max_keys: int = FLUSH_MAX_KEYS,
+    ) -> None:
+        self.writer = writer
+        self.loader = loader
+        self.flush_interval = flush_interval
+        self.flush_max_keys = flush_max_keys
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        # (day, user, session, agent, node, model) -> counters not yet flushed
+        self._pending: Dict[Tuple[str, ...], Dict[str, float]] = {}
+        # (user, day) -> usage recorded by this process
+        self._daily: Dict[Tuple[str, str], Dict[str, float]] = {}
+        # (user, day) -> usage stored before this process saw the user
+        self._baselines: Dict[Tuple[str, str], Dict[str, float]] = {}
+        # Newest day seen; per-user totals of earlier days are dropped.
+        self._day = ""
+        self.metrics: Dict[str, Any] = {
+            "recorded_calls": 0,
+            "flushed_rows": 0,
+            "flushes": 0,
+            "failures": 0,
+            "last_error": None,
+        }
+
+        self._worker: threading.Thread | None = None
+        if writer is not None:
+            self._worker = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+            self._worker.start()
+
+    def record(
+        self,
+        user_id: str,
+        session_id: str | None,
+        agent: str,
+        node: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+    ) -> None:
+        """Add one LLM call to the aggregates."""
+
+        day = _today()
+        cost = estimate_cost(model, input_tokens, output_tokens)
+        key = (day, user_id, session_id or "", agent, node, model)
+        with self._lock:
+            self._roll_day(day)
+            for entry in (
+                self._pending.setdefault(key, _empty_counters()),
+                self._daily.setdefault((user_id, day), _empty_counters()),
+            ):
+                entry["calls"] += 1
+                entry["input_tokens"] += input_tokens
+                entry["output_tokens"] += output_tokens
+                entry["cost_usd"] += cost
+            self.metrics["recorded_calls"] += 1
+            if len(self._pending) >= self.flush_max_keys:
+                self._wakeup.notify()
+
+    def daily_usage(self, user_id: str, day: str | None = None) -> Dict[str, float]:
+        """{"calls", "input_tokens", "output_tokens", "tokens", "cost_usd"} for a user's day."""
+
+        day = day or _today()
+        key = (user_id, day)
+        with self._lock:
+            self._roll_day(_today())
+            need_baseline = key not in self._baselines
+            # Rows this process already flushed would be counted twice.
+            seen_locally = key in self._daily
+        baseline: Dict[str, float] | None = None
+        if need_baseline:
+            baseline = _empty_counters()
+            if self.loader is not None and not seen_locally:
+                try:
+                    baseline.update(self.loader(user_id, day))
+                except Exception as exc:  # noqa: BLE001 - quotas fail open
+                    self.metrics["last_error"] = f"{type(exc).__name__}: {exc}"
+            with self._lock:
+                # A past day's baseline is not kept; it would be dropped anyway.
+                if day >= self._day:
+                    baseline = self._baselines.setdefault(key, baseline)
+
+        with self._lock:
+            if baseline is None:
+                baseline = self._baselines.get(key) or _empty_counters()
+            usage = _empty_counters()
+            for entry in (baseline, self._daily.get(key) or {}):
+                for name, value in entry.items():
+                    usage[name] += value
+        usage["tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return usage
+
+    def _roll_day(self, day: str) -> None:
+        """Drop per-user totals of days before `day` once it is first seen.
+
+        Quotas only ever look at today, so without this the totals would
+        grow by one entry per active user every day. The caller holds the
+        lock; pending (unflushed) aggregates are kept.
+        """
+
+        if day <= self._day:
+            return
+        self._day = day
+        for totals in (self._daily, self._baselines):
+            for key in [key for key in totals if key[1] < day]:
+                del totals[key]
+
+    def flush(self) -> int:
+        """Write pending aggregates now; returns the number of rows written."""
+
+        if self.writer is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            rows = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "day": day,
+                    "user_id": user_id,
+                    "session_id": session_id or None,
+                    "agent": agent,
+                    "node": node,
+                    "model": model,
+                    "calls": int(counters["calls"]),
+                    "input_tokens": int(counters["input_tokens"]),
+                    "output_tokens": int(counters["output_tokens"]),
+                    "cost_usd": round(counters["cost_usd"], 8),
+                }
+                for (day, user_id, session_id, agent, node, model), counters in pending.items()
+            ]
+            try:
+                self.writer(rows)
+            except Exception as exc:  # noqa: BLE001 - merged back, retried later
+                with self._lock:
+                    for key, counters in pending.items():
+                        entry = self._pending.setdefault(key, _empty_counters())
+                        for name, value in counters.items():
+                            entry[name] += value
+                    self.metrics["failures"] += 1
+                    self.metrics["last_error"] = f"{type(exc).__name__}: {exc}"
+                return 0
+            with self._lock:
+                self.metrics["flushes"] += 1
+                self.metrics["flushed_rows"] += len(rows)
+            return len(rows)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        """Flush what is pending and stop the worker."""
+
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.metrics)
+            stats["pending_keys"] = len(self._pending)
+            stats["users_today"] = sum(1 for _, day in self._daily if day == _today())
+        return stats
+
+
+def _empty_counters() -> Dict[str, float]:
+    return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger(writer: Writer | None = None, loader: Loader | None = None) -> UsageLedger:
+    """Return the process-wide ledger, creating it with writer/loader on first use."""
+
+    global _ledger
+
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(writer, loader)
+            atexit.register(_ledger.close)
+        return _ledger
+
+
+def daily_quotas() -> Dict[str, float]:
+    return {
+        "tokens": float(os.getenv("REMIRO_DAILY_TOKEN_QUOTA", str(DEFAULT_DAILY_TOKEN_QUOTA))),
+        "cost_usd": float(os.getenv("REMIRO_DAILY_COST_QUOTA_USD", str(DEFAULT_DAILY_COST_QUOTA_USD))),
+    }
+
+
+def quota_fraction(usage: Dict[str, float], quotas: Dict[str, float] | None = None) -> float:
+    """Largest fraction used of any enabled quota (0 when none is set)."""
+
+    quotas = quotas or daily_quotas()
+    fractions = [usage[name] / limit for name, limit in quotas.items() if limit > 0]
+    return max(fractions, default=0.0)
+
+
+def apply_quota(ledger: UsageLedger, user_id: str, response_mode: str) -> str:
+    """Return the response mode the user may use now; raise when over quota."""
+
+    usage = ledger.daily_usage(user_id)
+    fraction = quota_fraction(usage)
+    if fraction >= 1.0:
+        raise QuotaExceededError(user_id, usage)
+    allowed = response_mode
+    for threshold, cap in QUOTA_DEGRADE_STEPS:
+        if fraction >= threshold and MODES_BY_COST.index(allowed) > MODES_BY_COST.index(cap):
+            allowed = cap
+    return allowed
+
+
+class UsageLedgerCallback(BaseCallbackHandler):
+    """Records every call of one chat client into the ledger."""
+
+    def __init__(self, model: str, ledger: UsageLedger) -> None:
+        self.model = model
+        self.ledger = ledger
+        self._starts: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        scope = current_usage_scope()
+        node = metadata.get("langgraph_node") or scope.get("node") or "outside_graph"
+        with self._lock:
+            self._starts[run_id] = {
+                "user_id": scope.get("user_id") or "anonymous",
+                "session_id": scope.get("session_id"),
+                "agent": scope.get("agent") or metadata.get("agent") or node,
+                "node": node,
+                "turn_usage": scope.get("turn_usage"),
+            }
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            attribution = self._starts.pop(run_id, None)
+        if attribution is None:
+            return
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += int(usage.get("input_tokens", 0))
+                output_tokens += int(usage.get("output_tokens", 0))
+        turn_usage = attribution.pop("turn_usage")
+        self.ledger.record(model=self.model, input_tokens=input_tokens, output_tokens=output_tokens, **attribution)
+        if turn_usage is not None:
+            add_turn_usage(turn_usage, self.model, input_tokens, output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._starts.pop(run_id, None)
@@ -0,0 +1,370 @@
+"""Durable write-behind journal for Supabase writes.
+
+`append_session_messages` and `save_user_profile` run after the LLM work
+of a turn is done; if Supabase is slow or briefly down they used to block
+the turn or fail it and lose the reply. With the journal enabled they
+only append a record to a local, fsync'd segment file and return; a
+background worker flushes records to Supabase in batches.
+
+- Segments: `segment-<n>.jsonl` under REMIRO_JOURNAL_DIR, one JSON record
+  per line ({"key", "table", "rows", "ts"}), rotated at SEGMENT_MAX_BYTES
+  and deleted once fully flushed.
+- Progress: `position.json` holds the (segment, offset) up to which
+  records are known to be in Supabase; it is replaced atomically after
+  every batch.
+- Idempotency: every row carries its primary key (message id, or user_id
+  for profiles) and is written with an upsert, so replaying a record that
+  was flushed just before a crash does not duplicate it.
+- Replay: on start, records after the saved position are loaded again
+  (a torn last line from a crash is truncated) and flushed.
+- Retries: a batch that failed for a transient reason (network, timeout,
+  circuit open, 5xx, ...) is retried with exponential backoff, up to
+  MAX_BACKOFF_SECONDS between attempts.
+- Dead letters: an error that would fail the same way on every retry (see
+  `is_retryable_error`: constraint and FK violations, RLS rejections,
+  other 4xx) would block every later write behind it. The records of
+  such a batch are re-sent one by one, and those that still fail are
+  moved to `dead-letter.jsonl` (the journal record plus "error" and
+  "failed_at") instead of being retried forever; once the cause is fixed
+  they can be appended again.
+- Read-your-writes: `pending_rows()` lets readers merge rows that are not
+  flushed yet.
+
+`stats()` reports the lag (pending records/rows, age of the oldest
+pending record) plus flush/failure/dead-letter counters.
+
+Enabled by default; REMIRO_WRITE_BEHIND=0 writes synchronously instead.
+"""
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+SEGMENT_MAX_BYTES = 1024 * 1024
+BATCH_MAX_ROWS = 200
+MAX_BACKOFF_SECONDS = 30.0
+
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+_SEGMENT_RE = re.compile(r"^segment-(\d{8})\.jsonl$")
+
+# Errors that fail the same way on every retry: SQLSTATE data exceptions
+# (22), integrity violations (23: FK, unique, not null, check) and access
+# rule / undefined object errors (42, incl. 42501 RLS rejections);
+# PostgREST request (PGRST1xx) and schema (PGRST2xx) errors; and 4xx
+# statuses other than auth, timeout and rate limiting.
+_PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+_PERMANENT_POSTGREST_CLASSES = ("PGRST1", "PGRST2")
+_PERMANENT_HTTP_STATUSES = frozenset({400, 403, 404, 405, 406, 409, 410, 413, 415, 422})
+
+# (table, rows) -> None; must be idempotent for rows it has already written.
+Writer = Callable[[str, List[Dict[str, Any]]], None]
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """False for write errors that no retry can fix (see _PERMANENT_*)."""
+
+    code = str(getattr(exc, "code", "") or "")
+    if code.startswith(_PERMANENT_POSTGREST_CLASSES):
+        return False
+    if len(code) == 5 and code[:2] in _PERMANENT_SQLSTATE_CLASSES:
+        return False
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status not in _PERMANENT_HTTP_STATUSES
+
+
+class WriteBehindJournal:
+    """Append-only local journal flushed to the database by a worker thread."""
+
+    def __init__(
+        self,
+        directory: str,
+        writer: Writer,
+        segment_max_bytes: int = SEGMENT_MAX_BYTES,
+        batch_max_rows: int = BATCH_MAX_ROWS,
+        max_backoff_seconds: float = MAX_BACKOFF_SECONDS,
+        retryable: Callable[[BaseException], bool] = is_retryable_error,
+    ) -> None:
+        self.directory = directory
+        self.writer = writer
+        self.segment_max_bytes = segment_max_bytes
+        self.batch_max_rows = batch_max_rows
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retryable = retryable
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+        self._closed = False
+        # Unflushed records in order: (segment, end offset, record).
+        self._pending: Deque[Tuple[int, int, Dict[str, Any]]] = deque()
+        # Records still to be sent one at a time after a permanent failure
+        # of the batch they were in.
+        self._isolate = 0
+
+        self.metrics: Dict[str, Any] = {
+            "appended": 0,
+            "flushed_records": 0,
+            "flushed_rows": 0,
+            "batches": 0,
+            "failures": 0,
+            "dead_lettered": 0,
+            "dead_lettered_rows": 0,
+            "replayed": 0,
+            "last_error": None,
+            "last_flush_at": None,
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        self._position_path = os.path.join(directory, "position.json")
+        self.dead_letter_path = os.path.join(directory, DEAD_LETTER_FILE)
+        self._flushed_segment, self._flushed_offset = self._read_position()
+        self._replay()
+
+        segments = self._segments()
+        self._segment = segments[-1] if segments else self._flushed_segment
+        self._file = open(self._segment_path(self._segment), "ab")
+
+        self._worker = threading.Thread(target=self._run, name="write-behind-journal", daemon=True)
+        self._worker.start()
+
+    # --- files ---
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:08d}.jsonl")
+
+    def _segments(self) -> List[int]:
+        found = (_SEGMENT_RE.match(name) for name in os.listdir(self.directory))
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def _read_position(self) -> Tuple[int, int]:
+        try:
+            with open(self._position_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def _write_position(self, segment: int, offset: int) -> None:
+        tmp_path = self._position_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"segment": segment, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._position_path)
+
+    def _replay(self) -> None:
+        """Load records written after the saved position back into memory."""
+
+        for segment in self._segments():
+            if segment < self._flushed_segment:
+                os.remove(self._segment_path(segment))
+                continue
+            path = self._segment_path(segment)
+            offset = self._flushed_offset if segment == self._flushed_segment else 0
+            good_end = offset
+            with open(path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    good_end += len(line)
+                    self._pending.append((segment, good_end, record))
+                    self.metrics["replayed"] += 1
+            if good_end < os.path.getsize(path):
+                # Torn write from a crash: drop the incomplete tail.
+                with open(path, "ab") as f:
+                    f.truncate(good_end)
+
+    # --- producer side ---
+
+    def append(self, table: str, rows: List[Dict[str, Any]]) -> str:
+        """Durably record rows to write to `table`; returns the record key.
+
+        Returns once the record is fsync'd to the local segment file.
+        """
+
+        record = {"key": str(uuid.uuid4()), "table": table, "rows": rows, "ts": time.time()}
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write-behind journal is closed.")
+            if self._file.tell() > 0 and self._file.tell() + len(line) > self.segment_max_bytes:
+                self._file.close()
+                self._segment += 1
+                self._file = open(self._segment_path(self._segment), "ab")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending.append((self._segment, self._file.tell(), record))
+            self.metrics["appended"] += 1
+            self._wakeup.notify()
+        return record["key"]
+
+    def pending_rows(self, table: str, predicate: Callable[[Dict[str, Any]], bool] | None = None) -> List[Dict[str, Any]]:
+        """Rows for `table` that are journaled but not flushed yet, oldest first."""
+
+        with self._lock:
+            records = [r for _, _, r in self._pending if r["table"] == table]
+        rows = [row for record in records for row in record["rows"]]
+        return [row for row in rows if predicate is None or predicate(row)]
+
+    # --- worker side ---
+
+    def _next_batch(self) -> List[Tuple[int, int, Dict[str, Any]]]:
+        """Leading pending records for one table, up to batch_max_rows rows."""
+
+        if self._isolate:
+            return [self._pending[0]]
+        batch: List[Tuple[int, int, Dict[str, Any]]] = []
+        rows = 0
+        for entry in self._pending:
+            record = entry[2]
+            if batch and (record["table"] != batch[0][2]["table"] or rows + len(record["rows"]) > self.batch_max_rows):
+                break
+            batch.append(entry)
+            rows += len(record["rows"])
+        return batch
+
+    def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending and self._closed:
+                    return
+                batch = self._next_batch()
+
+            table = batch[0][2]["table"]
+            rows = [row for _, _, record in batch for row in record["rows"]]
+            try:
+                self.writer(table, rows)
+            except Exception as exc:  # noqa: BLE001 - retried or dead-lettered
+                error = f"{type(exc).__name__}: {exc}"
+                if not self.retryable(exc):
+                    if len(batch) > 1:
+                        # Find the offending record(s): send them one by one.
+                        with self._lock:
+                            self._isolate = len(batch)
+                        continue
+                    self._dead_letter(batch[0][2], error)
+                    self._advance(batch, rows, flushed=False)
+                    continue
+                with self._lock:
+                    self.metrics["failures"] += 1
+                    self.metrics["last_error"] = error
+                    if self._closed:
+                        return
+                    self._wakeup.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+                continue
+
+            backoff = 0.5
+            self._advance(batch, rows, flushed=True)
+
+    def _dead_letter(self, record: Dict[str, Any], error: str) -> None:
+        line = json.dumps({**record, "error": error, "failed_at": time.time()}, default=str) + "\n"
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self.metrics["dead_lettered"] += 1
+            self.metrics["dead_lettered_rows"] += len(record["rows"])
+            self.metrics["last_error"] = error
+
+    def _advance(self, batch: List[Tuple[int, int, Dict[str, Any]]], rows: List[Dict[str, Any]], flushed: bool) -> None:
+        """Move the saved position past `batch` (written, or dead-lettered)."""
+
+        segment, offset, _ = batch[-1]
+        self._write_position(segment, offset)
+        with self._lock:
+            for _ in batch:
+                self._pending.popleft()
+            self._isolate = max(self._isolate - len(batch), 0)
+            if flushed:
+                self.metrics["flushed_records"] += len(batch)
+                self.metrics["flushed_rows"] += len(rows)
+                self.metrics["batches"] += 1
+                self.metrics["last_flush_at"] = time.time()
+            current = self._segment
+            if not self._pending:
+                self._drained.notify_all()
+        for old in range(self._flushed_segment, segment):
+            if old != current and os.path.exists(self._segment_path(old)):
+                os.remove(self._segment_path(old))
+        self._flushed_segment, self._flushed_offset = segment, offset
+
+    # --- control / metrics ---
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until everything appended so far is flushed; False on timeout."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._wakeup.notify()
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._drained.wait(remaining)
+            return True
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        """Flush (bounded by timeout) and stop the worker; unflushed records replay on restart."""
+
+        self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+            self._file.close()
+        self._worker.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Lag and throughput counters."""
+
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.metrics)
+            stats["pending_records"] = len(self._pending)
+            stats["pending_rows"] = sum(len(r["rows"]) for _, _, r in self._pending)
+            oldest = self._pending[0][2]["ts"] if self._pending else None
+        stats["lag_seconds"] = time.time() - oldest if oldest is not None else 0.0
+        return stats
+
+
+_journal: Optional[WriteBehindJournal] = None
+_journal_lock = threading.Lock()
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("REMIRO_WRITE_BEHIND", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_write_journal(writer: Writer) -> Optional[WriteBehindJournal]:
+    """Return the process-wide journal (None when REMIRO_WRITE_BEHIND=0).
+
+    The first call starts the worker and replays unflushed records from
+    REMIRO_JOURNAL_DIR (default .remiro/journal) using `writer`.
+    """
+
+    global _journal
+
+    if not write_behind_enabled():
+        return None
+    with _journal_lock:
+        if _journal is None:
+            directory = os.getenv("REMIRO_JOURNAL_DIR", os.path.join(".remiro", "journal"))
+            _journal = WriteBehindJournal(directory, writer)
+            atexit.register(_journal.close)
+        return _journal